@@ -0,0 +1,191 @@
+"""Size-bounded LRU cache of compiled submissions (marshalled code objects)."""
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import marshal
+import threading
+import time
+import warnings
+from typing import Optional
+
+FILENAME = "main.py"
+# Rough per-entry overhead (key, dataclass, OrderedDict node)
+ENTRY_OVERHEAD = 300
+
+# compile() with warnings captured touches process-wide warning state
+_compile_lock = threading.Lock()
+
+
+@dataclass
+class Compiled:
+    """Outcome of compiling one submission.
+
+    Exactly one of `bytecode` / `syntax_error` is set, except when
+    compiling emitted warnings: then both are None and the sandbox compiles
+    the source itself so the student sees the warnings as CPython prints them.
+    """
+    bytecode: Optional[bytes] = None
+    syntax_error: Optional[str] = None
+    compile_ms: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.bytecode or b"") + len(self.syntax_error or "") + ENTRY_OVERHEAD
+
+
+def _print_error_text(text: bytes, offset: int, end_offset: int) -> str:
+    """Port of CPython 3.11's print_error_text (Python/pythonrun.c).
+
+    Offsets are UTF-8 byte offsets used as column counts, as the C code does.
+    """
+    carets = end_offset - offset if end_offset > 0 and end_offset > offset else 1
+    offset -= 1
+    stripped = text.lstrip(b" \t\f")
+    offset -= len(text) - len(stripped)
+    text = stripped
+    length = len(text) - 1 if text.endswith(b"\n") else len(text)
+    offset = min(offset, length)
+    while True:
+        newline = text.find(b"\n")
+        if newline < 0 or newline >= offset:
+            break
+        text = text[newline + 1:]
+        length -= newline + 1
+        offset -= newline + 1
+
+    out = "    " + text.decode("utf-8", "replace")
+    if text[length:length + 1] != b"\n":
+        out += "\n"
+    if offset < 0:
+        return out
+    return out + "    " + " " * offset + "^" * carets + "\n"
+
+
+def format_syntax_error(exc: SyntaxError, code: str) -> str:
+    """Render `exc` exactly as `python3 main.py` prints it for this source.
+
+    compile() on a string reports parser columns in characters, leaves `text`
+    unset for compiler (symtable) errors and places end-of-file indentation
+    errors differently from the file-based parse the interpreter runs, so
+    those attributes are first rewritten to what the file parse produces.
+    """
+    lineno = exc.lineno or 0
+    offset = exc.offset if exc.offset is not None else -1
+    end_lineno = exc.end_lineno if exc.end_lineno is not None else lineno
+    end_offset = exc.end_offset if exc.end_offset is not None else -1
+    text = exc.text
+
+    if text is None:
+        # Compiler errors: columns are already byte offsets; the file parse
+        # reads the line back from disk
+        lines = code.splitlines(True)
+        if 0 < lineno <= len(lines):
+            text = lines[lineno - 1]
+    else:
+        if offset > 0:
+            offset = len(text[:offset - 1].encode()) + 1
+        if end_offset > 0:
+            end_offset = len(text[:end_offset - 1].encode()) + 1
+
+    if isinstance(exc, IndentationError):
+        end_offset = -1
+        # Hit end of input: the string parse points past the line, the file parse at column 0
+        if (
+            exc.msg.startswith("expected an indented block")
+            and exc.text is not None
+            and (exc.offset or 0) > len(exc.text.rstrip("\n"))
+        ):
+            offset = 0
+
+    out = f'  File "{FILENAME}", line {lineno}\n'
+    if text is not None:
+        raw = text.encode()
+        if end_lineno > lineno:
+            end_offset = len(raw)
+        end_offset = min(end_offset, len(raw) + 1)
+        out += _print_error_text(raw, offset, end_offset)
+    return out + f"{type(exc).__name__}: {exc.msg}\n"
+
+
+def compile_source(code: str) -> Compiled:
+    """Compile `code` as main.py and marshal the result.
+
+    Sources the interpreter reads differently from a string (a BOM, NUL
+    bytes) or that warn while failing are left for the sandbox to compile.
+    """
+    start = time.perf_counter()
+    with _compile_lock, warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        try:
+            code_obj = compile(code, FILENAME, "exec", dont_inherit=True)
+        except SyntaxError as e:
+            elapsed = (time.perf_counter() - start) * 1000
+            if caught or code.startswith("\ufeff") or "\0" in code:
+                return Compiled(compile_ms=elapsed)
+            return Compiled(syntax_error=format_syntax_error(e, code), compile_ms=elapsed)
+        except ValueError:
+            return Compiled(compile_ms=(time.perf_counter() - start) * 1000)
+    elapsed = (time.perf_counter() - start) * 1000
+    if caught:
+        return Compiled(compile_ms=elapsed)
+    return Compiled(bytecode=marshal.dumps(code_obj), compile_ms=elapsed)
+
+
+class BytecodeCache:
+    """Compiled submissions keyed by source hash, bounded by entries and bytes."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Compiled]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.syntax_errors_served = 0
+        self.compile_ms_saved = 0.0
+
+    def get(self, code: str) -> Compiled:
+        """Compiled form of `code`, compiling and caching it on a miss."""
+        key = hashlib.sha256(code.encode("utf-8", "surrogatepass")).hexdigest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.compile_ms_saved += entry.compile_ms
+                if entry.syntax_error:
+                    self.syntax_errors_served += 1
+                return entry
+            self.misses += 1
+
+        entry = compile_source(code)
+        with self._lock:
+            if entry.syntax_error:
+                self.syntax_errors_served += 1
+            if entry.size > self.max_bytes:
+                return entry
+            if key not in self._entries:
+                self._entries[key] = entry
+                self.bytes += entry.size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, oldest = self._entries.popitem(last=False)
+                self.bytes -= oldest.size
+                self.evictions += 1
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "syntax_errors_served": self.syntax_errors_served,
+                "compile_ms_saved": round(self.compile_ms_saved, 2),
+            }
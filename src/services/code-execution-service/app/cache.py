@@ -0,0 +1,109 @@
+"""Content-addressed LRU/TTL cache of execution results."""
+from collections import OrderedDict
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+from typing import Optional, Tuple
+
+from app.sandbox import RunResult
+
+# Rough per-entry overhead (key, tuple, dataclass, OrderedDict node)
+ENTRY_OVERHEAD = 400
+# Default reprs ("<function f at 0x7f...>") differ between runs
+MEMORY_ADDRESS = re.compile(r" at 0x[0-9a-fA-F]+")
+
+
+def result_key(code: str, stdin: str, **limits) -> str:
+    """Hash of everything that can influence a deterministic program's result."""
+    payload = json.dumps({"code": code, "stdin": stdin, "limits": limits}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def cacheable(result: RunResult) -> bool:
+    """Whether replaying `result` is indistinguishable from running the program again.
+
+    The analyzer can't see every repr that prints an address, so results
+    that show one are never cached.
+    """
+    return (
+        not result.timed_out
+        and result.exit_code >= 0
+        and not MEMORY_ADDRESS.search(result.output)
+        and not MEMORY_ADDRESS.search(result.error)
+    )
+
+
+def _entry_size(result: RunResult) -> int:
+    return sys.getsizeof(result.output) + sys.getsizeof(result.error) + ENTRY_OVERHEAD
+
+
+class ResultCache:
+    """Bounded by entry count and approximate bytes; entries expire after `ttl` seconds."""
+
+    def __init__(self, max_entries: int, ttl: float, max_bytes: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[float, RunResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[RunResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, result = entry
+            if time.monotonic() - stored_at > self.ttl:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: str, result: RunResult):
+        size = _entry_size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), result)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _remove(self, key: str):
+        _, result = self._entries.pop(key)
+        self.bytes -= _entry_size(result)
@@ -0,0 +1,77 @@
+"""Kernel-enforced resource limits and usage accounting for sandbox runs."""
+from collections import deque
+from dataclasses import dataclass
+import signal
+import threading
+from typing import Deque, Optional
+
+from app.stats import percentile
+
+CPU_LIMIT_MESSAGE = "CPU time limit exceeded"
+
+
+@dataclass(frozen=True)
+class ResourceLimits:
+    """rlimits applied to every sandbox process (0 = leave unlimited).
+
+    Each kind of sandbox applies them itself, inside the child: spawned runs
+    in BOOTSTRAP, pool workers and zygote children at start.
+    """
+    cpu_seconds: int = 0
+    memory_bytes: int = 0
+    file_size_bytes: int = 0
+    # RLIMIT_NPROC counts every process/thread of the uid, not just the
+    # sandbox's children, and is not enforced for root.
+    max_processes: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "cpu_seconds": self.cpu_seconds,
+            "memory_bytes": self.memory_bytes,
+            "file_size_bytes": self.file_size_bytes,
+            "max_processes": self.max_processes,
+        }
+
+
+def killed_by_limit(exit_code: int) -> Optional[str]:
+    """Message for a run terminated by a resource-limit signal, if it was."""
+    if exit_code == -signal.SIGXCPU:
+        return CPU_LIMIT_MESSAGE
+    return None
+
+
+class UsageRecorder:
+    """Rolling window of per-run CPU time and peak RSS, for capacity planning."""
+
+    def __init__(self, window: int = 1000):
+        self._cpu_ms: Deque[float] = deque(maxlen=window)
+        self._rss_kb: Deque[int] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.cpu_limit_kills = 0
+
+    def record(self, cpu_time_ms: float, peak_rss_kb: int, exit_code: int):
+        with self._lock:
+            self.runs += 1
+            self._cpu_ms.append(cpu_time_ms)
+            self._rss_kb.append(peak_rss_kb)
+            if killed_by_limit(exit_code):
+                self.cpu_limit_kills += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            cpu, rss = list(self._cpu_ms), list(self._rss_kb)
+            return {
+                "runs": self.runs,
+                "cpu_limit_kills": self.cpu_limit_kills,
+                "cpu_time_ms": {
+                    "avg": round(sum(cpu) / len(cpu), 2) if cpu else 0.0,
+                    "p95": round(percentile(cpu, 95), 2),
+                    "max": round(max(cpu), 2) if cpu else 0.0,
+                },
+                "peak_rss_kb": {
+                    "avg": round(sum(rss) / len(rss)) if rss else 0,
+                    "p95": percentile(rss, 95),
+                    "max": max(rss) if rss else 0,
+                },
+            }
@@ -1,13 +1,28 @@
 """Code Execution Service - Safe Python code executor."""
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional, Sequence
+import asyncio
+import functools
+import hashlib
+import json
 import os
-import subprocess
-import tempfile
+import queue
+import threading
+import time
 import requests
 
+from app.bytecode import BytecodeCache, Compiled, compile_source
+from app.cache import ResultCache, cacheable, result_key
+from app.limits import ResourceLimits, UsageRecorder
+from app.pool import PoolBusy, WorkerPool
+from app.safety import SafetyAnalyzer, SafetyPolicy
+from app.sandbox import RunResult, pump_output, run_spawned, spawn_sandbox
+from app.scheduler import BACKGROUND, INTERACTIVE, ExecutionScheduler, QueueFull, Rejected
+from app.zygote import Zygote, ZygoteUnavailable
+
 app = FastAPI(
     title="code-execution-service",
     description="Safely executes Python code in a sandbox environment",
@@ -29,16 +44,132 @@ DAPR_BASE_URL = f"http://localhost:{DAPR_HTTP_PORT}"
 # Execution limits
 MAX_TIMEOUT = int(os.getenv("EXEC_TIMEOUT", "10"))
 MAX_OUTPUT_SIZE = int(os.getenv("MAX_OUTPUT_SIZE", "10000"))
+MAX_BATCH_CASES = int(os.getenv("EXEC_BATCH_MAX_CASES", "32"))
+
+# Kernel-enforced rlimits for every sandbox process (0 disables a limit)
+LIMITS = ResourceLimits(
+    cpu_seconds=int(os.getenv("EXEC_CPU_LIMIT", str(MAX_TIMEOUT))),
+    memory_bytes=int(os.getenv("EXEC_MEMORY_LIMIT_MB", "256")) * 1024 * 1024,
+    file_size_bytes=int(os.getenv("EXEC_FILE_SIZE_LIMIT_KB", "1024")) * 1024,
+    max_processes=int(os.getenv("EXEC_MAX_PROCESSES", "64")),
+)
+usage = UsageRecorder()
+
+# Worker pool (EXEC_POOL_SIZE=0 falls back to one python3 process per request)
+POOL_SIZE = int(os.getenv("EXEC_POOL_SIZE", "4"))
+POOL_MAX_RUNS = int(os.getenv("EXEC_POOL_MAX_RUNS", "50"))
+POOL_QUEUE_DEPTH = int(os.getenv("EXEC_POOL_QUEUE_DEPTH", "32"))
+
+pool = (
+    WorkerPool(
+        size=POOL_SIZE,
+        max_runs=POOL_MAX_RUNS,
+        queue_depth=POOL_QUEUE_DEPTH,
+        max_output=MAX_OUTPUT_SIZE,
+        limits=LIMITS,
+    )
+    if POOL_SIZE > 0 else None
+)
+
+# Admission control: sandbox runs block a thread each and are capped at
+# MAX_CONCURRENCY; beyond that up to QUEUE_DEPTH wait, the rest get a 429.
+MAX_CONCURRENCY = int(os.getenv("EXEC_MAX_CONCURRENCY", str(POOL_SIZE or 4)))
+QUEUE_DEPTH = int(os.getenv("EXEC_QUEUE_DEPTH", "64"))
+QUEUE_TIMEOUT = float(os.getenv("EXEC_QUEUE_TIMEOUT", "30"))
+
+# Priority lanes: pub/sub jobs queue separately from interactive runs, win
+# only 1 in (INTERACTIVE_WEIGHT + 1) contested slots, and never hold the
+# last slot, so an event backlog can't sit in front of a student's "Run".
+# With EXEC_MAX_CONCURRENCY=1 there is no spare slot to reserve: the lanes
+# share the one slot by weight alone (BACKGROUND_SLOTS=0, uncapped), and a
+# "Run" may wait for the background job already running.
+INTERACTIVE_WEIGHT = int(os.getenv("EXEC_INTERACTIVE_WEIGHT", "9"))
+BACKGROUND_QUEUE_DEPTH = int(os.getenv("EXEC_BACKGROUND_QUEUE_DEPTH", "256"))
+BACKGROUND_QUEUE_TIMEOUT = float(os.getenv("EXEC_BACKGROUND_QUEUE_TIMEOUT", "300"))
+BACKGROUND_SLOTS = int(os.getenv("EXEC_BACKGROUND_SLOTS", str(max(0, MAX_CONCURRENCY - 1))))
+
+scheduler = ExecutionScheduler(
+    concurrency=MAX_CONCURRENCY,
+    queue_depth=QUEUE_DEPTH,
+    max_wait=QUEUE_TIMEOUT,
+    interactive_weight=INTERACTIVE_WEIGHT,
+)
+scheduler.add_lane(
+    BACKGROUND,
+    weight=1,
+    queue_depth=BACKGROUND_QUEUE_DEPTH,
+    max_wait=BACKGROUND_QUEUE_TIMEOUT,
+    max_running=BACKGROUND_SLOTS,
+)
 
 # Blocked imports for security
 BLOCKED_IMPORTS = [
     "subprocess", "shutil", "ctypes", "socket",
-    "http", "urllib", "ftplib", "smtplib",
+    "http", "urllib", "ftplib", "smtplib", "resource",
+    "posix", "multiprocessing", "_posixsubprocess", "pty", "_io",
 ]
 
+# Process, signal and filesystem-mutation functions blocked on allowed modules
+BLOCKED_ATTRIBUTES = {
+    "os": [
+        "system", "popen", "fork", "forkpty", "kill", "killpg", "abort",
+        "exec*", "spawn*", "posix_spawn*",
+        "remove", "unlink", "rmdir", "removedirs", "rename", "renames", "replace",
+        "chmod", "chown", "truncate", "putenv",
+    ],
+    "builtins": ["exec", "eval", "compile", "__import__", "open", "vars", "globals", "locals", "breakpoint"],
+    "asyncio": ["create_subprocess_*", "subprocess"],
+    "sys": ["modules"],
+    "platform": ["popen"],
+    "importlib": ["__import__", "util", "machinery", "reload"],
+}
+
+# Methods blocked on any object: pathlib writes and event-loop subprocesses
+BLOCKED_METHODS = [
+    "write_text", "write_bytes", "symlink_to", "hardlink_to",
+    "subprocess_exec", "subprocess_shell",
+]
+
+# Fork server for one-off runs (pool disabled, streaming): allowed modules are
+# imported once and every run is forked copy-on-write from that image.
+ZYGOTE_ENABLED = os.getenv("EXEC_ZYGOTE", "true").lower() in ("1", "true", "yes")
+ZYGOTE_PRELOAD = [
+    name.strip()
+    for name in os.getenv(
+        "EXEC_ZYGOTE_PRELOAD",
+        "math,random,string,collections,itertools,functools,re,json,csv,io,"
+        "datetime,statistics,decimal,fractions,textwrap,heapq,bisect",
+    ).split(",")
+    if name.strip() and name.strip().split(".")[0] not in BLOCKED_IMPORTS
+]
+zygote = Zygote(ZYGOTE_PRELOAD, LIMITS) if ZYGOTE_ENABLED else None
+
+# Opt-in cache of results for programs the analyzer marks deterministic
+RESULT_CACHE_ENABLED = os.getenv("EXEC_RESULT_CACHE", "false").lower() in ("1", "true", "yes")
+result_cache = ResultCache(
+    max_entries=int(os.getenv("EXEC_RESULT_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("EXEC_RESULT_CACHE_TTL", "3600")),
+    max_bytes=int(os.getenv("EXEC_RESULT_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+)
+
+# Compiled submissions, shared with pool workers and the zygote as marshalled
+# bytecode; syntax errors are answered from here without starting a process.
+BYTECODE_CACHE_ENABLED = os.getenv("EXEC_BYTECODE_CACHE", "true").lower() in ("1", "true", "yes")
+bytecode_cache = BytecodeCache(
+    max_entries=int(os.getenv("EXEC_BYTECODE_CACHE_SIZE", "1024")),
+    max_bytes=int(os.getenv("EXEC_BYTECODE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+)
+
+safety_analyzer = SafetyAnalyzer(
+    SafetyPolicy.build(BLOCKED_IMPORTS, blocked_attrs=BLOCKED_ATTRIBUTES, blocked_methods=BLOCKED_METHODS),
+    cache_size=int(os.getenv("EXEC_SAFETY_CACHE_SIZE", "1024")),
+    track_determinism=RESULT_CACHE_ENABLED,
+)
+
 
 class CodeRequest(BaseModel):
     code: str
+    stdin: str = ""
     timeout: Optional[int] = None
     user_id: str = ""
 
@@ -48,6 +179,60 @@ class CodeResponse(BaseModel):
     error: str = ""
     exit_code: int = 0
     timed_out: bool = False
+    truncated: bool = False
+    cached: bool = False
+    wall_time_ms: float = 0.0
+    cpu_time_ms: float = 0.0
+    peak_rss_kb: int = 0
+
+
+class BatchCase(BaseModel):
+    stdin: str = ""
+    args: List[str] = []
+
+
+class BatchRequest(BaseModel):
+    code: str
+    cases: List[BatchCase]
+    timeout: Optional[int] = None
+    user_id: str = ""
+
+
+class CaseResult(BaseModel):
+    output: str
+    error: str = ""
+    exit_code: int = 0
+    timed_out: bool = False
+    truncated: bool = False
+    wall_time_ms: float = 0.0
+    cpu_time_ms: float = 0.0
+    peak_rss_kb: int = 0
+
+
+class BatchResponse(BaseModel):
+    results: List[CaseResult]
+    passed_safety: bool = True
+
+
+@app.on_event("startup")
+async def start_pool():
+    """Pre-warm sandbox workers and the fork server before the first request."""
+    if pool:
+        pool.start()
+    if zygote:
+        try:
+            zygote.start()
+        except ZygoteUnavailable:
+            pass
+
+
+@app.on_event("shutdown")
+async def stop_pool():
+    """Kill sandbox workers and the fork server."""
+    if pool:
+        pool.shutdown()
+    if zygote:
+        zygote.shutdown()
 
 
 @app.get("/health")
@@ -56,6 +241,21 @@ async def health():
     return {"status": "healthy", "service": "code-execution-service"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Queue depth, wait times and worker pool state."""
+    return {
+        "scheduler": scheduler.stats(),
+        "pool": pool.stats() if pool else None,
+        "zygote": zygote.stats() if zygote else None,
+        "safety_cache": safety_analyzer.stats(),
+        "result_cache": result_cache.stats() if RESULT_CACHE_ENABLED else None,
+        "bytecode_cache": bytecode_cache.stats() if BYTECODE_CACHE_ENABLED else None,
+        "usage": usage.stats(),
+        "limits": LIMITS.to_dict(),
+    }
+
+
 @app.get("/dapr/subscribe")
 async def subscribe():
     """Dapr pub/sub subscriptions."""
@@ -64,91 +264,355 @@ async def subscribe():
     ]
 
 
+def spawn_run(
+    code: str,
+    stdin: str,
+    args: Sequence[str],
+    run,
+    limits: ResourceLimits = LIMITS,
+    bytecode: Optional[bytes] = None,
+) -> RunResult:
+    """Start a one-off sandbox process: forked from the zygote if possible, else spawned."""
+    if zygote:
+        try:
+            return zygote.spawn(code, stdin, args, run, bytecode=bytecode)
+        except ZygoteUnavailable:
+            pass
+    return spawn_sandbox(code, stdin, args, run, limits)
+
+
+def run_sandboxed(
+    code: str,
+    timeout: int,
+    stdin: str = "",
+    args: Sequence[str] = (),
+    bytecode: Optional[bytes] = None,
+) -> RunResult:
+    """Run code on the worker pool, or in a fresh process if the pool is disabled."""
+    start = time.perf_counter()
+    if pool:
+        result = pool.run(code, timeout, stdin, args, bytecode)
+    else:
+        result = run_spawned(
+            code,
+            timeout,
+            stdin,
+            args,
+            max_output=MAX_OUTPUT_SIZE,
+            limits=LIMITS,
+            spawn=functools.partial(spawn_run, bytecode=bytecode),
+        )
+    result.wall_time_ms = round((time.perf_counter() - start) * 1000, 2)
+    usage.record(result.cpu_time_ms, result.peak_rss_kb, result.exit_code)
+    return result
+
+
+def publish_execution(user_id: str, success: bool):
+    """Publish an execution result to learning.events via Dapr."""
+    try:
+        requests.post(
+            f"{DAPR_BASE_URL}/v1.0/publish/pubsub/learning.events",
+            json={
+                "type": "code_executed",
+                "user_id": user_id,
+                "success": success,
+            },
+            timeout=2,
+        )
+    except Exception:
+        pass
+
+
+def publish_executed(submission: dict, result: CodeResponse):
+    """Publish the outcome of a submitted program to code.executed via Dapr.
+
+    Downstream services (review, debug, progress) consume this instead of
+    code.submitted, so each submission is executed exactly once.
+    """
+    code = submission.get("code", "")
+    try:
+        requests.post(
+            f"{DAPR_BASE_URL}/v1.0/publish/pubsub/code.executed",
+            json={
+                "user_id": submission.get("user_id", ""),
+                "exercise_id": submission.get("exercise_id"),
+                "module_id": submission.get("module_id"),
+                "code": code,
+                "code_hash": hashlib.sha256(code.encode("utf-8", "surrogatepass")).hexdigest(),
+                "status": "success" if result.exit_code == 0 and not result.timed_out else "error",
+                "stdout": result.output,
+                "stderr": result.error,
+                "exit_code": result.exit_code,
+                "timed_out": result.timed_out,
+                "truncated": result.truncated,
+                "wall_time_ms": result.wall_time_ms,
+                "cpu_time_ms": result.cpu_time_ms,
+                "peak_rss_kb": result.peak_rss_kb,
+            },
+            timeout=2,
+        )
+    except Exception:
+        pass
+
+
+def compile_cached(code: str) -> Compiled:
+    """Compiled form of a submission; parse errors are answered from here without a sandbox."""
+    if BYTECODE_CACHE_ENABLED:
+        return bytecode_cache.get(code)
+    return compile_source(code)
+
+
 def check_code_safety(code: str) -> Optional[str]:
-    """Basic safety check on submitted code."""
-    for blocked in BLOCKED_IMPORTS:
-        if f"import {blocked}" in code or f"from {blocked}" in code:
-            return f"Import '{blocked}' is not allowed for security reasons"
-    if "open(" in code and ("w" in code or "a" in code):
-        return "File write operations are not allowed"
-    if "exec(" in code or "eval(" in code:
-        return "exec() and eval() are not allowed"
-    return None
+    """Check code against the safety policy; returns the violation message, if any."""
+    violation = safety_analyzer.check(code)
+    return violation.describe() if violation else None
 
 
 @app.post("/execute", response_model=CodeResponse)
 @app.post("/api/execute", response_model=CodeResponse, include_in_schema=False)
 async def execute_code(request: CodeRequest):
     """Execute Python code in a sandboxed environment."""
+    return await run_request(request, INTERACTIVE)
+
+
+async def run_request(request: CodeRequest, lane: str) -> CodeResponse:
+    """Safety-check, cache-check and run one program on the given scheduler lane."""
     # Safety check
-    safety_issue = check_code_safety(request.code)
-    if safety_issue:
-        return CodeResponse(output="", error=safety_issue, exit_code=1)
+    report = safety_analyzer.analyze(request.code)
+    if report.violation:
+        return CodeResponse(output="", error=report.violation.describe(), exit_code=1)
+
+    compiled = compile_cached(request.code)
+    if compiled.syntax_error:
+        await asyncio.to_thread(publish_execution, request.user_id, False)
+        return CodeResponse(output="", error=compiled.syntax_error, exit_code=1)
 
     timeout = min(request.timeout or MAX_TIMEOUT, MAX_TIMEOUT)
 
     try:
-        with tempfile.NamedTemporaryFile(
-            mode="w", suffix=".py", delete=False
-        ) as f:
-            f.write(request.code)
-            temp_path = f.name
-
-        result = subprocess.run(
-            ["python3", temp_path],
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
-        )
+        cache_key = None
+        result = None
+        if RESULT_CACHE_ENABLED and report.deterministic:
+            cache_key = result_key(
+                request.code, request.stdin, timeout=timeout, max_output=MAX_OUTPUT_SIZE
+            )
+            result = result_cache.get(cache_key)
+        cached = result is not None
+
+        if result is None:
+            result = await asyncio.wrap_future(
+                scheduler.submit(
+                    run_sandboxed, request.code, timeout, request.stdin, (), compiled.bytecode, lane=lane
+                )
+            )
+            if cache_key and cacheable(result):
+                result_cache.put(cache_key, result)
 
-        output = result.stdout[:MAX_OUTPUT_SIZE]
-        error = result.stderr[:MAX_OUTPUT_SIZE]
+        if result.timed_out:
+            return CodeResponse(
+                output="",
+                error=result.error,
+                exit_code=1,
+                timed_out=True,
+                wall_time_ms=result.wall_time_ms,
+            )
 
         response = CodeResponse(
-            output=output,
-            error=error,
-            exit_code=result.returncode,
+            output=result.output,
+            error=result.error,
+            exit_code=result.exit_code,
+            truncated=result.truncated,
+            cached=cached,
+            wall_time_ms=result.wall_time_ms,
+            cpu_time_ms=result.cpu_time_ms,
+            peak_rss_kb=result.peak_rss_kb,
         )
 
         # Publish execution result via Dapr
-        try:
-            requests.post(
-                f"{DAPR_BASE_URL}/v1.0/publish/pubsub/learning.events",
-                json={
-                    "type": "code_executed",
-                    "user_id": request.user_id,
-                    "success": result.returncode == 0,
-                },
-                timeout=2,
-            )
-        except Exception:
-            pass
+        await asyncio.to_thread(publish_execution, request.user_id, result.exit_code == 0)
 
         return response
 
-    except subprocess.TimeoutExpired:
-        return CodeResponse(
-            output="", error="Code execution timed out", exit_code=1, timed_out=True
+    except Rejected as e:
+        raise HTTPException(
+            status_code=429 if isinstance(e, QueueFull) else 503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
         )
+    except PoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/execute/stream")
+@app.post("/api/execute/stream", include_in_schema=False)
+async def execute_stream(request: CodeRequest):
+    """Execute code in a one-off process and stream stdout/stderr as Server-Sent Events.
+
+    Emits `stdout`/`stderr` events with JSON-encoded text chunks as they are
+    produced, then one `exit` event. The child is killed as soon as either
+    stream reaches MAX_OUTPUT_SIZE.
+    """
+    safety_issue = check_code_safety(request.code)
+    if safety_issue:
+        events = [
+            _sse("stderr", safety_issue),
+            _sse("exit", {"exit_code": 1, "timed_out": False, "truncated": False}),
+        ]
+        return StreamingResponse(iter(events), media_type="text/event-stream")
+
+    compiled = compile_cached(request.code)
+    if compiled.syntax_error:
+        events = [
+            _sse("stderr", compiled.syntax_error),
+            _sse("exit", {"exit_code": 1, "timed_out": False, "truncated": False}),
+        ]
+        return StreamingResponse(iter(events), media_type="text/event-stream")
+
+    timeout = min(request.timeout or MAX_TIMEOUT, MAX_TIMEOUT)
+    chunks: queue.Queue = queue.Queue()
+    cancelled = threading.Event()
+
+    def run() -> RunResult:
+        start = time.perf_counter()
+        status = spawn_run(
+            request.code,
+            request.stdin,
+            (),
+            lambda proc: pump_output(
+                proc, timeout, MAX_OUTPUT_SIZE, lambda stream, text: chunks.put((stream, text)), cancelled
+            ),
+            LIMITS,
+            compiled.bytecode,
+        )
+        status.wall_time_ms = round((time.perf_counter() - start) * 1000, 2)
+        usage.record(status.cpu_time_ms, status.peak_rss_kb, status.exit_code)
+        return status
+
+    try:
+        future = scheduler.submit(run)
+    except Rejected as e:
+        raise HTTPException(
+            status_code=429 if isinstance(e, QueueFull) else 503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    future.add_done_callback(lambda _: chunks.put(None))
+
+    async def events():
         try:
-            os.unlink(temp_path)
-        except Exception:
-            pass
+            while True:
+                item = await asyncio.to_thread(chunks.get)
+                if item is None:
+                    break
+                yield _sse(*item)
+            try:
+                status = future.result()
+            except Exception as e:
+                yield _sse("error", str(e))
+                return
+            if status.error:
+                yield _sse("stderr", ("\n" if status.truncated else "") + status.error)
+            yield _sse("exit", {
+                "exit_code": status.exit_code,
+                "timed_out": status.timed_out,
+                "truncated": status.truncated,
+                "wall_time_ms": status.wall_time_ms,
+                "cpu_time_ms": status.cpu_time_ms,
+                "peak_rss_kb": status.peak_rss_kb,
+            })
+            await asyncio.to_thread(publish_execution, request.user_id, status.exit_code == 0)
+        finally:
+            # Client went away (or we finished): stop the child if it's still running
+            cancelled.set()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/execute/batch", response_model=BatchResponse)
+@app.post("/api/execute/batch", response_model=BatchResponse, include_in_schema=False)
+async def execute_batch(request: BatchRequest):
+    """Run one program against many stdin/argument cases, fanned out across the sandbox pool."""
+    if not request.cases:
+        raise HTTPException(status_code=422, detail="At least one case is required")
+    if len(request.cases) > MAX_BATCH_CASES:
+        raise HTTPException(
+            status_code=422, detail=f"At most {MAX_BATCH_CASES} cases per batch"
+        )
+
+    safety_issue = check_code_safety(request.code)
+    if safety_issue:
+        return BatchResponse(
+            results=[CaseResult(output="", error=safety_issue, exit_code=1) for _ in request.cases],
+            passed_safety=False,
+        )
+
+    compiled = compile_cached(request.code)
+    if compiled.syntax_error:
+        return BatchResponse(results=[
+            CaseResult(output="", error=compiled.syntax_error, exit_code=1) for _ in request.cases
+        ])
+
+    timeout = min(request.timeout or MAX_TIMEOUT, MAX_TIMEOUT)
+
+    try:
+        futures = scheduler.submit_all(
+            run_sandboxed,
+            [
+                (request.code, timeout, case.stdin, case.args, compiled.bytecode)
+                for case in request.cases
+            ],
+        )
+        results = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+    except Rejected as e:
+        raise HTTPException(
+            status_code=429 if isinstance(e, QueueFull) else 503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except PoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    await asyncio.to_thread(
+        publish_execution, request.user_id, all(r.exit_code == 0 for r in results)
+    )
+
+    return BatchResponse(results=[
+        CaseResult(
+            output="" if r.timed_out else r.output,
+            error=r.error,
+            exit_code=1 if r.timed_out else r.exit_code,
+            timed_out=r.timed_out,
+            truncated=r.truncated,
+            wall_time_ms=r.wall_time_ms,
+            cpu_time_ms=r.cpu_time_ms,
+            peak_rss_kb=r.peak_rss_kb,
+        )
+        for r in results
+    ])
 
 
 @app.post("/events/code")
 async def handle_code_event(event: dict):
-    """Handle code submission events from pub/sub."""
+    """Run code submission events on the background lane and publish code.executed."""
     data = event.get("data", {})
     code = data.get("code", "")
     user_id = data.get("user_id", "")
 
     if code:
-        result = await execute_code(CodeRequest(code=code, user_id=user_id))
+        result = await run_request(CodeRequest(code=code, user_id=user_id), BACKGROUND)
+        await asyncio.to_thread(publish_executed, data, result)
         return {"status": "executed", "exit_code": result.exit_code}
 
     return {"status": "processed"}
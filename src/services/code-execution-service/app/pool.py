@@ -0,0 +1,222 @@
+"""Pre-warmed interpreter worker pool for the execution service."""
+import base64
+import json
+import os
+import select
+import subprocess
+import sys
+import threading
+import time
+from typing import List, Optional, Sequence
+
+from app.limits import ResourceLimits, killed_by_limit
+from app.sandbox import RunResult, kill_process_group, timed_out_result
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+
+
+class PoolBusy(Exception):
+    """Raised when too many requests are already waiting for a free worker."""
+
+
+class WorkerCrashed(Exception):
+    """Raised when a worker exits before returning a result."""
+
+
+class PoolWorker:
+    """A single pre-started interpreter that runs jobs sent over a pipe, each in its own forked child."""
+
+    def __init__(self, limits: Optional[ResourceLimits] = None):
+        argv = [sys.executable, WORKER_SCRIPT]
+        if limits:
+            argv.append(json.dumps(limits.to_dict()))
+        self.proc = subprocess.Popen(
+            argv,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+            start_new_session=True,
+        )
+        self.runs = 0
+        self._buffer = b""
+
+    def run(self, job: dict, timeout: float) -> dict:
+        """Send a job and wait up to `timeout` seconds for its result.
+
+        Results carry the job's id; a result for another job, or anything
+        beyond the one expected line, means the stream was tampered with,
+        and the worker is killed.
+        """
+        deadline = time.monotonic() + timeout
+        self.runs += 1
+        job = {**job, "id": self.runs}
+        try:
+            self.proc.stdin.write(json.dumps(job).encode() + b"\n")
+            self.proc.stdin.flush()
+        except (BrokenPipeError, ValueError) as e:
+            raise WorkerCrashed(str(e))
+        line = self._read_line(deadline)
+        try:
+            result = json.loads(line)
+        except ValueError:
+            result = None
+        if self._buffer or not isinstance(result, dict) or result.get("id") != job["id"]:
+            self.close()
+            raise WorkerCrashed("worker returned an unexpected result")
+        return result
+
+    def _read_line(self, deadline: float) -> bytes:
+        fd = self.proc.stdout.fileno()
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError()
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                raise TimeoutError()
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise WorkerCrashed("worker closed its output pipe")
+            self._buffer += chunk
+        line, _, self._buffer = self._buffer.partition(b"\n")
+        return line
+
+    def close(self):
+        """Kill the worker process and anything it forked."""
+        try:
+            kill_process_group(self.proc)
+            self.proc.wait(timeout=5)
+        except Exception:
+            pass
+
+    def exit_code(self) -> int:
+        """Exit status of a worker that has died (1 if still unknown)."""
+        try:
+            return self.proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            return 1
+
+
+class WorkerPool:
+    """Fixed-size pool of warm workers, recycled after `max_runs` jobs or any timeout."""
+
+    def __init__(
+        self,
+        size: int,
+        max_runs: int,
+        queue_depth: int,
+        max_output: int = 0,
+        limits: Optional[ResourceLimits] = None,
+    ):
+        self.size = size
+        self.max_runs = max_runs
+        self.queue_depth = queue_depth
+        # Per-stream output cap enforced inside the worker (0 = unlimited)
+        self.max_output = max_output
+        self.limits = limits
+        self._idle: List[PoolWorker] = []
+        self._cond = threading.Condition()
+        self._started = False
+        self._waiting = 0
+        self.recycled = 0
+
+    def start(self):
+        """Start all workers (idempotent)."""
+        with self._cond:
+            if not self._started:
+                self._idle = [PoolWorker(self.limits) for _ in range(self.size)]
+                self._started = True
+
+    def shutdown(self):
+        """Kill idle workers; busy workers are killed when released."""
+        with self._cond:
+            workers, self._idle = self._idle, []
+            self._started = False
+        for worker in workers:
+            worker.close()
+
+    def run(
+        self,
+        code: str,
+        timeout: float,
+        stdin: str = "",
+        args: Sequence[str] = (),
+        bytecode: Optional[bytes] = None,
+    ) -> RunResult:
+        """Run code on a free worker, waiting for one if all are busy.
+
+        `bytecode` is the marshalled code object for `code`; the source is
+        still sent so tracebacks can show it.
+        """
+        job = {
+            "code": code,
+            "stdin": stdin,
+            "args": list(args),
+            "max_output": self.max_output,
+            "cpu_seconds": self.limits.cpu_seconds if self.limits else 0,
+        }
+        if bytecode:
+            job["bytecode"] = base64.b64encode(bytecode).decode()
+        worker = self._acquire()
+        recycle = True
+        try:
+            result = worker.run(job, timeout)
+            recycle = worker.runs >= self.max_runs
+            if result.get("died"):
+                # The job's child died before reporting; the worker itself is fine
+                result["error"] = killed_by_limit(result["exit_code"]) or "Process exited unexpectedly"
+            return RunResult(
+                output=result["output"],
+                error=result["error"],
+                exit_code=result["exit_code"],
+                truncated=result.get("truncated", False),
+                cpu_time_ms=result.get("cpu_time_ms", 0.0),
+                peak_rss_kb=result.get("peak_rss_kb", 0),
+            )
+        except TimeoutError:
+            return timed_out_result()
+        except WorkerCrashed:
+            exit_code = worker.exit_code()
+            return RunResult(
+                output="",
+                error=killed_by_limit(exit_code) or "Process exited unexpectedly",
+                exit_code=exit_code,
+            )
+        finally:
+            self._release(worker, recycle)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "recycled": self.recycled,
+            }
+
+    def _acquire(self) -> PoolWorker:
+        self.start()
+        with self._cond:
+            if not self._idle and self._waiting >= self.queue_depth:
+                raise PoolBusy("All sandbox workers are busy")
+            self._waiting += 1
+            try:
+                while not self._idle:
+                    self._cond.wait()
+            finally:
+                self._waiting -= 1
+            return self._idle.pop()
+
+    def _release(self, worker: PoolWorker, recycle: bool):
+        if recycle:
+            worker.close()
+            worker = PoolWorker(self.limits)
+        with self._cond:
+            if recycle:
+                self.recycled += 1
+            if self._started:
+                self._idle.append(worker)
+                self._cond.notify()
+                return
+        worker.close()
@@ -0,0 +1,452 @@
+"""AST-based safety analyzer for submitted code.
+
+A single walk over the syntax tree checks imports, calls and attribute
+access against a deny-policy, and optionally flags programs whose output
+may differ between runs. Verdicts are cached by source hash.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+import ast
+import hashlib
+import re
+import threading
+from typing import Dict, FrozenSet, Iterable, Optional, Pattern, Set, Tuple
+
+
+@dataclass(frozen=True)
+class Violation:
+    """A policy violation at a 1-based line/column in the source."""
+    message: str
+    line: int
+    col: int
+
+    def describe(self) -> str:
+        return f"{self.message} (line {self.line}, column {self.col})"
+
+
+@dataclass(frozen=True)
+class SafetyReport:
+    """Analyzer verdict for one source text."""
+    violation: Optional[Violation]
+    deterministic: bool
+
+
+@dataclass(frozen=True)
+class SafetyPolicy:
+    """Compiled deny-policy; build one with `SafetyPolicy.build`."""
+    blocked_modules: FrozenSet[str]
+    blocked_calls: FrozenSet[str]
+    blocked_attrs: Dict[str, FrozenSet[str]]
+    blocked_attr_prefixes: Dict[str, Tuple[str, ...]]
+    blocked_dunders: FrozenSet[str]
+    # Method names blocked whatever object they are called on (e.g. Path.write_text)
+    blocked_methods: FrozenSet[str]
+    # Source that matches none of these tokens cannot violate the policy,
+    # so it skips parsing entirely.
+    triggers: Pattern
+
+    @classmethod
+    def build(
+        cls,
+        blocked_modules: Iterable[str],
+        blocked_calls: Iterable[str] = (
+            "exec", "eval", "compile", "__import__", "vars", "globals", "locals", "breakpoint",
+        ),
+        blocked_attrs: Optional[Dict[str, Iterable[str]]] = None,
+        blocked_dunders: Iterable[str] = ("__subclasses__", "__globals__", "__builtins__", "__code__"),
+        blocked_methods: Iterable[str] = (),
+    ) -> "SafetyPolicy":
+        exact: Dict[str, FrozenSet[str]] = {}
+        prefixes: Dict[str, Tuple[str, ...]] = {}
+        for module, names in (blocked_attrs or {}).items():
+            names = list(names)
+            exact[module] = frozenset(n for n in names if not n.endswith("*"))
+            prefixes[module] = tuple(n[:-1] for n in names if n.endswith("*"))
+        blocked_calls = frozenset(blocked_calls)
+        blocked_methods = frozenset(blocked_methods)
+        # Module attributes are only reachable after an import; open() and
+        # get/set/delattr() are checked by name; dunders all contain "__".
+        triggers = {"import", "open", "attr", "__"} | blocked_calls | blocked_methods
+        return cls(
+            blocked_modules=frozenset(blocked_modules),
+            blocked_calls=blocked_calls,
+            blocked_attrs=exact,
+            blocked_attr_prefixes=prefixes,
+            blocked_dunders=frozenset(blocked_dunders),
+            blocked_methods=blocked_methods,
+            triggers=re.compile("|".join(re.escape(t) for t in sorted(triggers))),
+        )
+
+    def module_blocked(self, name: str) -> bool:
+        return name.split(".", 1)[0] in self.blocked_modules
+
+    def attr_blocked(self, module: str, attr: str) -> bool:
+        return attr in self.blocked_attrs.get(module, ()) or attr.startswith(
+            self.blocked_attr_prefixes.get(module, ())
+        )
+
+    def has_blocked_attrs(self, module: str) -> bool:
+        return bool(self.blocked_attrs.get(module) or self.blocked_attr_prefixes.get(module))
+
+    def import_blocked(self, name: str) -> Optional[str]:
+        """The blocked part of a dotted import (`os.system`, `asyncio.subprocess`), if any."""
+        if self.module_blocked(name):
+            return name.split(".", 1)[0]
+        parts = name.split(".")
+        for i in range(1, len(parts)):
+            module = ".".join(parts[:i])
+            if self.attr_blocked(module, parts[i]):
+                return f"{module}.{parts[i]}"
+        return None
+
+
+WRITE_MODE_CHARS = frozenset("wax+")
+# Functions that open files, and the position of their mode argument
+OPEN_FUNCTIONS = {
+    "open": 1, "io.open": 1, "io.FileIO": 1, "codecs.open": 1, "os.fdopen": 1,
+    "gzip.open": 1, "bz2.open": 1, "lzma.open": 1, "tarfile.open": 1,
+}
+# Functions whose arguments are checked, so they may only be called directly
+CALL_ONLY = frozenset(OPEN_FUNCTIONS) | {"os.open", "importlib.import_module"}
+MODE_CHARS = frozenset("rwaxbt+")
+# os.open flags that only read; any other flags value may write
+READ_ONLY_OPEN_FLAGS = frozenset({"O_RDONLY", "O_CLOEXEC", "O_NOFOLLOW", "O_DIRECTORY", "O_NONBLOCK"})
+
+# Modules whose use makes output depend on clock, entropy, environment or I/O
+NONDETERMINISTIC_MODULES = frozenset({
+    "time", "random", "datetime", "secrets", "uuid", "os", "sys", "io",
+    "threading", "multiprocessing", "asyncio", "tempfile", "pathlib",
+    "glob", "fileinput", "signal", "gc", "platform", "getpass",
+})
+# Builtins that read input, files or memory addresses
+NONDETERMINISTIC_CALLS = frozenset({"input", "open", "id", "hash", "set", "frozenset"})
+# Calls whose arguments end up in the output as text
+OUTPUT_CALLS = frozenset({"print", "str", "repr", "format", "ascii"})
+# Cheap pre-filter for the determinism check: sets ("{"), classes whose
+# default repr prints an address, functions, lambdas and bare objects that
+# may be printed, imports and the calls above
+NONDETERMINISM_TRIGGERS = re.compile(
+    "import|class|def|lambda|object|\\{|" + "|".join(sorted(NONDETERMINISTIC_CALLS))
+)
+
+
+class _Analyzer(ast.NodeVisitor):
+    def __init__(self, policy: SafetyPolicy):
+        self.policy = policy
+        # Local name -> what it refers to, e.g. {"o": "os"} after `import os as o`
+        # and {"system": "os.system"} after `from os import system`
+        self.aliases: Dict[str, str] = {}
+        self.violation: Optional[Violation] = None
+        self.deterministic = True
+        # Names bound to functions, and names shown as text; a function's
+        # repr includes its memory address
+        self.function_names: Set[str] = set()
+        self.shown_names: Set[str] = set()
+        # Nodes (by id) in positions the checks above have vetted: `mod` in
+        # `mod.attr` or getattr(mod, "attr"), and callees
+        self._vetted: Set[int] = set()
+
+    def fail(self, node: ast.AST, message: str):
+        if self.violation is None:
+            self.violation = Violation(message, node.lineno, node.col_offset + 1)
+
+    def generic_visit(self, node: ast.AST):
+        if self.violation is None:
+            super().generic_visit(node)
+
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            if alias.name.split(".", 1)[0] in NONDETERMINISTIC_MODULES:
+                self.deterministic = False
+            blocked = self.policy.import_blocked(alias.name)
+            if blocked:
+                return self.fail(node, f"Import '{blocked}' is not allowed for security reasons")
+            if alias.asname:
+                self.aliases[alias.asname] = alias.name
+            else:
+                top = alias.name.split(".", 1)[0]
+                self.aliases[top] = top
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        if node.level or not node.module:
+            return
+        if node.module.split(".", 1)[0] in NONDETERMINISTIC_MODULES:
+            self.deterministic = False
+        blocked = self.policy.import_blocked(node.module)
+        if blocked:
+            return self.fail(node, f"Import '{blocked}' is not allowed for security reasons")
+        for alias in node.names:
+            if alias.name == "*":
+                # Would bind blocked names without ever spelling them out
+                if self.policy.has_blocked_attrs(node.module):
+                    return self.fail(node, f"'from {node.module} import *' is not allowed for security reasons")
+                continue
+            if self.policy.attr_blocked(node.module, alias.name):
+                return self.fail(node, f"'{node.module}.{alias.name}' is not allowed for security reasons")
+            if self.policy.module_blocked(f"{node.module}.{alias.name}"):
+                return self.fail(node, f"Import '{node.module}.{alias.name}' is not allowed for security reasons")
+            self.aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+
+    def visit_Attribute(self, node: ast.Attribute):
+        if node.attr in self.policy.blocked_dunders:
+            return self.fail(node, f"Access to '{node.attr}' is not allowed")
+        if node.attr in self.policy.blocked_methods:
+            return self.fail(node, f"'.{node.attr}()' is not allowed for security reasons")
+        if isinstance(node.value, ast.Name):
+            module = self.aliases.get(node.value.id)
+            if module and self.policy.attr_blocked(module, node.attr):
+                return self.fail(node, f"'{module}.{node.attr}' is not allowed for security reasons")
+            # e.g. os.__dict__["system"]
+            if module and node.attr.startswith("__") and self.policy.has_blocked_attrs(module):
+                return self.fail(node, f"Access to '{module}.{node.attr}' is not allowed")
+            if module and f"{module}.{node.attr}" in CALL_ONLY and id(node) not in self._vetted:
+                return self.fail(node, f"'{module}.{node.attr}' may only be called directly")
+            self._vetted.add(id(node.value))
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name):
+        # id/hash passed around rather than called, e.g. map(id, items)
+        if node.id in ("id", "hash") and isinstance(node.ctx, ast.Load):
+            self.deterministic = False
+        if node.id in self.policy.blocked_dunders:
+            return self.fail(node, f"Access to '{node.id}' is not allowed")
+        # Blocked builtins are rejected however they are used: `e = exec; e(...)`
+        if node.id in self.policy.blocked_calls and node.id not in self.aliases:
+            if node.id in ("exec", "eval"):
+                return self.fail(node, "exec() and eval() are not allowed")
+            return self.fail(node, f"{node.id}() is not allowed")
+        if not isinstance(node.ctx, ast.Load) or id(node) in self._vetted:
+            return
+        # Anywhere else, a restricted module or function could be aliased or
+        # passed on (`x = os; x.system(...)`) past the checks
+        target = self.aliases.get(node.id, "open" if node.id == "open" else None)
+        if target and self.policy.has_blocked_attrs(target):
+            return self.fail(node, f"Module '{target}' may only be used as '{node.id}.<attribute>'")
+        if target in CALL_ONLY:
+            return self.fail(node, f"'{target}' may only be called directly")
+
+    def visit_FunctionDef(self, node: ast.AST):
+        self.function_names.add(node.name)
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Assign(self, node: ast.Assign):
+        if isinstance(node.value, ast.Lambda):
+            self.function_names.update(t.id for t in node.targets if isinstance(t, ast.Name))
+        self.generic_visit(node)
+
+    def visit_FormattedValue(self, node: ast.FormattedValue):
+        self._shown(node.value)
+        self.generic_visit(node)
+
+    def _shown(self, node: ast.AST):
+        """`node`'s value is turned into output text."""
+        if isinstance(node, ast.Lambda) or (
+            isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "object"
+        ):
+            # <function <lambda> at 0x...>, <object object at 0x...>
+            self.deterministic = False
+        elif isinstance(node, ast.Name):
+            self.shown_names.add(node.id)
+
+    def prints_addresses(self) -> bool:
+        return bool(self.function_names & self.shown_names)
+
+    def visit_Set(self, node: ast.AST):
+        # String hashing is randomized per process, so set order can vary
+        self.deterministic = False
+        self.generic_visit(node)
+
+    visit_SetComp = visit_Set
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        methods = {
+            item.name for item in node.body
+            if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))
+        }
+        # The default object repr includes a memory address
+        if not methods & {"__repr__", "__str__"}:
+            self.deterministic = False
+        self.generic_visit(node)
+
+    def visit_Call(self, node: ast.Call):
+        func = node.func
+        name = func.id if isinstance(func, ast.Name) else None
+        if name in NONDETERMINISTIC_CALLS:
+            self.deterministic = False
+        if name in OUTPUT_CALLS or (isinstance(func, ast.Attribute) and func.attr == "format"):
+            for arg in [*node.args, *(keyword.value for keyword in node.keywords)]:
+                self._shown(arg)
+        self._vetted.add(id(func))
+        target = self._qualname(func)
+        if target in OPEN_FUNCTIONS:
+            self._check_mode(node, OPEN_FUNCTIONS[target])
+        elif target == "os.open":
+            self._check_os_open(node)
+        elif isinstance(func, ast.Attribute) and func.attr == "open" and target is None:
+            # Methods such as Path.open(mode) take the mode first; others
+            # (ZipFile.open(name)) take a file name there
+            self._check_mode(node, 0, method=True)
+        elif name in ("getattr", "setattr", "delattr") and len(node.args) >= 2:
+            self._check_getattr(node)
+        elif target == "importlib.import_module":
+            module = _literal_str(node.args[0]) if node.args else None
+            if module is None:
+                return self.fail(node, "Dynamic imports are not allowed")
+            blocked = self.policy.import_blocked(module)
+            if blocked:
+                return self.fail(node, f"Import '{blocked}' is not allowed for security reasons")
+        self.generic_visit(node)
+
+    def _qualname(self, func: ast.AST) -> Optional[str]:
+        """Dotted name a callee refers to: `open`, `io.open`, `os.open`; None for other objects."""
+        if isinstance(func, ast.Name):
+            return self.aliases.get(func.id, func.id if func.id == "open" else None)
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+            module = self.aliases.get(func.value.id)
+            if module:
+                return f"{module}.{func.attr}"
+        return None
+
+    def _check_mode(self, node: ast.Call, position: int, method: bool = False):
+        if _unpacks(node):
+            return self.fail(node, "File write operations are not allowed")
+        mode_node = node.args[position] if len(node.args) > position else None
+        if method:
+            # A positional argument only counts as a mode if it looks like one
+            literal = _literal_str(mode_node) if mode_node is not None else None
+            if not literal or not MODE_CHARS.issuperset(literal):
+                mode_node = None
+        for keyword in node.keywords:
+            if keyword.arg == "mode":
+                mode_node = keyword.value
+        if mode_node is None:
+            return
+        mode = _literal_str(mode_node)
+        if mode is None or WRITE_MODE_CHARS.intersection(mode):
+            self.fail(node, "File write operations are not allowed")
+
+    def _check_os_open(self, node: ast.Call):
+        if _unpacks(node):
+            return self.fail(node, "File write operations are not allowed")
+        flags = node.args[1] if len(node.args) > 1 else None
+        for keyword in node.keywords:
+            if keyword.arg == "flags":
+                flags = keyword.value
+        if flags is None or not self._read_only_flags(flags):
+            self.fail(node, "File write operations are not allowed")
+
+    def _read_only_flags(self, node: ast.AST) -> bool:
+        if isinstance(node, ast.Constant):
+            return node.value == 0
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+            return self._read_only_flags(node.left) and self._read_only_flags(node.right)
+        return (
+            isinstance(node, ast.Attribute)
+            and isinstance(node.value, ast.Name)
+            and self.aliases.get(node.value.id) == "os"
+            and node.attr in READ_ONLY_OPEN_FLAGS
+        )
+
+    def _check_getattr(self, node: ast.Call):
+        attr = _literal_str(node.args[1])
+        target = node.args[0]
+        module = self.aliases.get(target.id) if isinstance(target, ast.Name) else None
+        if attr is None:
+            if module and self.policy.has_blocked_attrs(module):
+                return self.fail(node, f"Dynamic attribute access on '{module}' is not allowed")
+            # e.g. getattr(f, "__glo" + "bals__")
+            if any("__" in part for part in _string_constants(node.args[1])):
+                return self.fail(node, "Dynamic access to dunder attributes is not allowed")
+            return
+        if attr in self.policy.blocked_dunders or (
+            module and attr.startswith("__") and self.policy.has_blocked_attrs(module)
+        ):
+            return self.fail(node, f"Access to '{attr}' is not allowed")
+        if module and self.policy.attr_blocked(module, attr):
+            return self.fail(node, f"'{module}.{attr}' is not allowed for security reasons")
+        self._vetted.add(id(target))
+
+
+def _unpacks(node: ast.Call) -> bool:
+    """Whether the call passes *args or **kwargs, hiding which arguments it sets."""
+    return any(isinstance(arg, ast.Starred) for arg in node.args) or any(
+        keyword.arg is None for keyword in node.keywords
+    )
+
+
+def _string_constants(node: ast.AST) -> Iterable[str]:
+    return (n.value for n in ast.walk(node) if isinstance(n, ast.Constant) and isinstance(n.value, str))
+
+
+def _literal_str(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+class SafetyAnalyzer:
+    """Checks code against a policy, caching verdicts by SHA-256 of the source.
+
+    With `track_determinism` the analyzer also reports whether a program's
+    output can only depend on its source (see NONDETERMINISTIC_*). Without
+    it, every report says deterministic=False.
+    """
+
+    def __init__(self, policy: SafetyPolicy, cache_size: int = 1024, track_determinism: bool = False):
+        self.policy = policy
+        self.cache_size = cache_size
+        self.track_determinism = track_determinism
+        self._cache: "OrderedDict[str, SafetyReport]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def check(self, code: str) -> Optional[Violation]:
+        """Return the first violation in `code`, or None if it is allowed.
+
+        Code that does not parse is allowed through: it cannot run, and the
+        interpreter reports the SyntaxError itself.
+        """
+        return self.analyze(code).violation
+
+    def analyze(self, code: str) -> SafetyReport:
+        """Return the full (cached) report for `code`."""
+        key = hashlib.sha256(code.encode("utf-8", "surrogatepass")).hexdigest()
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            self.misses += 1
+
+        needs_walk = self.policy.triggers.search(code) or (
+            self.track_determinism and NONDETERMINISM_TRIGGERS.search(code)
+        )
+        if needs_walk:
+            report = self._analyze(code)
+        else:
+            report = SafetyReport(violation=None, deterministic=self.track_determinism)
+
+        with self._lock:
+            self._cache[key] = report
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return report
+
+    def _analyze(self, code: str) -> SafetyReport:
+        try:
+            tree = ast.parse(code)
+        except (SyntaxError, ValueError):
+            return SafetyReport(violation=None, deterministic=False)
+        analyzer = _Analyzer(self.policy)
+        analyzer.visit(tree)
+        return SafetyReport(
+            violation=analyzer.violation,
+            deterministic=self.track_determinism and analyzer.deterministic and not analyzer.prints_addresses(),
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,253 @@
+"""Process-level helpers for running student submissions."""
+from dataclasses import dataclass
+import codecs
+import os
+import select
+import signal
+import subprocess
+import threading
+import time
+from typing import Callable, Optional, Sequence
+
+from app.limits import ResourceLimits, killed_by_limit
+
+OUTPUT_LIMIT_MESSAGE = "Output limit of {limit} characters exceeded; program stopped"
+
+# Run with `python3 -I -B -u -c BOOTSTRAP`: reads the header line
+# "<length> [<cpu seconds> <memory bytes> <file size bytes> <processes>]"
+# and then <length> bytes of source from fd 0, without buffering past them,
+# so the remaining stdin belongs to the program. The limits (0 = none) are
+# applied here before the source runs, not in a preexec_fn: that is not
+# safe in a service that already runs scheduler and feeder threads.
+# The source then runs as main.py. -I keeps the service directory off
+# sys.path and ignores PYTHON* variables; -B skips .pyc writes.
+BOOTSTRAP = """\
+import builtins, os, sys
+def _read(n):
+    buf = b""
+    while len(buf) < n:
+        chunk = os.read(0, n - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return buf
+_header = b""
+while not _header.endswith(b"\\n"):
+    _byte = os.read(0, 1)
+    if not _byte:
+        break
+    _header += _byte
+_size, *_limits = [int(_field) for _field in _header.split()] or [0]
+if any(_limits):
+    import resource
+    _cpu, _memory, _file_size, _processes = _limits
+    if _cpu:
+        resource.setrlimit(resource.RLIMIT_CPU, (_cpu, _cpu + 1))
+    for _limit, _value in (
+        (resource.RLIMIT_AS, _memory), (resource.RLIMIT_FSIZE, _file_size), (resource.RLIMIT_NPROC, _processes),
+    ):
+        if _value:
+            resource.setrlimit(_limit, (_value, _value))
+    del resource, sys.modules["resource"]
+_code = _read(_size).decode("utf-8", "surrogateescape")
+sys.argv[0] = "main.py"
+_namespace = {"__name__": "__main__", "__file__": "main.py", "__builtins__": builtins}
+del _read, _header, _size, _limits
+try:
+    exec(compile(_code, "main.py", "exec"), _namespace)
+except SystemExit:
+    raise
+except BaseException:
+    # Imported lazily: traceback/linecache cost ~3 ms of startup per run
+    import linecache, traceback
+    linecache.cache["main.py"] = (len(_code), None, _code.splitlines(True), "main.py")
+    _type, _value, _tb = sys.exc_info()
+    traceback.print_exception(_type, _value, _tb.tb_next)
+    sys.exit(1)
+"""
+
+
+@dataclass
+class RunResult:
+    """Outcome of a single sandboxed run."""
+    output: str
+    error: str = ""
+    exit_code: int = 0
+    timed_out: bool = False
+    truncated: bool = False
+    wall_time_ms: float = 0.0
+    cpu_time_ms: float = 0.0
+    peak_rss_kb: int = 0
+
+
+def timed_out_result() -> RunResult:
+    """Result reported when a run exceeds its wall-clock timeout."""
+    return RunResult(output="", error="Code execution timed out", exit_code=1, timed_out=True)
+
+
+def kill_process_group(proc: subprocess.Popen):
+    """Kill a sandbox process and anything it forked."""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        proc.kill()
+
+
+def feed_stdin(proc: subprocess.Popen, data: bytes):
+    try:
+        if data:
+            proc.stdin.write(data)
+        proc.stdin.close()
+    except (BrokenPipeError, ValueError, OSError):
+        pass
+
+
+def _reap(proc: subprocess.Popen, deadline: float):
+    """Wait for the child until `deadline` and return (timed_out, rusage)."""
+    timed_out = False
+    while True:
+        pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            break
+        if time.monotonic() >= deadline:
+            kill_process_group(proc)
+            pid, status, usage = os.wait4(proc.pid, 0)
+            timed_out = True
+            break
+        time.sleep(0.005)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return timed_out, usage
+
+
+def pump_output(
+    proc: subprocess.Popen,
+    timeout: float,
+    max_output: int,
+    on_chunk: Callable[[str, str], None],
+    cancelled: Optional[threading.Event] = None,
+) -> RunResult:
+    """Forward a child's stdout/stderr to `on_chunk` as it is produced.
+
+    At most `max_output` bytes per stream are read. The child (and its
+    process group) is killed as soon as a stream reaches the cap, the
+    deadline passes, or `cancelled` is set, so memory stays bounded by the
+    cap rather than by what the program prints. The returned RunResult
+    carries status only; output goes to `on_chunk`.
+    """
+    deadline = time.monotonic() + timeout
+    streams = {proc.stdout.fileno(): "stdout", proc.stderr.fileno(): "stderr"}
+    decoders = {name: codecs.getincrementaldecoder("utf-8")("replace") for name in streams.values()}
+    sizes = {name: 0 for name in streams.values()}
+    status = RunResult(output="")
+
+    while streams:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            status.timed_out = True
+            break
+        if cancelled is not None and cancelled.is_set():
+            break
+        ready, _, _ = select.select(list(streams), [], [], min(remaining, 0.25))
+        for fd in ready:
+            chunk = os.read(fd, 65536)
+            name = streams[fd]
+            if not chunk:
+                del streams[fd]
+                continue
+            room = max_output - sizes[name]
+            if len(chunk) > room:
+                chunk = chunk[:room]
+                status.truncated = True
+            sizes[name] += len(chunk)
+            text = decoders[name].decode(chunk)
+            if text:
+                on_chunk(name, text)
+        if status.truncated:
+            break
+
+    if streams:
+        kill_process_group(proc)
+    # Zygote-forked runs aren't our children; their handle knows how to reap them
+    reap = getattr(proc, "reap", None) or (lambda d: _reap(proc, d))
+    timed_out, usage = reap(max(deadline, time.monotonic() + 0.1))
+    status.timed_out = status.timed_out or timed_out
+    status.cpu_time_ms = round((usage.ru_utime + usage.ru_stime) * 1000, 2)
+    status.peak_rss_kb = usage.ru_maxrss
+
+    if status.timed_out:
+        status.exit_code = 1
+        status.error = "Code execution timed out"
+    elif status.truncated:
+        status.exit_code = 1
+        status.error = OUTPUT_LIMIT_MESSAGE.format(limit=max_output)
+    else:
+        status.exit_code = proc.returncode
+        status.error = killed_by_limit(proc.returncode) or ""
+    return status
+
+
+def spawn_sandbox(
+    code: str,
+    stdin: str,
+    args: Sequence[str],
+    run: Callable[[subprocess.Popen], RunResult],
+    limits: Optional[ResourceLimits] = None,
+) -> RunResult:
+    """Start a fresh python3 process for `code` (under `limits`) and hand it to `run`.
+
+    The source travels ahead of the program's stdin on the same pipe, so
+    nothing is written to disk.
+    """
+    proc = subprocess.Popen(
+        ["python3", "-I", "-B", "-u", "-c", BOOTSTRAP, *args],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+    source = code.encode("utf-8", "surrogateescape")
+    header = [len(source)]
+    if limits:
+        header += [limits.cpu_seconds, limits.memory_bytes, limits.file_size_bytes, limits.max_processes]
+    payload = " ".join(map(str, header)).encode() + b"\n" + source + stdin.encode()
+    threading.Thread(target=feed_stdin, args=(proc, payload), daemon=True).start()
+    try:
+        return run(proc)
+    finally:
+        proc.stdout.close()
+        proc.stderr.close()
+
+
+def run_spawned(
+    code: str,
+    timeout: int,
+    stdin: str = "",
+    args: Sequence[str] = (),
+    max_output: int = 10000,
+    limits: Optional[ResourceLimits] = None,
+    spawn: Callable[..., RunResult] = None,
+) -> RunResult:
+    """Run code in a fresh process per request (spawned, or forked by `spawn`)."""
+    chunks = {"stdout": [], "stderr": []}
+
+    def collect(stream: str, text: str):
+        chunks[stream].append(text)
+
+    status = (spawn or spawn_sandbox)(
+        code, stdin, args, lambda proc: pump_output(proc, timeout, max_output, collect), limits
+    )
+    if status.timed_out:
+        result = timed_out_result()
+    else:
+        error = "".join(chunks["stderr"])
+        if status.error:
+            error = f"{error}\n{status.error}" if error else status.error
+        result = RunResult(
+            output="".join(chunks["stdout"]),
+            error=error,
+            exit_code=status.exit_code,
+            truncated=status.truncated,
+        )
+    result.cpu_time_ms = status.cpu_time_ms
+    result.peak_rss_kb = status.peak_rss_kb
+    return result
@@ -0,0 +1,208 @@
+"""Admission control and bounded run queue for sandbox executions."""
+from collections import deque
+from concurrent.futures import Future
+import math
+import threading
+import time
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from app.stats import percentile
+
+
+class Rejected(Exception):
+    """Base class for runs turned away by admission control."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFull(Rejected):
+    """Raised at submit time when the wait queue is already full."""
+
+
+class QueueTimeout(Rejected):
+    """Set on a run's future when it waited in the queue for too long."""
+
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+
+class Lane:
+    """One class of work with its own queue, wait budget and dispatch weight."""
+
+    def __init__(self, name: str, weight: int, queue_depth: int, max_wait: float,
+                 max_running: int = 0, window: int = 1000):
+        self.name = name
+        self.weight = max(1, weight)
+        self.queue_depth = queue_depth
+        self.max_wait = max_wait
+        # 0 = may use every slot; otherwise the rest stay free for other lanes
+        self.max_running = max_running
+        self.queue: Deque[Tuple[Future, Callable, tuple, float]] = deque()
+        self.wait_times: Deque[float] = deque(maxlen=window)
+        self.credit = 0
+        self.running = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.completed = 0
+
+    def ready(self) -> bool:
+        return bool(self.queue) and (not self.max_running or self.running < self.max_running)
+
+    def stats(self) -> dict:
+        return {
+            "weight": self.weight,
+            "running": self.running,
+            "running_limit": self.max_running or None,
+            "queue_depth": len(self.queue),
+            "queue_limit": self.queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "expired_in_queue": self.expired,
+            "completed": self.completed,
+            "wait_ms": _wait_stats(list(self.wait_times)),
+        }
+
+
+def _wait_stats(waits: List[float]) -> dict:
+    return {
+        "avg": round(sum(waits) / len(waits) * 1000, 2) if waits else 0.0,
+        "p50": round(percentile(waits, 50) * 1000, 2),
+        "p95": round(percentile(waits, 95) * 1000, 2),
+        "max": round(max(waits) * 1000, 2) if waits else 0.0,
+    }
+
+
+class ExecutionScheduler:
+    """Runs at most `concurrency` jobs at once, queued per lane.
+
+    Every scheduler has an interactive lane sized by `queue_depth`/`max_wait`;
+    more lanes are added with `add_lane`. When several lanes have work, free
+    slots are handed out by smooth weighted round-robin, so a heavier lane
+    wins most picks without starving the others.
+    """
+
+    def __init__(self, concurrency: int, queue_depth: int, max_wait: float,
+                 window: int = 1000, interactive_weight: int = 1):
+        self.concurrency = max(1, concurrency)
+        self.window = window
+        self.lanes: Dict[str, Lane] = {
+            INTERACTIVE: Lane(INTERACTIVE, interactive_weight, queue_depth, max_wait, window=window)
+        }
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._wait_times: Deque[float] = deque(maxlen=window)
+        self._avg_run_time = 1.0
+        self.running = 0
+
+    def add_lane(self, name: str, weight: int, queue_depth: int, max_wait: float,
+                 max_running: int = 0):
+        """Register another lane; `max_running` caps how many slots it may hold."""
+        with self._cond:
+            self.lanes[name] = Lane(name, weight, queue_depth, max_wait, max_running, self.window)
+
+    def submit(self, fn: Callable, *args, lane: str = INTERACTIVE) -> Future:
+        """Queue fn(*args) on `lane`; raise QueueFull if that lane's queue is at capacity."""
+        return self.submit_all(fn, [args], lane=lane)[0]
+
+    def submit_all(self, fn: Callable, arg_tuples: List[tuple], lane: str = INTERACTIVE) -> List[Future]:
+        """Queue fn(*args) for every args tuple on `lane`, all or nothing."""
+        with self._cond:
+            self._ensure_threads()
+            target = self.lanes[lane]
+            if len(target.queue) + len(arg_tuples) > target.queue_depth:
+                target.rejected += len(arg_tuples)
+                raise QueueFull("Execution queue is full", self._retry_after())
+            futures = []
+            now = time.monotonic()
+            for args in arg_tuples:
+                future: Future = Future()
+                target.queue.append((future, fn, args, now))
+                futures.append(future)
+            target.admitted += len(arg_tuples)
+            self._cond.notify(len(arg_tuples))
+        return futures
+
+    def stats(self) -> dict:
+        with self._cond:
+            lanes = self.lanes.values()
+            return {
+                "concurrency": self.concurrency,
+                "running": self.running,
+                "queue_depth": sum(len(lane.queue) for lane in lanes),
+                "queue_limit": sum(lane.queue_depth for lane in lanes),
+                "admitted": sum(lane.admitted for lane in lanes),
+                "rejected": sum(lane.rejected for lane in lanes),
+                "expired_in_queue": sum(lane.expired for lane in lanes),
+                "completed": sum(lane.completed for lane in lanes),
+                "wait_ms": _wait_stats(list(self._wait_times)),
+                "avg_run_ms": round(self._avg_run_time * 1000, 2),
+                "lanes": {name: lane.stats() for name, lane in self.lanes.items()},
+            }
+
+    def _retry_after(self) -> int:
+        """Seconds until a new run would likely be admitted (caller holds the lock)."""
+        backlog = sum(len(lane.queue) for lane in self.lanes.values()) + self.running + 1
+        return max(1, math.ceil(backlog / self.concurrency * self._avg_run_time))
+
+    def _ensure_threads(self):
+        while len(self._threads) < self.concurrency:
+            thread = threading.Thread(
+                target=self._work, name=f"sandbox-{len(self._threads)}", daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_lane(self) -> Optional[Lane]:
+        """Smooth weighted round-robin over lanes that can start a job (caller holds the lock)."""
+        ready = [lane for lane in self.lanes.values() if lane.ready()]
+        if not ready:
+            return None
+        total = 0
+        for lane in ready:
+            lane.credit += lane.weight
+            total += lane.weight
+        chosen = max(ready, key=lambda lane: lane.credit)
+        chosen.credit -= total
+        return chosen
+
+    def _work(self):
+        while True:
+            with self._cond:
+                lane = self._next_lane()
+                while lane is None:
+                    self._cond.wait()
+                    lane = self._next_lane()
+                future, fn, args, enqueued = lane.queue.popleft()
+                waited = time.monotonic() - enqueued
+                lane.wait_times.append(waited)
+                self._wait_times.append(waited)
+                if waited > lane.max_wait:
+                    lane.expired += 1
+                    future.set_exception(
+                        QueueTimeout("Timed out waiting for a free sandbox", self._retry_after())
+                    )
+                    continue
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.running += 1
+                lane.running += 1
+
+            started = time.monotonic()
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                elapsed = time.monotonic() - started
+                with self._cond:
+                    self.running -= 1
+                    lane.running -= 1
+                    lane.completed += 1
+                    # Exponentially weighted so the Retry-After estimate tracks recent load
+                    self._avg_run_time = 0.8 * self._avg_run_time + 0.2 * elapsed
+                    # A capped lane may have become ready again
+                    self._cond.notify_all()
@@ -0,0 +1,288 @@
+"""Sandbox worker process for the code execution pool.
+
+Started by ``app.pool.WorkerPool``. Reads one JSON job per line on stdin,
+runs the submission in a child forked for that job alone, with captured
+stdout/stderr, and writes one JSON result per line on stdout. The worker
+itself never runs submitted code: modules a submission patches, threads
+it starts and anything else it leaves behind die with its child, so the
+next submission starts from the worker's clean, preloaded state.
+
+This file is executed as a standalone script and must not import the
+``app`` package.
+"""
+import base64
+import builtins
+import io
+import json
+import linecache
+import marshal
+import math
+import os
+import resource
+import sys
+import traceback
+
+FILENAME = "main.py"
+MAX_FD = os.sysconf("SC_OPEN_MAX")
+OUTPUT_LIMIT_MESSAGE = "Output limit of {limit} characters exceeded; program stopped"
+
+# Modules imported once at worker start so submissions don't pay for them.
+PRELOAD_MODULES = os.getenv(
+    "EXEC_POOL_PRELOAD",
+    "math,random,string,collections,itertools,functools,re,json,datetime",
+)
+
+
+def _preload():
+    for name in PRELOAD_MODULES.split(","):
+        name = name.strip()
+        if name:
+            try:
+                __import__(name)
+            except ImportError:
+                pass
+
+
+def _apply_limits(limits: dict):
+    """Apply the pool's static rlimits to this worker for its whole lifetime."""
+    for name, value in (
+        ("RLIMIT_AS", limits.get("memory_bytes")),
+        ("RLIMIT_FSIZE", limits.get("file_size_bytes")),
+        ("RLIMIT_NPROC", limits.get("max_processes")),
+    ):
+        if value:
+            resource.setrlimit(getattr(resource, name), (value, value))
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _reset_peak_rss() -> bool:
+    """Reset VmHWM so the next reading is this run's peak (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_kb(reset: bool) -> int:
+    if reset:
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+    # Lifetime peak of this job's child, counting what it shares with the worker
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class OutputLimitExceeded(BaseException):
+    """Raised inside a submission once it prints more than the output cap."""
+
+
+class CappedWriter(io.TextIOBase):
+    """In-memory text stream that stops the program when it reaches `limit`."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.size = 0
+        self.truncated = False
+        self.sealed = False
+        self._parts = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        if self.truncated:
+            return len(s)
+        room = self.limit - self.size
+        if len(s) > room:
+            self._parts.append(s[:room])
+            self.size = self.limit
+            self.truncated = True
+            if not self.sealed:
+                raise OutputLimitExceeded()
+            return len(s)
+        self._parts.append(s)
+        self.size += len(s)
+        return len(s)
+
+    def seal(self):
+        """Stop raising: later writes (e.g. the traceback) are clipped silently."""
+        self.sealed = True
+
+    def getvalue(self) -> str:
+        return "".join(self._parts)
+
+
+def _exit_code(exc: SystemExit, stderr) -> int:
+    """Translate SystemExit the same way the interpreter does."""
+    code = exc.code
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=stderr)
+    return 1
+
+
+def _code_object(job: dict):
+    """Precompiled code from the service's bytecode cache, else compile the source."""
+    if job.get("bytecode"):
+        return marshal.loads(base64.b64decode(job["bytecode"]))
+    return compile(job.get("code", ""), FILENAME, "exec")
+
+
+def run_job(job: dict) -> dict:
+    """Run one submission and return its captured output."""
+    code = job.get("code", "")
+    limit = job.get("max_output") or sys.maxsize
+    stdout = CappedWriter(limit)
+    stderr = CappedWriter(limit)
+    namespace = {
+        "__name__": "__main__",
+        "__file__": FILENAME,
+        "__builtins__": dict(builtins.__dict__),
+    }
+    linecache.cache[FILENAME] = (len(code), None, code.splitlines(True), FILENAME)
+
+    # Runs in a fresh child, so the CPU clock starts near zero: SIGXCPU at
+    # the budget, SIGKILL a second later if it is ignored
+    cpu_budget = job.get("cpu_seconds")
+    cpu_start = _cpu_seconds()
+    if cpu_budget:
+        soft = math.ceil(cpu_start + cpu_budget)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, soft + 1))
+    rss_reset = _reset_peak_rss()
+
+    saved = sys.stdin, sys.stdout, sys.stderr, sys.argv
+    sys.stdin = io.StringIO(job.get("stdin", ""))
+    sys.stdout, sys.stderr = stdout, stderr
+    sys.argv = [FILENAME, *job.get("args", [])]
+    exit_code = 0
+    try:
+        exec(_code_object(job), namespace)
+    except SystemExit as e:
+        stdout.seal()
+        stderr.seal()
+        exit_code = _exit_code(e, stderr)
+    except OutputLimitExceeded:
+        exit_code = 1
+    except BaseException:
+        stdout.seal()
+        stderr.seal()
+        etype, value, tb = sys.exc_info()
+        # Drop this function's frame so tracebacks match a plain `python3 main.py`
+        traceback.print_exception(etype, value, tb.tb_next, file=stderr)
+        exit_code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+        except Exception:
+            pass
+        sys.stdin, sys.stdout, sys.stderr, sys.argv = saved
+        linecache.cache.pop(FILENAME, None)
+
+    cpu_time_ms = (_cpu_seconds() - cpu_start) * 1000
+
+    truncated = stdout.truncated or stderr.truncated
+    error = stderr.getvalue()
+    if truncated:
+        exit_code = 1
+        message = OUTPUT_LIMIT_MESSAGE.format(limit=limit)
+        error = f"{error}\n{message}" if error else message
+    return {
+        "output": stdout.getvalue(),
+        "error": error,
+        "exit_code": exit_code,
+        "truncated": truncated,
+        "cpu_time_ms": round(cpu_time_ms, 2),
+        "peak_rss_kb": _peak_rss_kb(rss_reset),
+    }
+
+
+def run_isolated(job: dict) -> dict:
+    """Run one job in a forked child and return its result.
+
+    A child that dies before reporting (killed by SIGXCPU, or `os._exit`)
+    yields no output, its exit status and `"died": True`, with its usage
+    taken from wait4.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            # Only the result pipe stays open: the worker's protocol pipes
+            # must not be reachable by the submission
+            os.closerange(3, write_fd)
+            os.closerange(write_fd + 1, MAX_FD)
+            result = run_job(job)
+            # The submission can write to this pipe too, so the real result
+            # goes last, on a line of its own
+            with os.fdopen(write_fd, "w", encoding="utf-8") as out:
+                out.write("\n" + json.dumps(result))
+            status = 0
+        finally:
+            # Skip interpreter shutdown: no atexit hooks, no joining the submission's threads
+            os._exit(status)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd, "r", encoding="utf-8") as f:
+        payload = f.read()
+    _, status, usage = os.wait4(pid, 0)
+    exit_code = os.waitstatus_to_exitcode(status)
+    if exit_code == 0:
+        try:
+            result = json.loads(payload.rsplit("\n", 1)[-1])
+        except ValueError:
+            result = None
+        if isinstance(result, dict):
+            return result
+    return {
+        "output": "",
+        "error": "",
+        "exit_code": exit_code or 1,
+        "died": True,
+        "truncated": False,
+        "cpu_time_ms": round((usage.ru_utime + usage.ru_stime) * 1000, 2),
+        "peak_rss_kb": usage.ru_maxrss,
+    }
+
+
+def main():
+    # Keep the protocol pipes private: submissions that write to fd 0/1/2
+    # directly hit /dev/null instead of corrupting the job stream.
+    proto_in = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    proto_out = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+
+    # Don't let submissions import modules that live next to this script.
+    if sys.path and os.path.abspath(sys.path[0]) == os.path.dirname(os.path.abspath(__file__)):
+        del sys.path[0]
+
+    if len(sys.argv) > 1:
+        _apply_limits(json.loads(sys.argv[1]))
+
+    _preload()
+
+    for line in proto_in:
+        if not line.strip():
+            continue
+        job = json.loads(line)
+        result = {**run_isolated(job), "id": job.get("id")}
+        proto_out.write(json.dumps(result) + "\n")
+        proto_out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Client for the fork-server ("zygote") sandbox backend."""
+import base64
+import json
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, List, Optional, Sequence
+
+from app.limits import ResourceLimits
+from app.sandbox import RunResult, feed_stdin, kill_process_group
+
+ZYGOTE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "zygote_server.py")
+
+# How long to wait for the fork server to report a new run's pid
+FORK_TIMEOUT = 5.0
+
+
+class ZygoteUnavailable(Exception):
+    """Raised when the fork server can't be (re)started or reached."""
+
+
+class ZygoteProcess:
+    """Popen-like handle for a run forked by the zygote (not our child)."""
+
+    def __init__(self, stdin, stdout, stderr, result: socket.socket):
+        self.pid = 0
+        self.stdin = stdin
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode: Optional[int] = None
+        self._result = result
+        self._buffer = b""
+
+    def kill(self):
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def read_report(self, deadline: Optional[float]) -> dict:
+        """Next JSON line from the run's handler ({} if it went away)."""
+        while b"\n" not in self._buffer:
+            if deadline is not None:
+                ready, _, _ = select.select([self._result], [], [], max(0.0, deadline - time.monotonic()))
+                if not ready:
+                    raise TimeoutError()
+            chunk = self._result.recv(65536)
+            if not chunk:
+                return {}
+            self._buffer += chunk
+        line, _, self._buffer = self._buffer.partition(b"\n")
+        return json.loads(line)
+
+    def close(self):
+        for stream in (self.stdin, self.stdout, self.stderr, self._result):
+            stream.close()
+
+    def reap(self, deadline: float):
+        """Wait for the zygote's exit report; same contract as sandbox._reap."""
+        timed_out = False
+        try:
+            report = self.read_report(deadline)
+        except TimeoutError:
+            kill_process_group(self)
+            timed_out = True
+            report = self.read_report(None)
+        finally:
+            self._result.close()
+        self.returncode = report.get("exit_code", -signal.SIGKILL)
+        usage = _Usage(report.get("cpu_time_ms", 0.0), report.get("peak_rss_kb", 0))
+        return timed_out, usage
+
+
+class _Usage:
+    """The rusage fields pump_output reads, rebuilt from the zygote's report."""
+
+    def __init__(self, cpu_time_ms: float, peak_rss_kb: int):
+        self.ru_utime = cpu_time_ms / 1000
+        self.ru_stime = 0.0
+        self.ru_maxrss = peak_rss_kb
+
+
+class Zygote:
+    """A warm interpreter that forks one copy-on-write child per run."""
+
+    def __init__(self, preload: List[str], limits: Optional[ResourceLimits] = None):
+        self.preload = preload
+        self.limits = limits
+        self._proc: Optional[subprocess.Popen] = None
+        self._control: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+        self.forks = 0
+        self.restarts = 0
+
+    def start(self):
+        """Start the fork server (idempotent)."""
+        with self._lock:
+            self._ensure_started()
+
+    def shutdown(self):
+        with self._lock:
+            self._stop()
+
+    def spawn(
+        self,
+        code: str,
+        stdin: str,
+        args: Sequence[str],
+        run: Callable[[ZygoteProcess], RunResult],
+        limits: Optional[ResourceLimits] = None,
+        bytecode: Optional[bytes] = None,
+    ) -> RunResult:
+        """Fork a run of `code` and hand it to `run`; drop-in for sandbox.spawn_sandbox.
+
+        `limits` is accepted for signature compatibility; the zygote applies
+        the limits it was started with. `bytecode` (marshalled code object)
+        skips compiling in the child.
+        """
+        ours, theirs = socket.socketpair()
+        stdin_r, stdin_w = os.pipe()
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        try:
+            self._send([theirs.fileno(), stdin_r, stdout_w, stderr_w])
+        except BaseException:
+            for fd in (stdin_w, stdout_r, stderr_r):
+                os.close(fd)
+            ours.close()
+            raise
+        finally:
+            theirs.close()
+            for fd in (stdin_r, stdout_w, stderr_w):
+                os.close(fd)
+
+        proc = ZygoteProcess(
+            os.fdopen(stdin_w, "wb"), os.fdopen(stdout_r, "rb"), os.fdopen(stderr_r, "rb"), ours
+        )
+        try:
+            job = {"code": code, "args": list(args)}
+            if bytecode:
+                job["bytecode"] = base64.b64encode(bytecode).decode()
+            ours.sendall(json.dumps(job).encode() + b"\n")
+            hello = proc.read_report(time.monotonic() + FORK_TIMEOUT)
+            if "pid" not in hello:
+                raise ZygoteUnavailable("fork server dropped the run")
+            proc.pid = hello["pid"]
+        except BaseException:
+            proc.close()
+            raise
+
+        threading.Thread(target=feed_stdin, args=(proc, stdin.encode()), daemon=True).start()
+        try:
+            return run(proc)
+        finally:
+            proc.stdout.close()
+            proc.stderr.close()
+
+    def stats(self) -> dict:
+        return {
+            "running": bool(self._proc and self._proc.poll() is None),
+            "forks": self.forks,
+            "restarts": self.restarts,
+            "preloaded": len(self.preload),
+        }
+
+    def _send(self, fds: List[int]):
+        with self._lock:
+            for attempt in range(2):
+                self._ensure_started()
+                try:
+                    socket.send_fds(self._control, [b"F"], fds)
+                    self.forks += 1
+                    return
+                except OSError:
+                    # Fork server died; replace it once before giving up
+                    self._stop()
+                    self.restarts += 1
+            raise ZygoteUnavailable("fork server is not accepting runs")
+
+    def _ensure_started(self):
+        if self._proc and self._proc.poll() is None:
+            return
+        self._stop()
+        ours, theirs = socket.socketpair()
+        config = {
+            "preload": self.preload,
+            "limits": self.limits.to_dict() if self.limits else {},
+        }
+        try:
+            self._proc = subprocess.Popen(
+                [sys.executable, "-I", "-B", ZYGOTE_SCRIPT, str(theirs.fileno()), json.dumps(config)],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                pass_fds=[theirs.fileno()],
+                start_new_session=True,
+            )
+        except OSError as e:
+            ours.close()
+            raise ZygoteUnavailable(str(e))
+        finally:
+            theirs.close()
+        self._control = ours
+
+    def _stop(self):
+        if self._control:
+            self._control.close()
+            self._control = None
+        if self._proc:
+            try:
+                self._proc.kill()
+                self._proc.wait(timeout=5)
+            except Exception:
+                pass
+            self._proc = None
@@ -0,0 +1,156 @@
+"""Fork server ("zygote") for sandbox runs.
+
+Started by ``app.zygote.Zygote`` as ``python3 -I -B zygote_server.py
+<control fd> <config json>``. Imports the configured modules once, then
+for every request on the control socket forks a short-lived handler
+that forks the actual run from this warm, copy-on-write image.
+
+Each request carries four file descriptors: the per-run result socket and
+the child's stdin, stdout and stderr. The handler reads the job (JSON
+line) from the result socket, forks the run, reports ``{"pid"}`` and
+finally ``{"exit_code", "cpu_time_ms", "peak_rss_kb"}`` on the same socket.
+
+This file is executed as a standalone script and must not import the
+``app`` package.
+"""
+import atexit
+import base64
+import builtins
+import io
+import json
+import marshal
+import os
+import resource
+import signal
+import socket
+import sys
+
+FILENAME = "main.py"
+MAX_FD = os.sysconf("SC_OPEN_MAX")
+
+
+def _preload(names):
+    for name in names:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+
+def _apply_limits(limits: dict):
+    if limits.get("cpu_seconds"):
+        cpu = limits["cpu_seconds"]
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    for name, value in (
+        ("RLIMIT_AS", limits.get("memory_bytes")),
+        ("RLIMIT_FSIZE", limits.get("file_size_bytes")),
+        ("RLIMIT_NPROC", limits.get("max_processes")),
+    ):
+        if value:
+            resource.setrlimit(getattr(resource, name), (value, value))
+
+
+def _run_child(job: dict, limits: dict):
+    """Body of the forked run; never returns."""
+    exit_code = 1
+    try:
+        os.setsid()
+        os.closerange(3, MAX_FD)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        _apply_limits(limits)
+
+        # Same as `python3 -u`: unbuffered binary layer, write-through text
+        sys.stdin = io.TextIOWrapper(io.BufferedReader(io.FileIO(0, "r")))
+        sys.stdout = io.TextIOWrapper(io.FileIO(1, "w"), write_through=True)
+        sys.stderr = io.TextIOWrapper(io.FileIO(2, "w"), write_through=True, errors="backslashreplace")
+        sys.argv = [FILENAME, *job.get("args", [])]
+
+        code = job.get("code", "")
+        namespace = {"__name__": "__main__", "__file__": FILENAME, "__builtins__": builtins}
+        try:
+            if job.get("bytecode"):
+                code_obj = marshal.loads(base64.b64decode(job["bytecode"]))
+            else:
+                code_obj = compile(code, FILENAME, "exec")
+            exec(code_obj, namespace)
+            exit_code = 0
+        except SystemExit as e:
+            if e.code is None:
+                exit_code = 0
+            elif isinstance(e.code, int):
+                exit_code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+        except BaseException:
+            import linecache
+            import traceback
+            linecache.cache[FILENAME] = (len(code), None, code.splitlines(True), FILENAME)
+            etype, value, tb = sys.exc_info()
+            traceback.print_exception(etype, value, tb.tb_next)
+        atexit._run_exitfuncs()
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:
+                pass
+    finally:
+        os._exit(exit_code & 0xFF)
+
+
+def _handle(result_fd: int, stdio, limits: dict):
+    """Forked per request: start the run, wait for it, report back. Never returns."""
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        result = socket.socket(fileno=result_fd)
+        reader = result.makefile("rb")
+        job = json.loads(reader.readline())
+
+        pid = os.fork()
+        if pid == 0:
+            for target, fd in enumerate(stdio):
+                os.dup2(fd, target)
+            _run_child(job, limits)
+        for fd in stdio:
+            os.close(fd)
+
+        result.sendall(json.dumps({"pid": pid}).encode() + b"\n")
+        _, status, usage = os.wait4(pid, 0)
+        result.sendall(json.dumps({
+            "exit_code": os.waitstatus_to_exitcode(status),
+            "cpu_time_ms": round((usage.ru_utime + usage.ru_stime) * 1000, 2),
+            "peak_rss_kb": usage.ru_maxrss,
+        }).encode() + b"\n")
+    finally:
+        os._exit(0)
+
+
+def main():
+    control = socket.socket(fileno=int(sys.argv[1]))
+    config = json.loads(sys.argv[2])
+    limits = config.get("limits", {})
+    _preload(config.get("preload", []))
+
+    # Handlers are never waited for; let the kernel reap them
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    while True:
+        try:
+            _, fds, _, _ = socket.recv_fds(control, 1, 4)
+        except InterruptedError:
+            continue
+        if not fds:
+            return  # service closed the control socket
+        if len(fds) != 4:
+            for fd in fds:
+                os.close(fd)
+            continue
+        if os.fork() == 0:
+            control.close()
+            _handle(fds[0], fds[1:], limits)
+        for fd in fds:
+            os.close(fd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark: spawn-per-request execution vs. the pre-warmed worker pool.
+
+Run from the service directory:
+
+    python benchmarks/bench_pool.py --runs 200 --concurrency 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.pool import WorkerPool  # noqa: E402
+from app.sandbox import run_spawned  # noqa: E402
+
+SNIPPET = """
+numbers = [3, 1, 4, 1, 5, 9, 2, 6]
+total = 0
+for n in numbers:
+    total += n
+print(f"Sum: {total}, max: {max(numbers)}")
+"""
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(label, run, runs, concurrency):
+    def timed(_):
+        start = time.perf_counter()
+        result = run()
+        assert result.exit_code == 0, result.error
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, range(runs)))
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{label:<8} p50={percentile(latencies, 50) * 1000:7.2f} ms  "
+        f"p99={percentile(latencies, 99) * 1000:7.2f} ms  "
+        f"mean={statistics.mean(latencies) * 1000:7.2f} ms  "
+        f"throughput={runs / elapsed:7.1f} runs/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-runs", type=int, default=50, help="pool recycle threshold")
+    args = parser.parse_args()
+
+    print(f"{args.runs} runs, concurrency {args.concurrency}")
+    measure("spawn", lambda: run_spawned(SNIPPET, 10), args.runs, args.concurrency)
+
+    pool = WorkerPool(size=args.concurrency, max_runs=args.max_runs, queue_depth=args.runs)
+    pool.start()
+    try:
+        # Let workers finish interpreter start-up so we measure steady state
+        for _ in range(args.concurrency):
+            pool.run("pass", 10)
+        measure("pool", lambda: pool.run(SNIPPET, 10), args.runs, args.concurrency)
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Micro-benchmark: legacy substring safety scan vs. the AST analyzer.
+
+Run from the service directory:
+
+    python benchmarks/bench_safety.py --lines 200,2000,20000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import BLOCKED_ATTRIBUTES, BLOCKED_IMPORTS, BLOCKED_METHODS  # noqa: E402
+from app.safety import SafetyAnalyzer, SafetyPolicy  # noqa: E402
+
+BLOCK = '''
+import math
+
+def average(values):
+    """Return the mean of a list of numbers."""
+    total = 0
+    for v in values:
+        total += v
+    return total / len(values) if values else 0
+
+scores = {"alice": [90, 85], "bob": [70, 65, 80]}
+for name, marks in scores.items():
+    print(f"{name}: {average(marks):.1f}, sqrt={math.sqrt(len(marks)):.2f}")
+'''
+
+PLAIN = "\n".join(line for line in BLOCK.splitlines() if "math" not in line) + "\n"
+
+
+def legacy_check(code):
+    """The substring scan this analyzer replaced."""
+    for blocked in BLOCKED_IMPORTS:
+        if f"import {blocked}" in code or f"from {blocked}" in code:
+            return f"Import '{blocked}' is not allowed for security reasons"
+    if "open(" in code and ("w" in code or "a" in code):
+        return "File write operations are not allowed"
+    if "exec(" in code or "eval(" in code:
+        return "exec() and eval() are not allowed"
+    return None
+
+
+def bench(label, fn, number):
+    seconds = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"  {label:<16} {seconds * 1e6:10.1f} us/check")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", default="200,2000,20000")
+    args = parser.parse_args()
+
+    policy = SafetyPolicy.build(BLOCKED_IMPORTS, blocked_attrs=BLOCKED_ATTRIBUTES, blocked_methods=BLOCKED_METHODS)
+    for target in (int(n) for n in args.lines.split(",")):
+        number = max(1, 20000 // target)
+        for label, block in (("with imports", BLOCK), ("no trigger tokens", PLAIN)):
+            code = block * max(1, target // block.count("\n"))
+            print(f"{code.count(chr(10))} lines, {len(code)} bytes, {label}")
+            bench("legacy scan", lambda: legacy_check(code), number * 10)
+            bench("ast (uncached)", lambda: SafetyAnalyzer(policy).check(code), number)
+            cached = SafetyAnalyzer(policy)
+            cached.check(code)
+            bench("ast (cached)", lambda: cached.check(code), number * 10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Benchmark: temp-file spawn vs. source-over-stdin spawn under concurrent load.
+
+Compares the old spawn path (write a NamedTemporaryFile, run it, unlink it)
+with the current one (source sent over the stdin pipe). Reports latency and
+the service process's read/write syscalls per request from /proc/self/io.
+
+Run from the service directory:
+
+    python benchmarks/bench_spawn_io.py --runs 200 --concurrency 1,4,8
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.sandbox import pump_output, run_spawned  # noqa: E402
+
+SNIPPET = """
+name = input()
+numbers = [3, 1, 4, 1, 5, 9, 2, 6]
+print(f"Hello {name}, sum={sum(numbers)}")
+"""
+
+
+def legacy_spawn(code, timeout, stdin):
+    """The temp-file spawn path this change replaced."""
+    temp_path = None
+    try:
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as f:
+            f.write(code)
+            temp_path = f.name
+        proc = subprocess.Popen(
+            ["python3", temp_path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+            start_new_session=True,
+        )
+        proc.stdin.write(stdin.encode())
+        proc.stdin.close()
+        try:
+            return pump_output(proc, timeout, 10000, lambda stream, text: None)
+        finally:
+            proc.stdout.close()
+            proc.stderr.close()
+    finally:
+        if temp_path:
+            os.unlink(temp_path)
+
+
+def io_syscalls():
+    """Read + write syscalls made so far by this process (Linux only)."""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["syscr"]) + int(fields["syscw"])
+    except OSError:
+        return 0
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def measure(label, run, runs, concurrency):
+    def timed(_):
+        start = time.perf_counter()
+        result = run()
+        assert result.exit_code == 0, result.error
+        return time.perf_counter() - start
+
+    syscalls = io_syscalls()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, range(runs)))
+    elapsed = time.perf_counter() - started
+    per_run = (io_syscalls() - syscalls) / runs
+
+    print(
+        f"  {label:<10} p50={percentile(latencies, 50) * 1000:7.2f} ms  "
+        f"p99={percentile(latencies, 99) * 1000:7.2f} ms  "
+        f"mean={statistics.mean(latencies) * 1000:7.2f} ms  "
+        f"throughput={runs / elapsed:6.1f} runs/s  "
+        f"rw syscalls/run={per_run:6.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,4,8")
+    args = parser.parse_args()
+
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        print(f"concurrency={concurrency}")
+        measure("tempfile", lambda: legacy_spawn(SNIPPET, 10, "bench\n"), args.runs, concurrency)
+        measure("stdin", lambda: run_spawned(SNIPPET, 10, "bench\n"), args.runs, concurrency)
+
+
+if __name__ == "__main__":
+    main()
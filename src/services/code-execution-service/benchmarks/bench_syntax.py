@@ -0,0 +1,93 @@
+"""Benchmark: in-process SyntaxError short-circuit vs. running broken programs in a sandbox.
+
+Every program in the broken-beginner corpus is answered once by parsing in
+the service process (what /execute now does) and once by the sandbox path
+it replaced, reporting latency and the CPU each approach burns.
+
+Run from the service directory:
+
+    python benchmarks/bench_syntax.py --rounds 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.bytecode import compile_source  # noqa: E402
+from app.main import ZYGOTE_PRELOAD  # noqa: E402
+from app.sandbox import run_spawned  # noqa: E402
+from app.zygote import Zygote  # noqa: E402
+from broken_corpus import BROKEN_PROGRAMS  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(label, latencies, cpu_ms):
+    print(
+        f"  {label:<10} latency p50={percentile(latencies, 50) * 1000:8.3f} ms  "
+        f"p99={percentile(latencies, 99) * 1000:8.3f} ms  "
+        f"cpu/program={statistics.mean(cpu_ms):8.3f} ms"
+    )
+
+
+def measure_inline(rounds):
+    latencies, cpu_ms = [], []
+    for _ in range(rounds):
+        for code in BROKEN_PROGRAMS:
+            start, cpu_start = time.perf_counter(), time.process_time()
+            compiled = compile_source(code)
+            cpu_ms.append((time.process_time() - cpu_start) * 1000)
+            latencies.append(time.perf_counter() - start)
+            assert compiled.syntax_error, code
+    return latencies, cpu_ms
+
+
+def measure_sandbox(rounds, spawn=None):
+    latencies, cpu_ms = [], []
+    for _ in range(rounds):
+        for code in BROKEN_PROGRAMS:
+            start = time.perf_counter()
+            result = run_spawned(code, 10, spawn=spawn)
+            latencies.append(time.perf_counter() - start)
+            # Child CPU as reported by wait4
+            cpu_ms.append(result.cpu_time_ms)
+            assert result.exit_code == 1, code
+    return latencies, cpu_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{len(BROKEN_PROGRAMS)} broken programs x {args.rounds} rounds")
+    inline = measure_inline(args.rounds)
+    report("in-process", *inline)
+
+    spawn = measure_sandbox(args.rounds)
+    report("spawn", *spawn)
+
+    zygote = Zygote(ZYGOTE_PRELOAD)
+    zygote.start()
+    try:
+        forked = measure_sandbox(args.rounds, spawn=zygote.spawn)
+    finally:
+        zygote.shutdown()
+    report("zygote", *forked)
+
+    for label, (latencies, cpu_ms) in (("spawn", spawn), ("zygote", forked)):
+        saved = statistics.mean(latencies) - statistics.mean(inline[0])
+        print(
+            f"  saved vs {label:<6} {saved * 1000:8.3f} ms latency, "
+            f"{statistics.mean(cpu_ms) - statistics.mean(inline[1]):8.3f} ms CPU per program"
+        )
+
+
+if __name__ == "__main__":
+    main()
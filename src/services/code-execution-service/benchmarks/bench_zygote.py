@@ -0,0 +1,82 @@
+"""Benchmark: fresh python3 spawn vs. zygote fork for import-heavy submissions.
+
+The snippet imports the stdlib modules used by mod-6 (File Handling) and
+mod-8 (Libraries & APIs) and prints how long its own imports took, so the
+report shows both in-program import time and end-to-end latency.
+
+Run from the service directory:
+
+    python benchmarks/bench_zygote.py --runs 100 --concurrency 1,4
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import ZYGOTE_PRELOAD  # noqa: E402
+from app.sandbox import run_spawned  # noqa: E402
+from app.zygote import Zygote  # noqa: E402
+
+SNIPPET = """
+import time
+_start = time.perf_counter()
+import csv, json, io, datetime, statistics, decimal, collections, re
+_imports = time.perf_counter() - _start
+rows = list(csv.reader(io.StringIO("a,b\\n1,2\\n3,4")))
+print(json.dumps({"rows": len(rows), "mean": statistics.mean([1, 2, 3])}))
+print(f"IMPORT_MS={_imports * 1000:.3f}")
+"""
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def measure(label, run, runs, concurrency):
+    def timed(_):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        assert result.exit_code == 0, result.error
+        imports = float(result.output.rsplit("IMPORT_MS=", 1)[1])
+        return elapsed, imports
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(timed, range(runs)))
+    latencies = [s[0] for s in samples]
+    imports = [s[1] for s in samples]
+
+    print(
+        f"  {label:<8} import p50={statistics.median(imports):7.3f} ms  "
+        f"latency p50={percentile(latencies, 50) * 1000:7.2f} ms  "
+        f"p99={percentile(latencies, 99) * 1000:7.2f} ms  "
+        f"mean={statistics.mean(latencies) * 1000:7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--concurrency", default="1,4")
+    args = parser.parse_args()
+
+    zygote = Zygote(ZYGOTE_PRELOAD)
+    zygote.start()
+    try:
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            print(f"concurrency={concurrency}")
+            measure("spawn", lambda: run_spawned(SNIPPET, 10), args.runs, concurrency)
+            measure(
+                "zygote", lambda: run_spawned(SNIPPET, 10, spawn=zygote.spawn), args.runs, concurrency
+            )
+    finally:
+        zygote.shutdown()
+
+
+if __name__ == "__main__":
+    main()
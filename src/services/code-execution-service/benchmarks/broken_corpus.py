@@ -0,0 +1,52 @@
+"""Beginner programs that fail to parse, for the SyntaxError short-circuit benchmark."""
+
+BROKEN_PROGRAMS = [
+    # Missing colons
+    "for i in range(10)\n    print(i)\n",
+    "if x == 1\n    print('one')\n",
+    "def greet(name)\n    return 'Hi ' + name\n",
+    "while True\n    break\n",
+    "class Dog\n    pass\n",
+    # Unbalanced brackets and quotes
+    "print('hello'\n",
+    "numbers = [1, 2, 3\nprint(numbers)\n",
+    "total = sum((1, 2, 3)\n",
+    "print(\"unterminated)\n",
+    "text = '''never closed\nprint(text)\n",
+    "data = {'a': 1, 'b': 2]\n",
+    "print(len([1, 2, 3)))\n",
+    # Indentation
+    "def f():\nreturn 1\n",
+    "if True:\n    x = 1\n      y = 2\n",
+    "for i in range(3):\n    print(i)\n  print('done')\n",
+    "def f():\n\tif True:\n        return 1\n",
+    "if True:\n",
+    # Assignment / operator confusion
+    "if x = 5:\n    print(x)\n",
+    "5 = x\n",
+    "x + 1 = 2\n",
+    "print('a' 'b' x)\n",
+    "x = 10\ny = 20\nprint(x y)\n",
+    "f(**)\n",
+    "x = = 3\n",
+    # Keywords and misc
+    "print 'hello'\n",
+    "def = 3\n",
+    "return 5\n",
+    "else:\n    pass\n",
+    "import\n",
+    "lambda x: yield x\n",
+    "for = 1\n",
+    "x = [i for i in]\n",
+    "def f(a=1, b):\n    pass\n",
+    "f(a=1, 2)\n",
+    "try:\n    x = 1\nprint(x)\n",
+    "x = 1 +\n",
+    "print(f'{x!}')\n",
+    "name = input(\"Name: \")\nprint(\"Hello, \" + name\n",
+    "s = 'café'\nprint(s[)\n",
+    "\tprint('leading tab')\n",
+    "x = 0777\n",
+    "nonlocal x\n",
+    "print('ok')\n}\n",
+]
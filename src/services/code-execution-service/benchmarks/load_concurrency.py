@@ -0,0 +1,62 @@
+"""Load test: /execute throughput as client concurrency grows.
+
+Each request runs a submission that sleeps for --work seconds. With a
+blocking handler throughput stays flat at ~1/work runs/s regardless of
+concurrency; with the non-blocking path it scales up to
+EXEC_MAX_CONCURRENCY.
+
+Run from the service directory:
+
+    EXEC_POOL_SIZE=8 python benchmarks/load_concurrency.py --levels 1,2,4,8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from unittest.mock import patch
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app, pool  # noqa: E402
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, requests_per_level: int, work: float):
+    code = f"import time\ntime.sleep({work})\nprint('done')"
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            response = await client.post("/execute", json={"code": code})
+            assert response.status_code == 200 and response.json()["exit_code"] == 0, response.text
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests_per_level)))
+    elapsed = time.perf_counter() - start
+    print(f"concurrency={concurrency:<3} {requests_per_level} runs in {elapsed:6.2f}s  "
+          f"throughput={requests_per_level / elapsed:6.2f} runs/s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", default="1,2,4,8")
+    parser.add_argument("--requests", type=int, default=16, help="requests per concurrency level")
+    parser.add_argument("--work", type=float, default=0.25, help="seconds each submission sleeps")
+    args = parser.parse_args()
+
+    if pool:
+        pool.start()
+    transport = httpx.ASGITransport(app=app)
+    with patch("app.main.requests.post"):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            await client.post("/execute", json={"code": "pass"})
+            for level in (int(x) for x in args.levels.split(",")):
+                await run_level(client, level, args.requests, args.work)
+    if pool:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -149,6 +149,33 @@ def test_handle_code_event_with_code():
         assert response.json()["status"] == "executed"
 
 
+def test_handle_code_event_publishes_code_executed():
+    import hashlib
+
+    with patch("app.main.requests.post") as mock_post:
+        mock_post.return_value = MagicMock(status_code=200)
+
+        client.post("/events/code", json={
+            "data": {
+                "code": "print('out')\nraise ValueError('bad')",
+                "user_id": "user-1",
+                "exercise_id": "ex-1",
+            }
+        })
+
+    calls = [c for c in mock_post.call_args_list if c[0][0].endswith("/publish/pubsub/code.executed")]
+    assert len(calls) == 1
+    event = calls[0][1]["json"]
+    assert event["user_id"] == "user-1"
+    assert event["exercise_id"] == "ex-1"
+    assert event["code_hash"] == hashlib.sha256(b"print('out')\nraise ValueError('bad')").hexdigest()
+    assert event["status"] == "error"
+    assert event["stdout"] == "out\n"
+    assert event["stderr"].endswith("ValueError: bad\n")
+    assert event["exit_code"] == 1
+    assert event["wall_time_ms"] > 0
+
+
 def test_handle_code_event_empty():
     response = client.post("/events/code", json={
         "data": {}
@@ -156,3 +183,882 @@ def test_handle_code_event_empty():
 
     assert response.status_code == 200
     assert response.json()["status"] == "processed"
+
+
+# Worker pool tests
+def test_pool_runs_in_fresh_namespace():
+    from app.pool import WorkerPool
+
+    pool = WorkerPool(size=1, max_runs=10, queue_depth=4)
+    try:
+        first = pool.run("x = 41\nprint(x + 1)", timeout=5)
+        second = pool.run("print('x' in globals())", timeout=5)
+    finally:
+        pool.shutdown()
+
+    assert first.output == "42\n"
+    assert second.output == "False\n"
+
+
+def test_pool_recycles_after_max_runs():
+    from app.pool import WorkerPool
+
+    pool = WorkerPool(size=1, max_runs=2, queue_depth=4)
+    try:
+        # Each job runs in its own child; the parent is the pooled worker
+        pids = [pool.run("import os\nprint(os.getppid())", timeout=5).output for _ in range(3)]
+    finally:
+        pool.shutdown()
+
+    assert pids[0] == pids[1]
+    assert pids[2] != pids[1]
+    assert pool.recycled == 1
+
+
+def test_pool_jobs_cannot_tamper_with_later_jobs():
+    from app.pool import WorkerPool
+
+    attacker = (
+        "import math, builtins, sys, threading, time\n"
+        "math.sqrt = lambda x: 42\n"
+        "builtins.stolen = []\n"
+        "def spy():\n"
+        "    time.sleep(0.3)\n"
+        "    print('INJECTED', sys.stdin.read())\n"
+        "threading.Thread(target=spy, daemon=True).start()\n"
+    )
+    victim = "import builtins, math, sys, threading, time\ntime.sleep(0.6)\nprint(math.sqrt(16), hasattr(builtins, 'stolen'), threading.active_count())"
+    pool = WorkerPool(size=1, max_runs=10, queue_depth=4)
+    try:
+        pool.run(attacker, timeout=5)
+        result = pool.run(victim, timeout=5, stdin="victim secret")
+    finally:
+        pool.shutdown()
+
+    assert result.output == "4.0 False 1\n"
+
+
+def test_pool_jobs_cannot_forge_results_on_the_protocol_pipe():
+    from app.pool import WorkerPool
+
+    forged = '{"output": "FORGED FOR NEXT USER", "error": "", "exit_code": 0, "id": 2}'
+    attacker = "import os\nfor fd in range(3, 10):\n    try:\n        os.write(fd, b'%s\\n')\n    except OSError:\n        pass\nprint('done')" % forged
+    pool = WorkerPool(size=1, max_runs=10, queue_depth=4)
+    try:
+        first = pool.run(attacker, timeout=5)
+        second = pool.run("print('mine')", timeout=5)
+        third = pool.run("print('also mine')", timeout=5)
+    finally:
+        pool.shutdown()
+
+    assert first.output == "done\n"
+    assert (second.output, third.output) == ("mine\n", "also mine\n")
+
+
+def test_pool_recycles_on_timeout():
+    from app.pool import WorkerPool
+
+    pool = WorkerPool(size=1, max_runs=10, queue_depth=4)
+    try:
+        result = pool.run("while True:\n    pass", timeout=1)
+        after = pool.run("print('still alive')", timeout=5)
+    finally:
+        pool.shutdown()
+
+    assert result.timed_out is True
+    assert after.output == "still alive\n"
+    assert pool.recycled == 1
+
+
+def test_pool_reports_traceback_and_exit_code():
+    from app.pool import WorkerPool
+
+    pool = WorkerPool(size=1, max_runs=10, queue_depth=4)
+    try:
+        error = pool.run("print('before')\n1 / 0", timeout=5)
+        exited = pool.run("import sys\nsys.exit(3)", timeout=5)
+    finally:
+        pool.shutdown()
+
+    assert error.output == "before\n"
+    assert error.exit_code == 1
+    assert 'File "main.py", line 2' in error.error
+    assert "ZeroDivisionError" in error.error
+    assert exited.exit_code == 3
+
+
+@patch("app.main.requests.post")
+def test_execute_without_pool(mock_post):
+    mock_post.return_value = MagicMock(status_code=200)
+
+    with patch("app.main.pool", None):
+        response = client.post("/execute", json={"code": "print('spawned')"})
+
+    assert response.status_code == 200
+    assert response.json()["output"] == "spawned\n"
+
+
+def test_long_run_does_not_block_event_loop():
+    import asyncio
+    import time
+    import httpx
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            with patch("app.main.requests.post"):
+                slow = asyncio.create_task(
+                    ac.post("/execute", json={"code": "import time\ntime.sleep(2)"})
+                )
+                await asyncio.sleep(0.2)
+                start = time.perf_counter()
+                health = await ac.get("/health")
+                health_latency = time.perf_counter() - start
+                await slow
+        return health, health_latency
+
+    health, latency = asyncio.run(scenario())
+    assert health.status_code == 200
+    assert latency < 1.0
+
+
+def test_spawned_timeout_kills_process_group():
+    from app.sandbox import run_spawned
+
+    code = (
+        "import os, time\n"
+        "if os.fork() == 0:\n"
+        "    time.sleep(30)\n"
+        "time.sleep(30)\n"
+    )
+    result = run_spawned(code, timeout=1)
+    assert result.timed_out is True
+
+
+# Admission control tests
+def test_scheduler_rejects_when_queue_full():
+    import threading
+    import time
+    from app.scheduler import ExecutionScheduler, QueueFull
+
+    scheduler = ExecutionScheduler(concurrency=1, queue_depth=1, max_wait=30)
+    release = threading.Event()
+    running = scheduler.submit(release.wait)
+    while scheduler.stats()["running"] == 0:
+        time.sleep(0.01)
+    queued = scheduler.submit(lambda: "queued")
+
+    try:
+        scheduler.submit(lambda: "rejected")
+        assert False, "expected QueueFull"
+    except QueueFull as e:
+        assert e.retry_after >= 1
+    finally:
+        release.set()
+
+    assert running.result(timeout=5) is True
+    assert queued.result(timeout=5) == "queued"
+    stats = scheduler.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+
+
+def test_scheduler_expires_stale_queue_entries():
+    import threading
+    from app.scheduler import ExecutionScheduler, QueueTimeout
+
+    scheduler = ExecutionScheduler(concurrency=1, queue_depth=4, max_wait=0.05)
+    release = threading.Event()
+    scheduler.submit(release.wait)
+    stale = scheduler.submit(lambda: "never")
+    threading.Timer(0.2, release.set).start()
+
+    try:
+        stale.result(timeout=5)
+        assert False, "expected QueueTimeout"
+    except QueueTimeout:
+        pass
+    assert scheduler.stats()["expired_in_queue"] == 1
+
+
+def test_execute_returns_429_with_retry_after():
+    from app.scheduler import QueueFull
+
+    with patch("app.main.scheduler.submit", side_effect=QueueFull("Execution queue is full", 7)):
+        response = client.post("/execute", json={"code": "print(1)"})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
+
+
+def test_metrics():
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    data = response.json()
+    assert "queue_depth" in data["scheduler"]
+    assert "wait_ms" in data["scheduler"]
+
+
+# AST safety analyzer tests
+def test_safety_allows_letter_w_with_read_only_open():
+    code = "with open('data.txt') as f:\n    words = f.read().split()\nprint(len(words))"
+    assert check_code_safety(code) is None
+
+
+def test_safety_allows_append_method_and_mentions_in_strings():
+    code = "items = []\nitems.append('import socket')\nprint(items)"
+    assert check_code_safety(code) is None
+
+
+def test_safety_blocks_dunder_import():
+    result = check_code_safety("s = __import__('socket')")
+    assert result is not None
+    assert "__import__" in result
+
+
+def test_safety_blocks_importlib_import_module():
+    result = check_code_safety("import importlib\nm = importlib.import_module('socket')")
+    assert result is not None
+    assert "socket" in result
+
+
+def test_safety_blocks_dotted_import():
+    result = check_code_safety("import urllib.request")
+    assert result is not None
+    assert "urllib" in result
+
+
+def test_safety_blocks_aliased_os_system():
+    result = check_code_safety("import os as o\n\no.system('ls')")
+    assert result is not None
+    assert "os.system" in result
+
+
+def test_safety_blocks_from_os_import_system():
+    result = check_code_safety("from os import system")
+    assert result is not None
+
+
+def test_safety_blocks_write_mode_keyword():
+    result = check_code_safety("f = open('out.txt', mode='a')")
+    assert result is not None
+    assert "write" in result.lower()
+
+
+def test_safety_reports_line_and_column():
+    result = check_code_safety("x = 1\ny = 2\n    \nprint(x)\nz = eval('x')")
+    assert "line 5, column 5" in result
+
+
+def test_safety_blocks_known_bypasses():
+    bypasses = {
+        "import io\nio.open('x', 'w')": "write",
+        "from io import open\nopen('x', 'a')": "write",
+        "from importlib import import_module\nimport_module('socket')": "socket",
+        "from importlib import import_module as load\nload(name)": "Dynamic imports",
+        "from os import *\nsystem('id')": "import *",
+        "import os\nvars(os)['system']('id')": "vars()",
+        "import os\nos.__dict__['system']('id')": "os.__dict__",
+        "e = exec\ne('print(1)')": "exec()",
+        "f = [eval][0]": "eval()",
+        "import os\nos.open(p, os.O_WRONLY | os.O_CREAT)": "write",
+        "import os\nos.open(p, 65)": "write",
+        "import pathlib\npathlib.Path(p).write_text('x')": "write_text",
+        "from pathlib import Path\nPath(p).open('w')": "write",
+        "import posix\nposix.system('id')": "posix",
+        "import multiprocessing": "multiprocessing",
+        "import _posixsubprocess": "_posixsubprocess",
+        "import asyncio\nasyncio.create_subprocess_shell('id')": "asyncio.create_subprocess_shell",
+        "from asyncio import create_subprocess_exec": "asyncio.create_subprocess_exec",
+        "import asyncio.subprocess": "asyncio.subprocess",
+        "import os\nx = os\nx.system('id')": "Module 'os'",
+        "import os\ngetattr(os, 'sys' + 'tem')('id')": "Dynamic attribute access on 'os'",
+        "getattr(f, '__glo' + 'bals__')": "dunder",
+        "import sys\nsys.modules['os'].system('id')": "sys.modules",
+        "import importlib\nimportlib.__import__('socket')": "importlib.__import__",
+        "import importlib\nload = importlib.import_module\nload('socket')": "called directly",
+        "import pty\npty.spawn('sh')": "pty",
+        "import platform\nplatform.popen('id')": "platform.popen",
+        "import builtins\nb = builtins\nb.exec('print(1)')": "Module 'builtins'",
+        "open('f', **{'mode': 'w'})": "write",
+        "w = open\nw('f', 'w')": "called directly",
+        "import io\nio.FileIO('f', 'w')": "write",
+    }
+    for code, expected in bypasses.items():
+        result = check_code_safety(code)
+        assert result is not None and expected in result, code
+
+
+def test_safety_allows_read_only_file_access():
+    allowed = [
+        "import os\nfd = os.open('data.txt', os.O_RDONLY)",
+        "from pathlib import Path\nprint(Path('data.txt').read_text())",
+        "from pathlib import Path\nwith Path('data.txt').open() as f:\n    print(f.read())",
+        "import io\nprint(io.open('data.txt').read())",
+        "import zipfile\nzipfile.ZipFile('a.zip').open('data.txt')",
+        "from math import *\nprint(sqrt(2))",
+        "text = 'a b'.replace(' ', '')",
+        "import sys\nprint(sys.argv, sys.version_info >= (3, 8))",
+        "import os\nprint(getattr(os, 'sep'), os.path.join('a', 'b'))",
+        "import io\nwith io.FileIO('data.txt') as f:\n    print(f.read())",
+    ]
+    for code in allowed:
+        assert check_code_safety(code) is None, code
+
+
+def test_safety_caches_verdicts():
+    from app.main import safety_analyzer
+
+    code = "print('cache me')  # unique"
+    before = safety_analyzer.stats()["hits"]
+    check_code_safety(code)
+    check_code_safety(code)
+    assert safety_analyzer.stats()["hits"] == before + 1
+
+
+# Result cache tests
+def test_determinism_classification():
+    from app.main import BLOCKED_IMPORTS
+    from app.safety import SafetyAnalyzer, SafetyPolicy
+
+    analyzer = SafetyAnalyzer(SafetyPolicy.build(BLOCKED_IMPORTS), track_determinism=True)
+    assert analyzer.analyze("print(sum(range(10)))").deterministic is True
+    assert analyzer.analyze("import math\nprint(math.pi)").deterministic is True
+    assert analyzer.analyze("import random\nprint(random.random())").deterministic is False
+    assert analyzer.analyze("from time import time\nprint(time())").deterministic is False
+    assert analyzer.analyze("name = input()\nprint(name)").deterministic is False
+    assert analyzer.analyze("print({'a', 'b'})").deterministic is False
+    assert analyzer.analyze("class A:\n    pass\nprint(A())").deterministic is False
+    # Default reprs print memory addresses
+    assert analyzer.analyze("print(object())").deterministic is False
+    assert analyzer.analyze("print(lambda: 0)").deterministic is False
+    assert analyzer.analyze("def f():\n    pass\nprint(f)").deterministic is False
+    assert analyzer.analyze("print(f'{g}')\ng = lambda: 1").deterministic is False
+    assert analyzer.analyze("print(list(map(id, [1])))").deterministic is False
+    assert analyzer.analyze("def f():\n    return 2\nprint(f())").deterministic is True
+    assert analyzer.analyze("print(sorted([3, 1], key=lambda x: -x))").deterministic is True
+
+
+def test_result_cache_lru_ttl_and_bytes():
+    from app.cache import ResultCache
+    from app.sandbox import RunResult
+
+    cache = ResultCache(max_entries=2, ttl=60, max_bytes=1024 * 1024)
+    cache.put("a", RunResult(output="1"))
+    cache.put("b", RunResult(output="2"))
+    assert cache.get("a").output == "1"
+    cache.put("c", RunResult(output="3"))
+
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+    assert stats["bytes"] > 0
+
+    expiring = ResultCache(max_entries=2, ttl=0, max_bytes=1024 * 1024)
+    expiring.put("a", RunResult(output="1"))
+    assert expiring.get("a") is None
+    assert expiring.stats()["expirations"] == 1
+
+
+@patch("app.main.requests.post")
+def test_execute_serves_deterministic_code_from_cache(mock_post):
+    from app.cache import ResultCache
+    from app.safety import SafetyAnalyzer, SafetyPolicy
+    from app.main import BLOCKED_IMPORTS, scheduler
+
+    cache = ResultCache(max_entries=16, ttl=60, max_bytes=1024 * 1024)
+    analyzer = SafetyAnalyzer(SafetyPolicy.build(BLOCKED_IMPORTS), track_determinism=True)
+    with patch("app.main.RESULT_CACHE_ENABLED", True), \
+         patch("app.main.result_cache", cache), \
+         patch("app.main.safety_analyzer", analyzer), \
+         patch.object(scheduler, "submit", wraps=scheduler.submit) as submit:
+        first = client.post("/execute", json={"code": "print(6 * 7)", "user_id": "u1"}).json()
+        second = client.post("/execute", json={"code": "print(6 * 7)", "user_id": "u2"}).json()
+        client.post("/execute", json={"code": "import random\nprint(random.random())"})
+        client.post("/execute", json={"code": "import random\nprint(random.random())"})
+
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["output"] == "42\n"
+    assert submit.call_count == 3
+    assert cache.stats()["hits"] == 1
+    # Cache hits still publish the execution event
+    assert mock_post.call_count == 4
+
+
+def test_results_showing_memory_addresses_are_not_cached():
+    from app.cache import cacheable
+    from app.sandbox import RunResult
+
+    assert cacheable(RunResult(output="42\n")) is True
+    assert cacheable(RunResult(output="<__main__.A object at 0x7f3a2c1d5e10>\n")) is False
+    assert cacheable(RunResult(output="", error="<function f at 0x7f3a2c1d5e10>")) is False
+    assert cacheable(RunResult(output="", exit_code=-9)) is False
+
+
+# Batch execution tests
+@patch("app.main.requests.post")
+def test_execute_batch_runs_each_case(mock_post):
+    mock_post.return_value = MagicMock(status_code=200)
+
+    code = "import sys\nname = input()\nprint(f'Hello, {name}!', *sys.argv[1:])"
+    response = client.post("/execute/batch", json={
+        "code": code,
+        "cases": [
+            {"stdin": "Ada\n"},
+            {"stdin": "Grace\n", "args": ["--loud"]},
+            {"stdin": ""},
+        ],
+    })
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["output"] for r in results[:2]] == ["Hello, Ada!\n", "Hello, Grace! --loud\n"]
+    assert results[2]["exit_code"] == 1
+    assert "EOFError" in results[2]["error"]
+    assert all(r["wall_time_ms"] > 0 for r in results)
+    mock_post.assert_called_once()
+
+
+def test_execute_batch_blocked_code():
+    response = client.post("/execute/batch", json={
+        "code": "import socket",
+        "cases": [{"stdin": "1"}, {"stdin": "2"}],
+    })
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["passed_safety"] is False
+    assert all("socket" in r["error"] for r in data["results"])
+
+
+def test_execute_batch_rejects_too_many_cases():
+    from app.main import MAX_BATCH_CASES
+
+    response = client.post("/execute/batch", json={
+        "code": "print(1)",
+        "cases": [{}] * (MAX_BATCH_CASES + 1),
+    })
+    assert response.status_code == 422
+
+
+# Output cap and streaming tests
+def _parse_sse(body: str):
+    import json
+
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_pool_stops_program_at_output_cap():
+    from app.pool import WorkerPool
+
+    pool = WorkerPool(size=1, max_runs=10, queue_depth=4, max_output=100)
+    try:
+        result = pool.run("while True:\n    print('spam')", timeout=5)
+    finally:
+        pool.shutdown()
+
+    assert result.timed_out is False
+    assert result.truncated is True
+    assert len(result.output) == 100
+    assert "Output limit" in result.error
+
+
+def test_spawned_run_stops_program_at_output_cap():
+    from app.sandbox import run_spawned
+
+    result = run_spawned("while True:\n    print('spam')", timeout=5, max_output=100)
+
+    assert result.timed_out is False
+    assert result.truncated is True
+    assert len(result.output) == 100
+    assert "Output limit" in result.error
+
+
+@patch("app.main.requests.post")
+def test_execute_stream_emits_chunks_then_exit(mock_post):
+    mock_post.return_value = MagicMock(status_code=200)
+
+    response = client.post("/execute/stream", json={
+        "code": "import sys\nprint('out')\nprint('err', file=sys.stderr)\nsys.exit(2)",
+    })
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(response.text)
+    assert "".join(data for event, data in events if event == "stdout") == "out\n"
+    assert "".join(data for event, data in events if event == "stderr") == "err\n"
+    event, data = events[-1]
+    assert event == "exit"
+    assert (data["exit_code"], data["timed_out"], data["truncated"]) == (2, False, False)
+    assert data["cpu_time_ms"] > 0
+
+
+@patch("app.main.requests.post")
+def test_execute_stream_stops_at_output_cap(mock_post):
+    mock_post.return_value = MagicMock(status_code=200)
+
+    with patch("app.main.MAX_OUTPUT_SIZE", 50):
+        response = client.post("/execute/stream", json={"code": "while True:\n    print('x' * 10)"})
+
+    events = _parse_sse(response.text)
+    streamed = "".join(data for event, data in events if event == "stdout")
+    assert len(streamed) == 50
+    assert events[-1][1]["truncated"] is True
+
+
+# Resource limit tests
+def _limited_pool(**limits):
+    from app.limits import ResourceLimits
+    from app.pool import WorkerPool
+
+    return WorkerPool(size=1, max_runs=10, queue_depth=4, limits=ResourceLimits(**limits))
+
+
+def test_pool_memory_limit_raises_memory_error():
+    pool = _limited_pool(memory_bytes=256 * 1024 * 1024)
+    try:
+        result = pool.run("x = [0] * 10**10", timeout=5)
+        after = pool.run("print('still alive')", timeout=5)
+    finally:
+        pool.shutdown()
+
+    assert result.exit_code == 1
+    assert "MemoryError" in result.error
+    assert after.output == "still alive\n"
+
+
+def test_pool_cpu_limit_kills_busy_loop_before_timeout():
+    import time
+
+    pool = _limited_pool(cpu_seconds=1)
+    try:
+        start = time.monotonic()
+        result = pool.run("while True:\n    pass", timeout=10)
+        elapsed = time.monotonic() - start
+    finally:
+        pool.shutdown()
+
+    assert result.timed_out is False
+    assert result.error == "CPU time limit exceeded"
+    assert elapsed < 5
+
+
+def test_spawned_run_enforces_limits_and_reports_usage():
+    from app.limits import ResourceLimits
+    from app.sandbox import run_spawned
+
+    limits = ResourceLimits(cpu_seconds=1, memory_bytes=256 * 1024 * 1024)
+    busy = run_spawned("while True:\n    pass", timeout=10, limits=limits)
+    hungry = run_spawned("x = [0] * 10**10", timeout=5, limits=limits)
+    ok = run_spawned("x = bytearray(20 * 1024 * 1024)\nprint(len(x))", timeout=5, limits=limits)
+
+    assert busy.error == "CPU time limit exceeded"
+    assert busy.cpu_time_ms >= 900
+    assert "MemoryError" in hungry.error
+    assert ok.exit_code == 0
+    assert ok.peak_rss_kb > 20 * 1024
+
+
+def test_pool_reports_per_run_usage():
+    pool = _limited_pool(memory_bytes=512 * 1024 * 1024)
+    try:
+        big = pool.run("x = bytearray(50 * 1024 * 1024)\nsum(range(10**6))", timeout=5)
+        small = pool.run("print(1)", timeout=5)
+    finally:
+        pool.shutdown()
+
+    assert big.peak_rss_kb > 50 * 1024
+    assert big.cpu_time_ms > small.cpu_time_ms
+    assert small.peak_rss_kb < big.peak_rss_kb
+
+
+@patch("app.main.requests.post")
+def test_execute_response_includes_usage(mock_post):
+    mock_post.return_value = MagicMock(status_code=200)
+
+    response = client.post("/execute", json={"code": "print(sum(range(10**5)))"})
+
+    data = response.json()
+    assert data["wall_time_ms"] > 0
+    assert data["cpu_time_ms"] >= 0
+    assert data["peak_rss_kb"] > 0
+    assert client.get("/metrics").json()["usage"]["runs"] >= 1
+
+
+def test_resource_module_is_blocked():
+    response = client.post("/execute", json={"code": "import resource"})
+
+    assert "not allowed" in response.json()["error"]
+
+
+# Source-over-stdin spawn tests
+def test_spawned_run_reads_large_source_and_stdin_from_one_pipe():
+    from app.sandbox import run_spawned
+
+    code = "data = " + repr("x" * 200_000) + "\nprint(len(data), input())"
+    result = run_spawned(code, timeout=5, stdin="after source\n")
+
+    assert result.output == "200000 after source\n"
+
+
+def test_spawned_run_uses_main_py_and_hides_service_modules():
+    from app.sandbox import run_spawned
+
+    result = run_spawned("import sys\nprint(sys.argv)\nimport app", timeout=5, args=["x"])
+
+    assert result.output == "['main.py', 'x']\n"
+    assert 'File "main.py", line 3' in result.error
+    assert "No module named 'app'" in result.error
+
+
+# Priority lane tests
+def _blocked_scheduler(concurrency=1, **background):
+    import threading
+    from app.scheduler import BACKGROUND, ExecutionScheduler
+
+    scheduler = ExecutionScheduler(
+        concurrency=concurrency, queue_depth=8, max_wait=30, interactive_weight=9
+    )
+    scheduler.add_lane(BACKGROUND, weight=1, queue_depth=8, max_wait=30, **background)
+    release = threading.Event()
+    return scheduler, release
+
+
+def test_interactive_lane_is_dispatched_before_queued_background_work():
+    import time
+    from app.scheduler import BACKGROUND
+
+    scheduler, release = _blocked_scheduler()
+    scheduler.submit(release.wait)
+    while scheduler.stats()["running"] == 0:
+        time.sleep(0.01)
+
+    order = []
+    futures = [scheduler.submit(order.append, f"bg{i}", lane=BACKGROUND) for i in range(3)]
+    futures += [scheduler.submit(order.append, f"ui{i}") for i in range(2)]
+    release.set()
+    for f in futures:
+        f.result(timeout=5)
+
+    assert order == ["ui0", "ui1", "bg0", "bg1", "bg2"]
+
+
+def test_lanes_share_contested_slots_by_weight():
+    import threading
+    import time
+    from app.scheduler import BACKGROUND, ExecutionScheduler
+
+    scheduler = ExecutionScheduler(concurrency=1, queue_depth=16, max_wait=30, interactive_weight=2)
+    scheduler.add_lane(BACKGROUND, weight=1, queue_depth=16, max_wait=30)
+    release = threading.Event()
+    scheduler.submit(release.wait)
+    while scheduler.stats()["running"] == 0:
+        time.sleep(0.01)
+
+    order = []
+    futures = [scheduler.submit(order.append, "bg", lane=BACKGROUND) for _ in range(3)]
+    futures += [scheduler.submit(order.append, "ui") for _ in range(6)]
+    release.set()
+    for f in futures:
+        f.result(timeout=5)
+
+    assert order == ["ui", "bg", "ui"] * 3
+
+
+def test_background_lane_cannot_take_reserved_slot():
+    import time
+    from app.scheduler import BACKGROUND
+
+    scheduler, release = _blocked_scheduler(concurrency=2, max_running=1)
+    try:
+        scheduler.submit(release.wait, lane=BACKGROUND)
+        waiting = scheduler.submit(lambda: "bg", lane=BACKGROUND)
+        assert scheduler.submit(lambda: "ui").result(timeout=2) == "ui"
+        time.sleep(0.05)
+        assert not waiting.done()
+    finally:
+        release.set()
+    assert waiting.result(timeout=5) == "bg"
+
+    lanes = scheduler.stats()["lanes"]
+    assert lanes["background"]["completed"] == 2
+    assert lanes["background"]["running_limit"] == 1
+    assert lanes["background"]["wait_ms"]["max"] > 0
+
+
+@patch("app.main.requests.post")
+def test_code_events_run_on_background_lane(mock_post):
+    mock_post.return_value = MagicMock(status_code=200)
+    before = client.get("/metrics").json()["scheduler"]["lanes"]
+
+    response = client.post("/events/code", json={"data": {"code": "print(1)", "user_id": "u1"}})
+    client.post("/execute", json={"code": "print(2)"})
+
+    assert response.json() == {"status": "executed", "exit_code": 0}
+    lanes = client.get("/metrics").json()["scheduler"]["lanes"]
+    assert lanes["background"]["completed"] == before["background"]["completed"] + 1
+    assert lanes["interactive"]["completed"] == before["interactive"]["completed"] + 1
+
+
+# Zygote fork-server tests
+def test_zygote_forks_runs_with_preloaded_modules():
+    from app.sandbox import run_spawned
+    from app.zygote import Zygote
+
+    zygote = Zygote(["csv", "json"])
+    try:
+        first = run_spawned(
+            "import sys, random\nprint('csv' in sys.modules, input(), sys.argv)\nprint(random.random())",
+            timeout=5, stdin="hi\n", args=["x"], spawn=zygote.spawn,
+        )
+        second = run_spawned("import random\nprint(random.random())", timeout=5, spawn=zygote.spawn)
+        failing = run_spawned("x = 1\nraise ValueError('bad')", timeout=5, spawn=zygote.spawn)
+    finally:
+        zygote.shutdown()
+
+    lines = first.output.splitlines()
+    assert lines[0] == "True hi ['main.py', 'x']"
+    # Each fork reseeds random instead of replaying the zygote's state
+    assert lines[1] != second.output.strip()
+    assert failing.exit_code == 1
+    assert 'File "main.py", line 2' in failing.error
+    assert failing.error.endswith("ValueError: bad\n")
+
+
+def test_zygote_kills_run_on_timeout_and_restarts_after_crash():
+    from app.sandbox import run_spawned
+    from app.zygote import Zygote
+
+    zygote = Zygote([])
+    try:
+        slow = run_spawned("import time\ntime.sleep(10)", timeout=0.5, spawn=zygote.spawn)
+        zygote._proc.kill()
+        zygote._proc.wait()
+        after = run_spawned("print('back')", timeout=5, spawn=zygote.spawn)
+    finally:
+        zygote.shutdown()
+
+    assert slow.timed_out is True
+    assert after.output == "back\n"
+
+
+@patch("app.main.requests.post")
+def test_spawn_path_uses_zygote_when_pool_disabled(mock_post):
+    from app.main import zygote
+
+    mock_post.return_value = MagicMock(status_code=200)
+    forks = zygote.stats()["forks"]
+
+    with patch("app.main.pool", None):
+        response = client.post("/execute", json={"code": "print('forked')"})
+
+    assert response.json()["output"] == "forked\n"
+    assert zygote.stats()["forks"] == forks + 1
+
+
+# Bytecode cache tests
+def test_bytecode_cache_hits_and_bounds():
+    from app.bytecode import BytecodeCache
+
+    cache = BytecodeCache(max_entries=2, max_bytes=1024 * 1024)
+    first = cache.get("print(1)")
+    again = cache.get("print(1)")
+    cache.get("print(2)")
+    cache.get("print(3)")
+
+    assert first.bytecode and again is first
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["evictions"]) == (1, 3, 2, 1)
+    assert stats["compile_ms_saved"] > 0
+
+
+def test_bytecode_cache_reports_syntax_errors_and_skips_warning_sources():
+    from app.bytecode import BytecodeCache
+
+    cache = BytecodeCache(max_entries=8, max_bytes=1024 * 1024)
+    broken = cache.get("def f(:\n    pass")
+    warns = cache.get("x = 1\nprint(x is 1)")
+
+    assert broken.bytecode is None
+    assert broken.syntax_error.startswith('  File "main.py", line 1\n')
+    assert broken.syntax_error.endswith("SyntaxError: invalid syntax\n")
+    # Let the sandbox compile it so the student sees the SyntaxWarning
+    assert warns.bytecode is None and warns.syntax_error is None
+    assert cache.stats()["syntax_errors_served"] == 1
+
+
+def test_pool_runs_precompiled_bytecode_with_source_tracebacks():
+    from app.bytecode import compile_source
+    from app.pool import WorkerPool
+
+    code = "print('from bytecode')\nraise KeyError('k')"
+    pool = WorkerPool(size=1, max_runs=10, queue_depth=4)
+    try:
+        result = pool.run(code, timeout=5, bytecode=compile_source(code).bytecode)
+    finally:
+        pool.shutdown()
+
+    assert result.output == "from bytecode\n"
+    assert "    raise KeyError('k')\n" in result.error
+
+
+@patch("app.main.requests.post")
+def test_execute_answers_syntax_errors_without_a_sandbox(mock_post):
+    from app.main import scheduler
+
+    mock_post.return_value = MagicMock(status_code=200)
+
+    with patch.object(scheduler, "submit") as submit:
+        response = client.post("/execute", json={"code": "print('unterminated)"})
+
+    submit.assert_not_called()
+    data = response.json()
+    assert data["exit_code"] == 1
+    assert "SyntaxError: unterminated string literal" in data["error"]
+    assert client.get("/metrics").json()["bytecode_cache"]["syntax_errors_served"] >= 1
+
+
+def test_syntax_errors_match_the_interpreter_byte_for_byte(tmp_path):
+    import subprocess
+    import sys
+
+    from app.bytecode import compile_source
+
+    programs = [
+        "for i in range(10)\n    print(i)\n",
+        "print('hello'\n",
+        "def f():\nreturn 1\n",
+        "if True:\n",
+        "\tprint('leading tab')\n",
+        "s = 'café'\nprint(s[)\n",
+        "nonlocal x\n",
+        "x = 10\ny = 20\nprint(x y)\n",
+    ]
+    for code in programs:
+        (tmp_path / "main.py").write_text(code, encoding="utf-8")
+        real = subprocess.run(
+            [sys.executable, "main.py"], cwd=tmp_path, capture_output=True, text=True
+        )
+        expected = real.stderr.replace(str(tmp_path / "main.py"), "main.py")
+        assert real.returncode == 1
+        assert compile_source(code).syntax_error == expected, code
+
+
+@patch("app.main.requests.post")
+def test_syntax_short_circuit_without_bytecode_cache(mock_post):
+    from app.main import scheduler
+
+    mock_post.return_value = MagicMock(status_code=200)
+
+    with patch("app.main.BYTECODE_CACHE_ENABLED", False), patch.object(scheduler, "submit") as submit:
+        response = client.post("/execute", json={"code": "if x = 5:\n    pass\n"})
+
+    submit.assert_not_called()
+    assert response.json()["exit_code"] == 1
+    assert response.json()["error"].endswith("SyntaxError: invalid syntax. Maybe you meant '==' or ':=' instead of '='?\n")
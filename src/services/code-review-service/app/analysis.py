@@ -0,0 +1,418 @@
+"""Static analysis of a submission: PEP 8, complexity, nesting, naming and anti-patterns."""
+import ast
+import io
+import keyword
+import re
+import tokenize
+from typing import Dict, List, NamedTuple, Optional
+
+MAX_LINE_LENGTH = 79
+_SNAKE_CASE = re.compile(r"^_{0,2}[a-z][a-z0-9_]*_{0,2}$|^_$")
+_CAP_WORDS = re.compile(r"^_?[A-Z][a-zA-Z0-9]*$")
+_CONSTANT = re.compile(r"^_?[A-Z][A-Z0-9_]*$")
+_AMBIGUOUS = {"l", "O", "I"}
+# Binary operators that PEP 8 wants surrounded by spaces
+_SPACED_OPERATORS = {
+    "=", "==", "!=", "<", ">", "<=", ">=", "+=", "-=", "*=", "/=", "//=", "%=", "**=",
+    "&=", "|=", "^=", ">>=", "<<=", "@=", ":=", "->",
+}
+_LOOPS = (ast.For, ast.AsyncFor, ast.While)
+_BLOCKS = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith, ast.Try)
+_FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+
+class Finding(NamedTuple):
+    category: str  # style, naming, efficiency, readability, correctness
+    code: str
+    line: int
+    message: str
+
+
+class Analysis(NamedTuple):
+    syntax_error: Optional[str]
+    lines: int
+    functions: int
+    max_complexity: int
+    complexity: Dict[str, int]
+    max_nesting: int
+    findings: List[Finding]
+    scores: Dict[str, int]
+
+    def count(self, category: str) -> int:
+        return sum(f.category == category for f in self.findings)
+
+    def summary(self) -> dict:
+        """Compact, JSON-ready view for prompts and API responses."""
+        return {
+            "syntax_error": self.syntax_error,
+            "lines": self.lines,
+            "functions": self.functions,
+            "max_complexity": self.max_complexity,
+            "complexity": self.complexity,
+            "max_nesting": self.max_nesting,
+            "pep8_violations": self.count("style"),
+            "naming_issues": self.count("naming"),
+            "findings": [f"line {f.line}: {f.code} {f.message}" for f in self.findings[:20]],
+            "scores": self.scores,
+        }
+
+    def suggestions(self, limit: int = 5) -> List[str]:
+        """One suggestion per finding code, most important categories first."""
+        order = ["correctness", "efficiency", "readability", "naming", "style"]
+        seen = set()
+        suggestions = []
+        for finding in sorted(self.findings, key=lambda f: (order.index(f.category), f.line)):
+            if finding.code in seen:
+                continue
+            seen.add(finding.code)
+            suggestions.append(f"Line {finding.line}: {finding.message}")
+            if len(suggestions) == limit:
+                break
+        return suggestions
+
+
+def analyze(code: str) -> Analysis:
+    lines = code.splitlines()
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        message = f"line {e.lineno}: {e.msg}"
+        finding = Finding("correctness", "E999", e.lineno or 1, f"SyntaxError: {e.msg}")
+        scores = {"correctness": 0, "style": 0, "efficiency": 0, "readability": 0, "score": 0}
+        return Analysis(message, len(lines), 0, 0, {}, 0, [finding], scores)
+
+    findings: List[Finding] = []
+    findings += _physical_lines(lines)
+    findings += _tokens(code)
+    visitor = _Visitor()
+    visitor.visit(tree)
+    findings += visitor.findings
+    findings += _blank_lines(tree, lines)
+    findings.sort(key=lambda f: (f.line, f.code))
+
+    max_complexity = max(visitor.complexity.values(), default=_complexity(tree))
+    analysis = Analysis(
+        syntax_error=None,
+        lines=len(lines),
+        functions=len(visitor.complexity),
+        max_complexity=max_complexity,
+        complexity=visitor.complexity,
+        max_nesting=visitor.max_nesting,
+        findings=findings,
+        scores={},
+    )
+    return analysis._replace(scores=_scores(analysis, visitor.long_functions))
+
+
+def _scores(analysis: Analysis, long_functions: int) -> Dict[str, int]:
+    """Deterministic 0-100 scores; each finding or excess metric costs a fixed amount."""
+    style = 100 - 3 * analysis.count("style") - 5 * analysis.count("naming")
+    efficiency = 100 - 15 * analysis.count("efficiency")
+    readability = (
+        100
+        - 8 * max(0, analysis.max_complexity - 5)
+        - 10 * max(0, analysis.max_nesting - 3)
+        - 5 * long_functions
+        - 5 * analysis.count("readability")
+        - 2 * analysis.count("naming")
+    )
+    correctness = 100 - 10 * analysis.count("correctness")
+    scores = {
+        "correctness": correctness,
+        "style": style,
+        "efficiency": efficiency,
+        "readability": readability,
+    }
+    scores = {name: min(100, max(0, value)) for name, value in scores.items()}
+    scores["score"] = overall_score(scores)
+    return scores
+
+
+def overall_score(scores: Dict[str, int]) -> int:
+    """Overall 0-100 score: correctness weighs double each of the other criteria."""
+    return round(
+        0.4 * scores["correctness"] + 0.2 * scores["style"] + 0.2 * scores["efficiency"] + 0.2 * scores["readability"]
+    )
+
+
+# Line and token checks (pycodestyle codes)
+
+def _physical_lines(lines: List[str]) -> List[Finding]:
+    findings = []
+    for number, line in enumerate(lines, 1):
+        if len(line) > MAX_LINE_LENGTH:
+            findings.append(Finding("style", "E501", number, f"Line too long ({len(line)} > {MAX_LINE_LENGTH} characters)."))
+        if line != line.rstrip():
+            findings.append(Finding("style", "W291", number, "Remove trailing whitespace."))
+    return findings
+
+
+def _tokens(code: str) -> List[Finding]:
+    findings = []
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(code).readline))
+    except (tokenize.TokenError, IndentationError):
+        return findings
+    depth = 0
+    for index, token in enumerate(tokens):
+        if token.type == tokenize.INDENT:
+            if "\t" in token.string:
+                findings.append(Finding("style", "W191", token.start[0], "Indent with spaces, not tabs."))
+            elif len(token.string) % 4:
+                findings.append(Finding("style", "E111", token.start[0], "Indent with a multiple of four spaces."))
+        if token.type != tokenize.OP:
+            continue
+        if token.string in "([{":
+            depth += 1
+        elif token.string in ")]}":
+            depth -= 1
+        previous, following = tokens[index - 1], tokens[index + 1]
+        line = token.start[0]
+        if token.string in _SPACED_OPERATORS and not (token.string == "=" and depth):
+            if previous.end == token.start or following.start == token.end:
+                findings.append(Finding("style", "E225", line, f"Put spaces around `{token.string}`."))
+        elif token.string == "," and following.start == token.end and following.string not in ")]}":
+            findings.append(Finding("style", "E231", line, "Put a space after `,`."))
+        elif token.string == ";":
+            findings.append(Finding("style", "E702", line, "Put each statement on its own line instead of using `;`."))
+    return findings
+
+
+def _blank_lines(tree: ast.Module, lines: List[str]) -> List[Finding]:
+    """E302/E305: two blank lines around top-level functions and classes."""
+    findings = []
+    body = tree.body
+    for index, node in enumerate(body):
+        if index == 0:
+            continue
+        is_def = isinstance(node, (*_FUNCTIONS, ast.ClassDef))
+        after_def = isinstance(body[index - 1], (*_FUNCTIONS, ast.ClassDef))
+        if not (is_def or after_def):
+            continue
+        first = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        blank = 0
+        number = first - 1
+        while number > 0 and not lines[number - 1].strip():
+            blank += 1
+            number -= 1
+        if number > 0 and lines[number - 1].lstrip().startswith("#"):
+            continue
+        if blank < 2:
+            code = "E302" if is_def else "E305"
+            findings.append(Finding("style", code, first, "Leave two blank lines around top-level functions and classes."))
+    return findings
+
+
+# AST checks
+
+def _complexity(node: ast.AST) -> int:
+    """McCabe cyclomatic complexity of `node`, not counting nested functions or classes."""
+    complexity = 1
+    stack = list(ast.iter_child_nodes(node))
+    while stack:
+        child = stack.pop()
+        if isinstance(child, (*_FUNCTIONS, ast.ClassDef, ast.Lambda)):
+            continue
+        if isinstance(child, (ast.If, ast.IfExp, *_LOOPS, ast.ExceptHandler, ast.Assert)):
+            complexity += 1
+        elif isinstance(child, ast.BoolOp):
+            complexity += len(child.values) - 1
+        elif isinstance(child, ast.comprehension):
+            complexity += 1 + len(child.ifs)
+        elif isinstance(child, ast.match_case):
+            complexity += 1
+        stack.extend(ast.iter_child_nodes(child))
+    return complexity
+
+
+class _Visitor(ast.NodeVisitor):
+    def __init__(self):
+        self.findings: List[Finding] = []
+        self.complexity: Dict[str, int] = {}
+        self.max_nesting = 0
+        self.long_functions = 0
+        self._depth = 0
+        self._loops = 0
+        self._scopes: List[Dict[str, str]] = [{}]
+        self._in_function = 0
+
+    def add(self, category: str, code: str, node: ast.AST, message: str):
+        self.findings.append(Finding(category, code, getattr(node, "lineno", 1), message))
+
+    # Scopes and nesting
+
+    def visit_FunctionDef(self, node):
+        self.complexity[node.name] = _complexity(node)
+        if not _SNAKE_CASE.match(node.name) and not node.name.startswith("__"):
+            self.add("naming", "N802", node, f"Name function `{node.name}` in snake_case.")
+        length = (node.end_lineno or node.lineno) - node.lineno + 1
+        if length > 50:
+            self.long_functions += 1
+            self.add("readability", "R001", node, f"`{node.name}` is {length} lines long; split it into smaller functions.")
+        if self.complexity[node.name] > 10:
+            self.add(
+                "readability", "C901", node,
+                f"`{node.name}` has cyclomatic complexity {self.complexity[node.name]}; simplify its branching.",
+            )
+        for default in node.args.defaults + node.args.kw_defaults:
+            if isinstance(default, (ast.List, ast.Dict, ast.Set)):
+                self.add(
+                    "correctness", "B006", default,
+                    f"`{node.name}` has a mutable default argument; use None and create it inside the function.",
+                )
+        self._check_inline_body(node)
+        positional = node.args.posonlyargs + node.args.args
+        defaults = [None] * (len(positional) - len(node.args.defaults)) + node.args.defaults
+        scope = {}
+        for arg, default in zip(positional + node.args.kwonlyargs, defaults + node.args.kw_defaults):
+            self._check_variable(arg.arg, arg, "N803", "argument")
+            scope[arg.arg] = _annotation_kind(arg.annotation) or (_value_kind(default) if default else None)
+        self._scopes.append(scope)
+        self._in_function += 1
+        depth, loops = self._depth, self._loops
+        self._depth = self._loops = 0
+        self.generic_visit(node)
+        self._depth, self._loops = depth, loops
+        self._in_function -= 1
+        self._scopes.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        if not _CAP_WORDS.match(node.name):
+            self.add("naming", "N801", node, f"Name class `{node.name}` in CapWords.")
+        self._check_inline_body(node)
+        self.generic_visit(node)
+
+    def generic_visit(self, node):
+        if isinstance(node, _BLOCKS):
+            self._depth += 1
+            self.max_nesting = max(self.max_nesting, self._depth)
+            if self._depth == 4:
+                self.add("readability", "R002", node, "Deeply nested block; return early or extract a function.")
+            self._check_inline_body(node)
+        loop = isinstance(node, _LOOPS)
+        self._loops += loop
+        super().generic_visit(node)
+        self._loops -= loop
+        if isinstance(node, _BLOCKS):
+            self._depth -= 1
+
+    # Names and assignments
+
+    def visit_Assign(self, node):
+        kind = _value_kind(node.value)
+        for target in node.targets:
+            self._bind(target, kind)
+        if isinstance(node.value, ast.Lambda) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            self.add("style", "E731", node, f"Use `def {node.targets[0].id}(...)` instead of assigning a lambda.")
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node):
+        if node.value is not None:
+            self._bind(node.target, _value_kind(node.value))
+        self.generic_visit(node)
+
+    def visit_For(self, node):
+        self._bind(node.target, None)
+        iterator = node.iter
+        if (
+            isinstance(iterator, ast.Call) and isinstance(iterator.func, ast.Name) and iterator.func.id == "range"
+            and len(iterator.args) == 1 and isinstance(iterator.args[0], ast.Call)
+            and isinstance(iterator.args[0].func, ast.Name) and iterator.args[0].func.id == "len"
+        ):
+            self.add("readability", "R003", node, "Loop over the items directly, or use `enumerate(...)`, instead of `range(len(...))`.")
+        self.generic_visit(node)
+
+    visit_AsyncFor = visit_For
+
+    def visit_AugAssign(self, node):
+        if self._loops and isinstance(node.op, ast.Add) and isinstance(node.target, ast.Name):
+            known = self._lookup(node.target.id)
+            if known == "str" or _value_kind(node.value) == "str":
+                self.add(
+                    "efficiency", "P002", node,
+                    f"Building `{node.target.id}` with `+=` in a loop copies the string each time; "
+                    "collect the parts in a list and `''.join(...)` them.",
+                )
+        self.generic_visit(node)
+
+    def visit_Compare(self, node):
+        for op, comparator in zip(node.ops, node.comparators):
+            if isinstance(op, (ast.In, ast.NotIn)) and self._loops:
+                if isinstance(comparator, ast.Name) and self._lookup(comparator.id) == "list":
+                    self.add(
+                        "efficiency", "P001", node,
+                        f"`in {comparator.id}` scans the whole list on every loop iteration; "
+                        "use a set for membership tests.",
+                    )
+                elif isinstance(comparator, ast.List) and len(comparator.elts) > 3:
+                    self.add("efficiency", "P001", node, "Use a set literal `{...}` for membership tests in a loop.")
+            if isinstance(op, (ast.Eq, ast.NotEq)) and isinstance(comparator, ast.Constant):
+                if comparator.value is None:
+                    self.add("style", "E711", node, "Compare with None using `is` / `is not`.")
+                elif comparator.value is True or comparator.value is False:
+                    self.add("style", "E712", node, f"Don't compare with {comparator.value}; use the condition directly.")
+        self.generic_visit(node)
+
+    def visit_ExceptHandler(self, node):
+        if node.type is None:
+            self.add("correctness", "E722", node, "Catch specific exceptions instead of a bare `except:`.")
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        if len(node.names) > 1:
+            self.add("style", "E401", node, "Put each import on its own line.")
+        self.generic_visit(node)
+
+    def visit_Global(self, node):
+        self.add("readability", "R004", node, "Avoid `global`; pass values in and return results instead.")
+        self.generic_visit(node)
+
+    def _check_inline_body(self, node: ast.AST):
+        body = getattr(node, "body", None)
+        if body and body[0].lineno == node.lineno:
+            self.add("style", "E701", node, "Put the body of a block statement on its own line, after the `:`.")
+
+    def _bind(self, target: ast.AST, kind: Optional[str]):
+        if isinstance(target, ast.Name):
+            self._scopes[-1][target.id] = kind
+            self._check_variable(target.id, target, "N806", "variable")
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            for element in target.elts:
+                self._bind(element, None)
+
+    def _lookup(self, name: str) -> Optional[str]:
+        for scope in reversed(self._scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def _check_variable(self, name: str, node: ast.AST, code: str, what: str):
+        if name in _AMBIGUOUS:
+            self.add("naming", "E741", node, f"`{name}` is easily confused with 1 or 0; use a descriptive name.")
+        elif keyword.iskeyword(name) or _SNAKE_CASE.match(name):
+            return
+        elif not (_CONSTANT.match(name) and not self._in_function):
+            self.add("naming", code, node, f"Name {what} `{name}` in snake_case.")
+
+
+def _annotation_kind(annotation: Optional[ast.AST]) -> Optional[str]:
+    if isinstance(annotation, ast.Subscript):
+        annotation = annotation.value
+    if isinstance(annotation, ast.Name):
+        return {"list": "list", "List": "list", "str": "str"}.get(annotation.id)
+    return None
+
+
+def _value_kind(value: ast.AST) -> Optional[str]:
+    """'list' or 'str' when an assigned value is obviously one of those types."""
+    if isinstance(value, (ast.List, ast.ListComp)):
+        return "list"
+    if isinstance(value, ast.JoinedStr) or (isinstance(value, ast.Constant) and isinstance(value.value, str)):
+        return "str"
+    if isinstance(value, ast.Call) and isinstance(value.func, ast.Name):
+        return {"list": "list", "str": "str", "input": "str"}.get(value.func.id)
+    if isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute) and value.func.attr in ("split", "readlines"):
+        return "list"
+    return None
@@ -0,0 +1,113 @@
+"""Packing several reviews into one LLM call, and micro-batching of queued reviews."""
+from concurrent.futures import Future
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, List, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for code and English)."""
+    return len(text) // 4 + 1
+
+
+def pack(items: Sequence[T], cost: Callable[[T], int], max_tokens: int, max_items: int) -> List[List[T]]:
+    """Split `items`, in order, into batches of at most `max_items` within `max_tokens`.
+
+    An item that alone exceeds the budget gets a batch of its own.
+    """
+    batches: List[List[T]] = []
+    batch: List[T] = []
+    tokens = 0
+    for item in items:
+        item_tokens = cost(item)
+        if batch and (tokens + item_tokens > max_tokens or len(batch) == max_items):
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append(item)
+        tokens += item_tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class MicroBatcher:
+    """Collects items submitted concurrently and processes them together.
+
+    A batch is flushed when it reaches `max_items` or `max_tokens`, or
+    `max_wait` seconds after its first item arrived. `process` receives the
+    items and returns one result per item; each submitter gets its own
+    result (or the batch's exception), whichever event loop it awaits on.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[List[Any]], Awaitable[List[Any]]],
+        cost: Callable[[Any], int],
+        max_items: int,
+        max_tokens: int,
+        max_wait: float,
+    ):
+        self.process = process
+        self.cost = cost
+        self.max_items = max_items
+        self.max_tokens = max_tokens
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[Any, Future]] = []
+        self._tokens = 0
+        self._generation = 0
+        self.flushes = {"full": 0, "timeout": 0}
+
+    async def submit(self, item):
+        future: Future = Future()
+        item_tokens = self.cost(item)
+        ready = []
+        with self._lock:
+            if self._pending and self._tokens + item_tokens > self.max_tokens:
+                ready.append(self._take("full"))
+            self._pending.append((item, future))
+            self._tokens += item_tokens
+            first = len(self._pending) == 1
+            generation = self._generation
+            if len(self._pending) >= self.max_items or self._tokens >= self.max_tokens:
+                ready.append(self._take("full"))
+                first = False
+        for batch in ready:
+            asyncio.ensure_future(self._run(batch))
+        if first:
+            asyncio.ensure_future(self._flush_after(generation))
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    async def _flush_after(self, generation: int):
+        await asyncio.sleep(self.max_wait)
+        with self._lock:
+            if generation != self._generation or not self._pending:
+                return
+            batch = self._take("timeout")
+        await self._run(batch)
+
+    def _take(self, reason: str) -> List[Tuple[Any, Future]]:
+        batch, self._pending = self._pending, []
+        self._tokens = 0
+        self._generation += 1
+        self.flushes[reason] += 1
+        return batch
+
+    async def _run(self, batch: List[Tuple[Any, Future]]):
+        try:
+            results = await self.process([item for item, _ in batch])
+        except BaseException as e:
+            for _, future in batch:
+                future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        if len(results) != len(batch):
+            error = RuntimeError(f"batch of {len(batch)} items produced {len(results)} results")
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
@@ -0,0 +1,171 @@
+"""Review cache keyed by a canonical AST fingerprint of the submission."""
+from collections import OrderedDict
+import ast
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Optional, Set
+
+
+def fingerprint(code: str, rename: bool = False) -> Optional[str]:
+    """Hash of the code's AST: formatting and comments never change it.
+
+    With `rename`, names the code binds itself (variables, arguments,
+    functions, classes) are replaced by their order of first appearance, so
+    solutions that differ only in naming share a fingerprint. Builtins,
+    imports and attributes keep their names. None if the code doesn't parse.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    if rename:
+        tree = _AlphaRenamer(_bound_names(tree), _defined_callables(tree)).visit(tree)
+    dump = ast.dump(tree, annotate_fields=False, include_attributes=False)
+    return hashlib.sha256(dump.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def review_key(fingerprint: str, model: str, prompt_version: str, rename: bool) -> str:
+    payload = json.dumps([fingerprint, model, prompt_version, rename])
+    return f"review-{hashlib.sha256(payload.encode()).hexdigest()[:40]}"
+
+
+def _bound_names(tree: ast.AST) -> Set[str]:
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+    imported = {
+        (alias.asname or alias.name).split(".")[0]
+        for node in ast.walk(tree) if isinstance(node, (ast.Import, ast.ImportFrom))
+        for alias in node.names
+    }
+    # Dunder names (__init__, __name__, ...) carry meaning and are never renamed
+    return {name for name in names - imported if not (name.startswith("__") and name.endswith("__"))}
+
+
+def _defined_callables(tree: ast.AST) -> Set[str]:
+    return {
+        node.name for node in ast.walk(tree)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    }
+
+
+class _AlphaRenamer(ast.NodeTransformer):
+    def __init__(self, bound: Set[str], callables: Set[str]):
+        self.bound = bound
+        self.callables = callables
+        self.names: Dict[str, str] = {}
+
+    def rename(self, name: str) -> str:
+        if name not in self.bound:
+            return name
+        if name not in self.names:
+            self.names[name] = f"v{len(self.names)}"
+        return self.names[name]
+
+    def visit_Name(self, node):
+        node.id = self.rename(node.id)
+        return node
+
+    def visit_arg(self, node):
+        node.arg = self.rename(node.arg)
+        self.generic_visit(node)
+        return node
+
+    def visit_FunctionDef(self, node):
+        node.name = self.rename(node.name)
+        self.generic_visit(node)
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        node.name = self.rename(node.name)
+        self.generic_visit(node)
+        return node
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            node.name = self.rename(node.name)
+        self.generic_visit(node)
+        return node
+
+    def visit_Call(self, node):
+        # Keyword arguments name parameters: renamed only for the code's own
+        # functions and classes, never for builtins or library calls (print(sep=...))
+        if isinstance(node.func, ast.Name) and node.func.id in self.callables:
+            for keyword in node.keywords:
+                if keyword.arg:
+                    keyword.arg = self.rename(keyword.arg)
+        self.generic_visit(node)
+        return node
+
+    def visit_Global(self, node):
+        node.names = [self.rename(name) for name in node.names]
+        return node
+
+    visit_Nonlocal = visit_Global
+
+
+class ReviewCache:
+    """LRU of `max_entries` LLM review results; entries live `ttl` seconds."""
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.tokens_saved = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                if time.time() - value["cached_at"] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.tokens_saved += value.get("tokens", 0)
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: dict):
+        with self._lock:
+            self._entries[key] = {**value, "cached_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "tokens_saved": self.tokens_saved,
+            }
@@ -2,12 +2,21 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Tuple
+import asyncio
+import hashlib
 import os
 import json
 import requests
+import time
 
-from openai import OpenAI
+from openai import APITimeoutError
+
+from app.analysis import Analysis, analyze, overall_score
+from app.batching import MicroBatcher, estimate_tokens, pack
+from app.cache import ReviewCache, fingerprint, review_key
+from app.llm import ConcurrencyLimit, create_client
+from app.singleflight import SingleFlight, request_key
 
 app = FastAPI(
     title="code-review-service",
@@ -27,8 +36,38 @@ app.add_middleware(
 DAPR_HTTP_PORT = os.getenv("DAPR_HTTP_PORT", "3500")
 DAPR_BASE_URL = f"http://localhost:{DAPR_HTTP_PORT}"
 
-# OpenAI configuration
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# OpenAI configuration: one async client per process with pooled HTTP/2
+# connections; OPENAI_TIMEOUT bounds each request
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+client = create_client(
+    os.getenv("OPENAI_API_KEY"), OPENAI_MAX_CONCURRENCY, OPENAI_TIMEOUT, os.getenv("OPENAI_BASE_URL") or None
+)
+llm_limit = ConcurrencyLimit(OPENAI_MAX_CONCURRENCY)
+llm_flight = SingleFlight()
+
+# Reviews: "fast" mode scores with static analysis alone; "full" mode adds
+# the LLM, falling back to the static review after REVIEW_LLM_DEADLINE seconds
+# or when the reply cannot be parsed.
+# REVIEW_EVENT_MODE picks the mode for code.executed reviews.
+REVIEW_LLM_DEADLINE = float(os.getenv("REVIEW_LLM_DEADLINE", "10"))
+REVIEW_EVENT_MODE = os.getenv("REVIEW_EVENT_MODE", "full")
+review_counts = {"fast": 0, "full": 0, "fallbacks": 0}
+analysis_seconds = {"total": 0.0, "max": 0.0}
+single_stats = {"calls": 0, "tokens": 0, "seconds": 0.0}
+
+# Batched reviews: up to REVIEW_BATCH_MAX_ITEMS submissions and about
+# REVIEW_BATCH_MAX_TOKENS prompt tokens per LLM call, each answered with
+# up to REVIEW_BATCH_OUTPUT_TOKENS. With REVIEW_EVENT_BATCHING, code.executed
+# reviews wait up to REVIEW_BATCH_MAX_WAIT seconds to share a call.
+REVIEW_BATCH_MAX_ITEMS = int(os.getenv("REVIEW_BATCH_MAX_ITEMS", "8"))
+REVIEW_BATCH_MAX_TOKENS = int(os.getenv("REVIEW_BATCH_MAX_TOKENS", "6000"))
+REVIEW_BATCH_OUTPUT_TOKENS = int(os.getenv("REVIEW_BATCH_OUTPUT_TOKENS", "350"))
+REVIEW_BATCH_MAX_WAIT = float(os.getenv("REVIEW_BATCH_MAX_WAIT", "0.5"))
+REVIEW_BATCH_DEADLINE = float(os.getenv("REVIEW_BATCH_DEADLINE", "30"))
+REVIEW_BATCH_MAX_REQUEST = int(os.getenv("REVIEW_BATCH_MAX_REQUEST", "64"))
+REVIEW_EVENT_BATCHING = os.getenv("REVIEW_EVENT_BATCHING", "true").lower() == "true"
+batch_stats = {"calls": 0, "reviews": 0, "tokens": 0, "seconds": 0.0, "missing": 0, "fallbacks": 0}
 
 SYSTEM_PROMPT = """You are the Code Review Agent for LearnFlow, an AI-powered Python learning platform.
 Review the student's Python code and evaluate it on these criteria:
@@ -37,21 +76,46 @@ Review the student's Python code and evaluate it on these criteria:
 3. Efficiency: Is it well-optimized?
 4. Readability: Is it easy to understand?
 
+Style, efficiency and readability have already been measured by a static
+analyzer; its metrics, findings and scores are given with the code. Treat
+them as facts, don't re-score those criteria, and build on the findings
+rather than repeating them.
+
 Respond with a JSON object containing:
-- "score": overall score 0-100
+- "score": overall score 0-100, weighing correctness with the given scores
 - "correctness": score 0-100 for correctness
-- "style": score 0-100 for PEP 8 compliance
-- "efficiency": score 0-100 for efficiency
-- "readability": score 0-100 for readability
 - "suggestions": array of improvement suggestions (max 5)
 - "overall_feedback": a brief encouraging summary
 """
+BATCH_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+Several submissions are sent at once, each under a "### Submission <id>"
+heading with its own static analysis. Review each one on its own and respond
+with a JSON object {"reviews": [...]} holding one object per submission: its
+"id" plus the fields above.
+"""
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode()).hexdigest()[:12]
+
+# Review cache: the LLM's correctness score and feedback, keyed by the AST
+# fingerprint of the code (formatting and comments ignored; with
+# REVIEW_CACHE_RENAME, also the names the code chooses). The overall score
+# and suggestions depend on formatting and names, so a hit recomputes them
+# from the submission's own static analysis.
+REVIEW_CACHE_ENABLED = os.getenv("REVIEW_CACHE_ENABLED", "true").lower() == "true"
+REVIEW_CACHE_MAX_ENTRIES = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", "2048"))
+REVIEW_CACHE_TTL = int(os.getenv("REVIEW_CACHE_TTL", "86400"))
+REVIEW_CACHE_RENAME = os.getenv("REVIEW_CACHE_RENAME", "false").lower() == "true"
+review_cache = ReviewCache(REVIEW_CACHE_MAX_ENTRIES, REVIEW_CACHE_TTL)
 
 
 class ReviewRequest(BaseModel):
     code: str
     user_id: str = ""
     exercise_id: Optional[str] = None
+    mode: str = "full"
+
+
+class BatchReviewRequest(BaseModel):
+    items: List[ReviewRequest]
 
 
 class ReviewResponse(BaseModel):
@@ -62,6 +126,19 @@ class ReviewResponse(BaseModel):
     readability: int
     suggestions: List[str]
     overall_feedback: str
+    source: str = "static+llm"
+    analysis: Optional[dict] = None
+    cached: bool = False
+
+
+class BatchReviewResponse(BaseModel):
+    reviews: List[ReviewResponse]
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Close the pooled OpenAI connections."""
+    await client.close()
 
 
 @app.get("/health")
@@ -69,93 +146,376 @@ async def health():
     return {"status": "healthy", "service": "code-review-service"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """LLM concurrency, request coalescing and review statistics."""
+    reviews = sum(review_counts[mode] for mode in ("fast", "full"))
+    return {
+        "llm": llm_limit.stats(),
+        "singleflight": llm_flight.stats(),
+        "cache": {**review_cache.stats(), "enabled": REVIEW_CACHE_ENABLED, "rename": REVIEW_CACHE_RENAME},
+        "reviews": {
+            **review_counts,
+            "analysis_avg_ms": round(analysis_seconds["total"] / reviews * 1e3, 2) if reviews else 0.0,
+            "analysis_max_ms": round(analysis_seconds["max"] * 1e3, 2),
+        },
+        "batching": {
+            **batch_stats,
+            "seconds": round(batch_stats["seconds"], 3),
+            "avg_batch_size": _ratio(batch_stats["reviews"], batch_stats["calls"]),
+            "tokens_per_review": _ratio(batch_stats["tokens"], batch_stats["reviews"]),
+            "reviews_per_llm_second": _ratio(batch_stats["reviews"], batch_stats["seconds"]),
+            "single_tokens_per_review": _ratio(single_stats["tokens"], single_stats["calls"]),
+            "single_reviews_per_llm_second": _ratio(single_stats["calls"], single_stats["seconds"]),
+            "event_batching": REVIEW_EVENT_BATCHING,
+            "event_flushes": event_batcher.flushes,
+        },
+    }
+
+
+def _ratio(numerator: float, denominator: float) -> float:
+    return round(numerator / denominator, 2) if denominator else 0.0
+
+
 @app.get("/dapr/subscribe")
 async def subscribe():
     return [
-        {"pubsubname": "pubsub", "topic": "code.submitted", "route": "/events/code"}
+        {"pubsubname": "pubsub", "topic": "code.executed", "route": "/events/code"}
     ]
 
 
 @app.post("/api/review", response_model=ReviewResponse)
 async def review_code(request: ReviewRequest):
-    """Review code quality and provide feedback."""
+    """Review code quality and provide feedback.
+
+    Style, efficiency and readability are scored by static analysis in both
+    modes; "full" mode asks the LLM for correctness, suggestions and feedback.
+    """
+    analysis = await _analyze(request.code)
+
+    if request.mode == "fast":
+        review_counts["fast"] += 1
+        return await _publish_review(request, static_review(analysis))
+    review_counts["full"] += 1
+
+    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    key = await _cache_key(request.code, model)
+    cached = review_cache.get(key) if key else None
+    if cached:
+        return await _publish_review(request, _cached_review(analysis, cached))
+
     try:
-        response = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": f"Review this Python code:\n```python\n{request.code}\n```"},
-            ],
-            response_format={"type": "json_object"},
+        started = time.perf_counter()
+        response = await asyncio.wait_for(
+            chat_completion(
+                model=model,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": (
+                        f"Review this Python code:\n```python\n{request.code}\n```\n\n"
+                        f"Static analysis:\n{json.dumps(analysis.summary(), indent=1)}"
+                    )},
+                ],
+                response_format={"type": "json_object"},
+            ),
+            REVIEW_LLM_DEADLINE,
         )
 
         content = response.choices[0].message.content
         result = json.loads(content) if content else {}
+        if not isinstance(result, dict):
+            raise ValueError("Review is not a JSON object")
 
-        score = min(100, max(0, int(result.get("score", 50))))
-        correctness = min(100, max(0, int(result.get("correctness", 50))))
-        style = min(100, max(0, int(result.get("style", 50))))
-        efficiency = min(100, max(0, int(result.get("efficiency", 50))))
-        readability = min(100, max(0, int(result.get("readability", 50))))
-        suggestions = result.get("suggestions", [])
-        overall_feedback = result.get("overall_feedback", "Code reviewed successfully.")
-
-        # Publish quality score for mastery tracking
-        if request.user_id:
-            try:
-                requests.post(
-                    f"{DAPR_BASE_URL}/v1.0/publish/pubsub/learning.events",
-                    json={
-                        "type": "code_reviewed",
-                        "user_id": request.user_id,
-                        "exercise_id": request.exercise_id,
-                        "quality_score": score,
-                    },
-                )
-            except Exception:
-                pass
-
-        return ReviewResponse(
-            score=score,
-            correctness=correctness,
-            style=style,
-            efficiency=efficiency,
-            readability=readability,
-            suggestions=suggestions if isinstance(suggestions, list) else [str(suggestions)],
-            overall_feedback=overall_feedback,
-        )
+        fields = _llm_fields(result, analysis)
+        tokens = _total_tokens(response)
+        single_stats["calls"] += 1
+        single_stats["tokens"] += tokens
+        single_stats["seconds"] += time.perf_counter() - started
+        if key:
+            review_cache.put(key, _cache_entry(fields, tokens))
 
-    except json.JSONDecodeError:
-        return ReviewResponse(
-            score=50,
-            correctness=50,
-            style=50,
-            efficiency=50,
-            readability=50,
-            suggestions=["Unable to parse AI review. Please try again."],
-            overall_feedback="Review could not be completed. Please try again.",
-        )
+        return await _publish_review(request, _llm_review(analysis, fields))
+
+    except (asyncio.TimeoutError, APITimeoutError, TypeError, ValueError, AttributeError):
+        # The LLM is too slow or its reply unreadable or malformed: the static review still stands
+        review_counts["fallbacks"] += 1
+        return await _publish_review(request, static_review(analysis))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _analyze(code: str) -> Analysis:
+    started = time.perf_counter()
+    analysis = await asyncio.to_thread(analyze, code)
+    elapsed = time.perf_counter() - started
+    analysis_seconds["total"] += elapsed
+    analysis_seconds["max"] = max(analysis_seconds["max"], elapsed)
+    return analysis
+
+
+async def _cache_key(code: str, model: str) -> Optional[str]:
+    """The review cache key for `code`; None if caching is off or the code doesn't parse."""
+    if not REVIEW_CACHE_ENABLED:
+        return None
+    code_fingerprint = await asyncio.to_thread(fingerprint, code, REVIEW_CACHE_RENAME)
+    if not code_fingerprint:
+        return None
+    return review_key(code_fingerprint, model, PROMPT_VERSION, REVIEW_CACHE_RENAME)
+
+
+def _llm_fields(result: dict, analysis: Analysis) -> dict:
+    """The LLM's part of a review, clamped, with static analysis filling any gaps."""
+    scores = analysis.scores
+    suggestions = result.get("suggestions") or analysis.suggestions()
+    return {
+        "score": min(100, max(0, int(result.get("score", scores["score"])))),
+        "correctness": min(100, max(0, int(result.get("correctness", scores["correctness"])))),
+        "suggestions": suggestions if isinstance(suggestions, list) else [str(suggestions)],
+        "overall_feedback": result.get("overall_feedback", "Code reviewed successfully."),
+    }
+
+
+def _total_tokens(response) -> int:
+    tokens = getattr(getattr(response, "usage", None), "total_tokens", 0)
+    return tokens if isinstance(tokens, int) else 0
+
+
+def _cache_entry(fields: dict, tokens: int) -> dict:
+    """The parts of an LLM review that hold for every submission with the same fingerprint."""
+    return {"correctness": fields["correctness"], "overall_feedback": fields["overall_feedback"], "tokens": tokens}
+
+
+def _cached_review(analysis: Analysis, entry: dict) -> ReviewResponse:
+    """A cached correctness verdict and feedback, scored and advised from this submission's own analysis."""
+    fields = {
+        "score": overall_score({**analysis.scores, "correctness": entry["correctness"]}),
+        "correctness": entry["correctness"],
+        "suggestions": analysis.suggestions(),
+        "overall_feedback": entry["overall_feedback"],
+    }
+    return _llm_review(analysis, fields, cached=True)
+
+
+def _llm_review(analysis: Analysis, fields: dict, cached: bool = False) -> ReviewResponse:
+    """The LLM's verdict combined with this submission's own static scores."""
+    scores = analysis.scores
+    return ReviewResponse(
+        score=fields["score"],
+        correctness=fields["correctness"],
+        style=scores["style"],
+        efficiency=scores["efficiency"],
+        readability=scores["readability"],
+        suggestions=fields["suggestions"],
+        overall_feedback=fields["overall_feedback"],
+        analysis=analysis.summary(),
+        cached=cached,
+    )
+
+
+def static_review(analysis: Analysis) -> ReviewResponse:
+    """A complete review from static analysis alone."""
+    scores = analysis.scores
+    if analysis.syntax_error:
+        feedback = f"The code doesn't run yet: there is a syntax error on {analysis.syntax_error}. Fix it first."
+    elif not analysis.findings:
+        feedback = "Clean code: no style, naming or efficiency issues found."
+    else:
+        feedback = (
+            f"Found {len(analysis.findings)} thing(s) to improve; "
+            "start with the suggestions at the top of the list."
+        )
+    return ReviewResponse(
+        score=scores["score"],
+        correctness=scores["correctness"],
+        style=scores["style"],
+        efficiency=scores["efficiency"],
+        readability=scores["readability"],
+        suggestions=analysis.suggestions(),
+        overall_feedback=feedback,
+        source="static",
+        analysis=analysis.summary(),
+    )
+
+
+async def _publish_review(request: ReviewRequest, review: ReviewResponse) -> ReviewResponse:
+    """Publish the quality score for mastery tracking."""
+    if request.user_id:
+        await asyncio.to_thread(_post_review_event, request, review)
+    return review
+
+
+def _post_review_event(request: ReviewRequest, review: ReviewResponse):
+    try:
+        requests.post(
+            f"{DAPR_BASE_URL}/v1.0/publish/pubsub/learning.events",
+            json={
+                "type": "code_reviewed",
+                "user_id": request.user_id,
+                "exercise_id": request.exercise_id,
+                "quality_score": review.score,
+            },
+            timeout=2,
+        )
+    except Exception:
+        pass
+
+
+# Batched reviews
+
+
+@app.post("/api/review/batch", response_model=BatchReviewResponse)
+async def review_batch(request: BatchReviewRequest):
+    """Review several submissions, packing those the LLM must see into shared calls."""
+    if len(request.items) > REVIEW_BATCH_MAX_REQUEST:
+        raise HTTPException(
+            status_code=400, detail=f"At most {REVIEW_BATCH_MAX_REQUEST} submissions per batch"
+        )
+    return BatchReviewResponse(reviews=await review_many(request.items))
+
+
+async def review_many(items: List[ReviewRequest]) -> List[ReviewResponse]:
+    """One review per item, in order, as `review_code` would give each.
+
+    Cache hits and "fast" items never reach the LLM; the rest are packed into
+    as few calls as the batch limits allow, identical code sent once. An item
+    the LLM leaves out, or a batch that fails or misses REVIEW_BATCH_DEADLINE,
+    gets the static review.
+    """
+    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    analyses = [await _analyze(item.code) for item in items]
+    reviews: List[Optional[ReviewResponse]] = [None] * len(items)
+    # Cache misses by key (or by position, for code without one)
+    pending = {}
+    for index, (item, analysis) in enumerate(zip(items, analyses)):
+        if item.mode == "fast":
+            review_counts["fast"] += 1
+            reviews[index] = static_review(analysis)
+            continue
+        review_counts["full"] += 1
+        key = await _cache_key(item.code, model)
+        cached = review_cache.get(key) if key else None
+        if cached:
+            reviews[index] = _cached_review(analysis, cached)
+        else:
+            pending.setdefault(key or index, []).append(index)
+
+    groups = list(pending.items())
+    batches = pack(
+        groups,
+        lambda group: _prompt_tokens(items[group[1][0]].code, analyses[group[1][0]]),
+        REVIEW_BATCH_MAX_TOKENS,
+        REVIEW_BATCH_MAX_ITEMS,
+    )
+    results = await asyncio.gather(*(
+        _review_batch(model, [(items[indexes[0]].code, analyses[indexes[0]]) for _, indexes in batch])
+        for batch in batches
+    ))
+    for batch, (fields_list, tokens) in zip(batches, results):
+        for (key, indexes), fields in zip(batch, fields_list):
+            if fields is not None and isinstance(key, str):
+                review_cache.put(key, _cache_entry(fields, tokens // len(batch)))
+            for index in indexes:
+                if fields is None:
+                    reviews[index] = static_review(analyses[index])
+                else:
+                    reviews[index] = _llm_review(analyses[index], fields)
+
+    return list(await asyncio.gather(*(_publish_review(item, review) for item, review in zip(items, reviews))))
+
+
+def _prompt_tokens(code: str, analysis: Analysis) -> int:
+    return estimate_tokens(code) + estimate_tokens(json.dumps(analysis.summary()))
+
+
+async def _review_batch(model: str, submissions: List[Tuple[str, Analysis]]) -> Tuple[List[Optional[dict]], int]:
+    """One LLM call reviewing every submission: per-submission fields (None if missing) and total tokens."""
+    prompt = "\n\n".join(
+        f"### Submission {number}\n```python\n{code}\n```\n"
+        f"Static analysis: {json.dumps(analysis.summary())}"
+        for number, (code, analysis) in enumerate(submissions, 1)
+    )
+    started = time.perf_counter()
+    try:
+        response = await asyncio.wait_for(
+            chat_completion(
+                model=model,
+                messages=[
+                    {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Review these {len(submissions)} Python submissions:\n\n{prompt}"},
+                ],
+                response_format={"type": "json_object"},
+                max_tokens=REVIEW_BATCH_OUTPUT_TOKENS * len(submissions),
+            ),
+            REVIEW_BATCH_DEADLINE,
+        )
+        content = response.choices[0].message.content
+        result = json.loads(content) if content else {}
+    except Exception:
+        # Timeouts, upstream errors and unparseable output alike: the static reviews stand
+        batch_stats["fallbacks"] += len(submissions)
+        return [None] * len(submissions), 0
+
+    tokens = _total_tokens(response)
+    batch_stats["calls"] += 1
+    batch_stats["reviews"] += len(submissions)
+    batch_stats["tokens"] += tokens
+    batch_stats["seconds"] += time.perf_counter() - started
+
+    entries = result.get("reviews") if isinstance(result, dict) else None
+    by_id = {
+        str(entry.get("id")): entry
+        for entry in (entries if isinstance(entries, list) else [])
+        if isinstance(entry, dict)
+    }
+    fields_list: List[Optional[dict]] = []
+    for number, (_, analysis) in enumerate(submissions, 1):
+        entry = by_id.get(str(number))
+        try:
+            fields_list.append(_llm_fields(entry, analysis) if entry is not None else None)
+        except (TypeError, ValueError):
+            fields_list.append(None)
+        if fields_list[-1] is None:
+            batch_stats["missing"] += 1
+    return fields_list, tokens
+
+
+def _event_tokens(request: ReviewRequest) -> int:
+    # The static-analysis summary adds about 150 tokens to the code itself
+    return estimate_tokens(request.code) + 150
+
+
+event_batcher = MicroBatcher(
+    review_many, _event_tokens, REVIEW_BATCH_MAX_ITEMS, REVIEW_BATCH_MAX_TOKENS, REVIEW_BATCH_MAX_WAIT
+)
+
+
 @app.post("/events/code")
 async def handle_code_event(event: dict):
-    """Handle code submission events for automatic review."""
+    """Review submissions once code-execution-service has run them (code.executed)."""
     data = event.get("data", event)
     code = data.get("code", "")
     user_id = data.get("user_id", "")
 
     if code:
-        await review_code(ReviewRequest(
+        request = ReviewRequest(
             code=code,
             user_id=user_id,
             exercise_id=data.get("exercise_id"),
-        ))
+            mode=REVIEW_EVENT_MODE,
+        )
+        if REVIEW_EVENT_BATCHING and request.mode != "fast":
+            await event_batcher.submit(request)
+        else:
+            await review_code(request)
 
     return {"status": "processed"}
 
 
+async def chat_completion(**params):
+    """Chat completion; identical concurrent requests share one upstream call."""
+    return await llm_flight.do(request_key(params), llm_limit.run, client.chat.completions.create, **params)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
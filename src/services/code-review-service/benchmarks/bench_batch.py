@@ -0,0 +1,97 @@
+"""Batched vs one-at-a-time reviews: LLM calls, tokens per review and reviews/sec.
+
+The LLM is simulated: each call takes `--base-latency` seconds plus
+`--per-token` seconds per output token, and bills prompt and output tokens
+with the same chars/4 estimate the batcher packs by. Static analysis,
+prompt building and result splitting run for real.
+
+Run from the service directory:
+
+    python benchmarks/bench_batch.py --submissions 64 --max-items 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app import main as service  # noqa: E402
+from app.batching import estimate_tokens  # noqa: E402
+
+OUTPUT_TOKENS_PER_REVIEW = 120
+
+
+class FakeCompletions:
+    def __init__(self, base_latency: float, per_token: float):
+        self.base_latency = base_latency
+        self.per_token = per_token
+
+    async def create(self, **params):
+        prompt = "".join(message["content"] for message in params["messages"])
+        submissions = max(1, prompt.count("### Submission"))
+        output_tokens = OUTPUT_TOKENS_PER_REVIEW * submissions
+        await asyncio.sleep(self.base_latency + self.per_token * output_tokens)
+        review = {"score": 80, "correctness": 85, "suggestions": ["Add a docstring"], "overall_feedback": "Good."}
+        if "### Submission" in prompt:
+            content = json.dumps({"reviews": [{"id": n, **review} for n in range(1, submissions + 1)]})
+        else:
+            content = json.dumps(review)
+        message = SimpleNamespace(content=content)
+        usage = SimpleNamespace(total_tokens=estimate_tokens(prompt) + output_tokens)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def submission(n: int) -> service.ReviewRequest:
+    code = (
+        f"def solve_{n}(values):\n"
+        "    total = 0\n"
+        "    for value in values:\n"
+        f"        if value % {n % 7 + 2} == 0:\n"
+        "            total += value\n"
+        "    return total\n"
+    )
+    return service.ReviewRequest(code=code)
+
+
+async def run_single(items):
+    return await asyncio.gather(*(service.review_code(item) for item in items))
+
+
+async def run_batched(items):
+    return await service.review_many(items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=64)
+    parser.add_argument("--max-items", type=int, default=service.REVIEW_BATCH_MAX_ITEMS)
+    parser.add_argument("--base-latency", type=float, default=0.4)
+    parser.add_argument("--per-token", type=float, default=0.002)
+    args = parser.parse_args()
+
+    completions = FakeCompletions(args.base_latency, args.per_token)
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    service.REVIEW_CACHE_ENABLED = False
+    service.REVIEW_LLM_DEADLINE = service.REVIEW_BATCH_DEADLINE = 600
+    service.REVIEW_BATCH_MAX_ITEMS = args.max_items
+    items = [submission(n) for n in range(args.submissions)]
+
+    print(f"{args.submissions} submissions, up to {args.max_items} per batch, "
+          f"concurrency {service.OPENAI_MAX_CONCURRENCY}")
+    print(f"{'mode':>8} {'calls':>6} {'tokens/review':>13} {'reviews/s':>9}")
+    for mode, run, stats in (("single", run_single, service.single_stats), ("batched", run_batched, service.batch_stats)):
+        calls, tokens = stats["calls"], stats["tokens"]
+        started = time.perf_counter()
+        asyncio.run(run(items))
+        elapsed = time.perf_counter() - started
+        calls, tokens = stats["calls"] - calls, stats["tokens"] - tokens
+        print(f"{mode:>8} {calls:>6} {tokens / len(items):>13.0f} {len(items) / elapsed:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,18 @@
 """Tests for the Code Review Service."""
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock, MagicMock
 from fastapi.testclient import TestClient
 
-from app.main import app
+from app import main
+from app.main import app, review_cache
 
 client = TestClient(app)
 
 
+def setup_function():
+    review_cache.clear()
+    main.REVIEW_EVENT_BATCHING = False
+
+
 def test_health():
     response = client.get("/health")
     assert response.status_code == 200
@@ -20,7 +26,7 @@ def test_dapr_subscribe():
     assert response.status_code == 200
     subs = response.json()
     assert len(subs) == 1
-    assert subs[0]["topic"] == "code.submitted"
+    assert subs[0]["topic"] == "code.executed"
 
 
 @patch("app.main.requests.post")
@@ -29,7 +35,7 @@ def test_review_code(mock_openai, mock_post):
     mock_response = MagicMock()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = '{"score": 85, "correctness": 90, "style": 80, "efficiency": 85, "readability": 85, "suggestions": ["Add docstrings", "Use more descriptive variable names"], "overall_feedback": "Good code! Clean and efficient."}'
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
     mock_post.return_value = MagicMock(status_code=200)
 
     response = client.post("/api/review", json={
@@ -51,7 +57,7 @@ def test_review_publishes_event(mock_openai, mock_post):
     mock_response = MagicMock()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = '{"score": 70, "correctness": 70, "style": 70, "efficiency": 70, "readability": 70, "suggestions": ["Improve naming"], "overall_feedback": "Decent code."}'
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
     mock_post.return_value = MagicMock(status_code=200)
 
     client.post("/api/review", json={
@@ -63,6 +69,7 @@ def test_review_publishes_event(mock_openai, mock_post):
     mock_post.assert_called_once()
     call_args = mock_post.call_args
     assert "publish/pubsub/learning.events" in call_args[0][0]
+    assert call_args[1]["timeout"] == 2
     event_data = call_args[1]["json"]
     assert event_data["type"] == "code_reviewed"
     assert event_data["quality_score"] == 70
@@ -70,7 +77,7 @@ def test_review_publishes_event(mock_openai, mock_post):
 
 @patch("app.main.client")
 def test_review_error_handling(mock_openai):
-    mock_openai.chat.completions.create.side_effect = Exception("API error")
+    mock_openai.chat.completions.create = AsyncMock(side_effect=Exception("API error"))
 
     response = client.post("/api/review", json={
         "code": "test",
@@ -83,15 +90,32 @@ def test_review_json_decode_error(mock_openai):
     mock_response = MagicMock()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = "not json"
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
+
+    before = client.get("/metrics").json()["reviews"]["fallbacks"]
 
     response = client.post("/api/review", json={
         "code": "print('hello')",
     })
     assert response.status_code == 200
     data = response.json()
-    assert data["score"] == 50  # default fallback
+    # The static review stands in for the unreadable reply
+    assert data["source"] == "static" and data["score"] == 100
+    assert client.get("/metrics").json()["reviews"]["fallbacks"] == before + 1
+
+
+
+@patch("app.main.client")
+def test_review_malformed_reply_falls_back(mock_openai):
+    for content in ("[]", '{"score": "85/100"}', '{"correctness": null}'):
+        mock_response = MagicMock()
+        mock_response.choices = [MagicMock()]
+        mock_response.choices[0].message.content = content
+        mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
 
+        response = client.post("/api/review", json={"code": f"print({len(content)})"})
+        assert response.status_code == 200, content
+        assert response.json()["source"] == "static", content
 
 def test_handle_code_event():
     response = client.post("/events/code", json={
@@ -99,3 +123,322 @@ def test_handle_code_event():
     })
     assert response.status_code == 200
     assert response.json()["status"] == "processed"
+
+
+@patch("app.main.review_code")
+def test_handle_code_event_reviews_executed_code(mock_review):
+    response = client.post("/events/code", json={
+        "data": {"code": "print('hi')", "user_id": "user-1", "exercise_id": "ex-1", "exit_code": 0}
+    })
+    assert response.json()["status"] == "processed"
+    request = mock_review.call_args[0][0]
+    assert request.code == "print('hi')"
+    assert request.exercise_id == "ex-1"
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_concurrent_identical_reviews_share_one_llm_call(mock_openai, mock_post):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = '{"score": 80, "suggestions": [], "overall_feedback": "Fine"}'
+
+    async def slow_create(**params):
+        await asyncio.sleep(0.2)
+        return mock_response
+
+    mock_openai.chat.completions.create = AsyncMock(side_effect=slow_create)
+    mock_post.return_value = MagicMock(status_code=200)
+    before = client.get("/metrics").json()["singleflight"]["collapsed"]
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        responses = list(executor.map(
+            lambda _: client.post('/api/review', json={'code': "print('hi')"}), range(5)
+        ))
+
+    assert all(r.status_code == 200 for r in responses)
+    assert mock_openai.chat.completions.create.call_count == 1
+    stats = client.get("/metrics").json()["singleflight"]
+    assert stats["collapsed"] == before + 4
+    assert stats["in_flight"] == 0
+
+
+MESSY_CODE = '''def BuildReport(items, seen=[]):
+    report = ""
+    for item in items:
+        if item in seen:
+            continue
+        seen.append(item)
+        report += str(item)
+    try:
+        return report
+    except:
+        return None
+'''
+
+
+def test_static_analysis_finds_style_naming_and_antipatterns():
+    from app.analysis import analyze
+
+    analysis = analyze(MESSY_CODE)
+
+    codes = {(f.code, f.line) for f in analysis.findings}
+    assert {("N802", 1), ("B006", 1), ("P001", 4), ("P002", 7), ("E722", 10)} <= codes
+    assert analysis.complexity == {"BuildReport": 4} and analysis.max_nesting == 2
+    assert analysis.scores["efficiency"] == 70
+    assert analysis.suggestions()[0].startswith("Line 1: `BuildReport` has a mutable default")
+
+    clean = analyze('def add(first, second):\n    return first + second\n')
+    assert clean.findings == [] and clean.scores["score"] == 100
+    assert analyze("def f(:\n").scores["correctness"] == 0
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_fast_review_needs_no_llm(mock_openai, mock_post):
+    mock_openai.chat.completions.create = AsyncMock(side_effect=AssertionError("LLM called"))
+    mock_post.return_value = MagicMock(status_code=200)
+
+    response = client.post("/api/review", json={"code": MESSY_CODE, "user_id": "user-1", "mode": "fast"})
+
+    data = response.json()
+    assert data["source"] == "static"
+    assert data["efficiency"] == 70 and data["score"] < 100
+    assert any("join" in s for s in data["suggestions"])
+    assert mock_post.call_args[1]["json"]["quality_score"] == data["score"]
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_full_review_feeds_static_metrics_to_the_llm(mock_openai, mock_post):
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = '{"score": 60, "correctness": 80, "style": 99, "suggestions": ["Use a set"], "overall_feedback": "Works."}'
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
+
+    data = client.post("/api/review", json={"code": MESSY_CODE}).json()
+
+    prompt = mock_openai.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+    assert '"max_complexity": 4' in prompt and "P002" in prompt
+    # Style, efficiency and readability are measured, not taken from the model
+    assert (data["score"], data["correctness"], data["style"]) == (60, 80, data["analysis"]["scores"]["style"])
+    assert data["source"] == "static+llm" and data["suggestions"] == ["Use a set"]
+
+
+@patch("app.main.REVIEW_LLM_DEADLINE", 0.05)
+@patch("app.main.client")
+def test_slow_llm_falls_back_to_the_static_review(mock_openai):
+    import asyncio
+
+    async def slow_create(**params):
+        await asyncio.sleep(1)
+
+    mock_openai.chat.completions.create = AsyncMock(side_effect=slow_create)
+    before = client.get("/metrics").json()["reviews"]["fallbacks"]
+
+    data = client.post("/api/review", json={"code": "x = [1, 2]\nprint(x)\n"}).json()
+
+    assert data["source"] == "static" and data["score"] == 100
+    assert client.get("/metrics").json()["reviews"]["fallbacks"] == before + 1
+
+
+def test_fingerprint_ignores_formatting_comments_and_optionally_names():
+    from app.cache import fingerprint
+
+    original = "def total(values):\n    result = 0\n    for v in values:\n        result += v\n    return result\n"
+    reformatted = (
+        "# Sum the list\ndef total( values ):\n\n    result=0  # start at zero\n"
+        "    for v in values: result += v\n    return (result)\n"
+    )
+    renamed = "def add_all(nums):\n    acc = 0\n    for n in nums:\n        acc += n\n    return acc\n"
+
+    assert fingerprint(original) == fingerprint(reformatted)
+    assert fingerprint(original) != fingerprint(renamed)
+    assert fingerprint(original, rename=True) == fingerprint(renamed, rename=True)
+    # Builtins, attributes and imports keep their names
+    assert fingerprint("x = len(a)", rename=True) != fingerprint("x = sum(a)", rename=True)
+    assert fingerprint("items.append(1)", rename=True) != fingerprint("items.add(1)", rename=True)
+    # ...and so do keyword arguments, except to the code's own functions
+    assert fingerprint('sep = ","\nprint(1, 2, sep=sep)', rename=True) != fingerprint(
+        'end = ","\nprint(1, 2, end=end)', rename=True
+    )
+    assert fingerprint("def f(a):\n    return a\nf(a=1)", rename=True) == fingerprint(
+        "def g(b):\n    return b\ng(b=1)", rename=True
+    )
+    assert fingerprint("def f(:") is None
+
+
+def test_review_cache_is_bounded_and_expires():
+    from app.cache import ReviewCache
+
+    cache = ReviewCache(max_entries=2, ttl=60)
+    for key in ("a", "b", "c"):
+        cache.put(key, {"score": 1, "tokens": 10})
+    assert cache.get("a") is None and cache.get("c")["score"] == 1
+
+    cache.ttl = -1
+    assert cache.get("b") is None
+    assert cache.stats() == {
+        "entries": 1, "max_entries": 2, "ttl": -1, "hits": 1, "misses": 2, "hit_ratio": 0.3333,
+        "evictions": 1, "expirations": 1, "tokens_saved": 10,
+    }
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_equivalent_submissions_reuse_the_llm_review(mock_openai, mock_post):
+    from app.analysis import analyze, overall_score
+
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = '{"score": 77, "correctness": 90, "suggestions": ["Handle empty lists"], "overall_feedback": "Nice."}'
+    mock_response.usage.total_tokens = 640
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
+    mock_post.return_value = MagicMock(status_code=200)
+    before = client.get("/metrics").json()["cache"]
+
+    first = client.post("/api/review", json={
+        "code": "def mean(xs):\n    return sum(xs) / len(xs)\n", "user_id": "user-1", "exercise_id": "ex-1",
+    }).json()
+    second_code = "# my answer\ndef mean(xs): return sum(xs)/len(xs)\n"
+    second = client.post("/api/review", json={
+        "code": second_code, "user_id": "user-2", "exercise_id": "ex-1",
+    }).json()
+
+    assert mock_openai.chat.completions.create.call_count == 1
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert (first["score"], first["suggestions"]) == (77, ["Handle empty lists"])
+    # Only correctness and feedback are reused: the overall score, style scores
+    # and suggestions describe each submission's own formatting
+    assert (second["correctness"], second["overall_feedback"]) == (90, "Nice.")
+    assert first["style"] == 100 and second["style"] < 100
+    assert second["suggestions"] == analyze(second_code).suggestions() != first["suggestions"]
+    assert second["score"] == overall_score({**analyze(second_code).scores, "correctness": 90})
+    # Every student's review is still published for mastery tracking
+    published = [c[1]["json"] for c in mock_post.call_args_list]
+    assert [(e["user_id"], e["quality_score"]) for e in published] == [("user-1", 77), ("user-2", second["score"])]
+    stats = client.get("/metrics").json()["cache"]
+    assert stats["hits"] == before["hits"] + 1
+    assert stats["tokens_saved"] == before["tokens_saved"] + 640
+
+
+def _batch_response(content, tokens):
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = content
+    mock_response.usage.total_tokens = tokens
+    return mock_response
+
+
+def test_pack_respects_item_and_token_limits():
+    from app.batching import pack
+
+    assert pack([1, 2, 3, 4, 5], lambda n: n, max_tokens=6, max_items=10) == [[1, 2, 3], [4], [5]]
+    assert pack([1, 1, 1, 1, 1], lambda n: n, max_tokens=100, max_items=2) == [[1, 1], [1, 1], [1]]
+    # Oversized items still get a batch of their own
+    assert pack([50, 1], lambda n: n, max_tokens=10, max_items=4) == [[50], [1]]
+
+
+def test_micro_batcher_flushes_when_full_or_after_max_wait():
+    import asyncio
+    from app.batching import MicroBatcher
+
+    batches = []
+
+    async def process(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    batcher = MicroBatcher(process, lambda item: 1, max_items=3, max_tokens=100, max_wait=0.05)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(n) for n in range(5)))
+
+    assert asyncio.run(run()) == [0, 10, 20, 30, 40]
+    assert batches == [[0, 1, 2], [3, 4]]
+    assert batcher.flushes == {"full": 1, "timeout": 1}
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_batch_review_packs_submissions_into_one_call(mock_openai, mock_post):
+    mock_openai.chat.completions.create = AsyncMock(return_value=_batch_response(
+        '{"reviews": [{"id": 2, "score": 70, "correctness": 75, "suggestions": ["Use a set"], "overall_feedback": "Close."},'
+        ' {"id": "1", "score": 90, "correctness": 95, "suggestions": [], "overall_feedback": "Great."}]}',
+        900,
+    ))
+    mock_post.return_value = MagicMock(status_code=200)
+    before = client.get("/metrics").json()["batching"]
+
+    response = client.post("/api/review/batch", json={"items": [
+        {"code": "def add(a, b):\n    return a + b\n", "user_id": "user-1"},
+        {"code": MESSY_CODE, "user_id": "user-2"},
+        {"code": "print(1)\n", "user_id": "user-3", "mode": "fast"},
+        {"code": "x = [i for i in range(3)]\n", "user_id": "user-4"},
+    ]})
+
+    reviews = response.json()["reviews"]
+    assert mock_openai.chat.completions.create.call_count == 1
+    params = mock_openai.chat.completions.create.call_args.kwargs
+    assert "### Submission 3" in params["messages"][1]["content"]
+    assert "### Submission 4" not in params["messages"][1]["content"]
+    assert [r["score"] for r in reviews[:2]] == [90, 70]
+    assert [r["source"] for r in reviews] == ["static+llm", "static+llm", "static", "static"]
+    # The LLM left out submission 3: its static review stands
+    assert reviews[3]["score"] == reviews[3]["analysis"]["scores"]["score"]
+    published = [c[1]["json"] for c in mock_post.call_args_list]
+    assert [(e["user_id"], e["quality_score"]) for e in published] == [
+        ("user-1", 90), ("user-2", 70), ("user-3", reviews[2]["score"]), ("user-4", reviews[3]["score"]),
+    ]
+    stats = client.get("/metrics").json()["batching"]
+    assert stats["calls"] == before["calls"] + 1
+    assert stats["tokens"] == before["tokens"] + 900
+    assert stats["missing"] == before["missing"] + 1
+
+
+@patch("app.main.REVIEW_BATCH_MAX_ITEMS", 2)
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_batch_review_splits_batches_and_reviews_identical_code_once(mock_openai, mock_post):
+    mock_openai.chat.completions.create = AsyncMock(return_value=_batch_response(
+        '{"reviews": [{"id": 1, "score": 81}, {"id": 2, "score": 82}]}', 400,
+    ))
+    codes = ["a = 1\n", "b = 2\n", "a = 1  # same\n", "c = 3\n"]
+
+    reviews = client.post("/api/review/batch", json={"items": [{"code": c} for c in codes]}).json()["reviews"]
+
+    assert mock_openai.chat.completions.create.call_count == 2
+    assert [r["score"] for r in reviews] == [81, 82, 81, 81]
+    # Both reviews are now cached
+    again = client.post("/api/review", json={"code": "c = 3"}).json()
+    assert again["cached"] and mock_openai.chat.completions.create.call_count == 2
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_batched_code_events_share_an_llm_call(mock_openai, mock_post):
+    import asyncio
+
+    async def create(**params):
+        return _batch_response(
+            '{"reviews": [' + ", ".join(
+                f'{{"id": {n}, "score": 88}}' for n in range(1, params["messages"][1]["content"].count("###") + 1)
+            ) + ']}', 300,
+        )
+
+    mock_openai.chat.completions.create = AsyncMock(side_effect=create)
+    mock_post.return_value = MagicMock(status_code=200)
+    main.REVIEW_EVENT_BATCHING = True
+
+    async def deliver():
+        return await asyncio.gather(*(
+            main.handle_code_event({"data": {"code": f"n = {n}\n", "user_id": f"user-{n}"}}) for n in range(3)
+        ))
+
+    assert all(r["status"] == "processed" for r in asyncio.run(deliver()))
+    assert mock_openai.chat.completions.create.call_count == 1
+    published = sorted(c[1]["json"]["user_id"] for c in mock_post.call_args_list)
+    assert published == ["user-0", "user-1", "user-2"]
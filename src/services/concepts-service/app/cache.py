@@ -0,0 +1,214 @@
+"""Two-tier cache of concept explanations: in-process LRU over the Dapr state store."""
+from collections import OrderedDict
+import hashlib
+import json
+import re
+import threading
+import time
+from typing import Optional, Tuple
+
+import requests
+
+KEY_PREFIX = "explain"
+GENERATION_KEY = f"{KEY_PREFIX}-generation"
+_SEPARATORS = re.compile(r"[\s_\-]+")
+_EDGE_PUNCTUATION = " \t\n.,;:!?\"'`()[]"
+
+
+def normalize_concept(concept: str) -> str:
+    """Case-, whitespace- and punctuation-insensitive form of a concept name."""
+    return _SEPARATORS.sub(" ", concept.casefold()).strip(_EDGE_PUNCTUATION)
+
+
+def explanation_key(concept: str, level: str, model: str, prompt_version: str) -> str:
+    """State-store key for one explanation; any change to the tuple is a different entry."""
+    payload = json.dumps(
+        [normalize_concept(concept), level.strip().casefold(), model, prompt_version]
+    )
+    return f"{KEY_PREFIX}-{hashlib.sha256(payload.encode()).hexdigest()[:40]}"
+
+
+class DaprStateStore:
+    """Minimal Dapr state API client; failures are reported as misses, never raised."""
+
+    def __init__(self, base_url: str, name: str, timeout: float = 1.0):
+        self.url = f"{base_url}/v1.0/state/{name}"
+        self.timeout = timeout
+        self.errors = 0
+        self._session = requests.Session()
+
+    def get(self, key: str) -> Optional[dict]:
+        try:
+            response = self._session.get(f"{self.url}/{key}", timeout=self.timeout)
+            if response.status_code == 200 and response.text:
+                return response.json()
+            if response.status_code not in (200, 204):
+                self.errors += 1
+        except Exception:
+            self.errors += 1
+        return None
+
+    def save(self, key: str, value: dict, ttl: int):
+        try:
+            self._session.post(
+                self.url,
+                json=[{"key": key, "value": value, "metadata": {"ttlInSeconds": str(ttl)}}],
+                timeout=self.timeout,
+            )
+        except Exception:
+            self.errors += 1
+
+    def delete(self, key: str):
+        try:
+            self._session.delete(f"{self.url}/{key}", timeout=self.timeout)
+        except Exception:
+            self.errors += 1
+
+
+class ExplanationCache:
+    """LRU of `max_entries` explanations backed by a shared store; entries live `ttl` seconds.
+
+    Values carry their own `cached_at` so the in-process copy never outlives
+    the shared one, even when the store ignores the TTL metadata. Replicas
+    each hold their own LRU, so an in-process copy is only trusted for
+    `memory_ttl` seconds before it is re-read from the store; that bounds how
+    long another replica's `invalidate` or `clear` takes to be seen here.
+    `clear` bumps a generation counter in the store, retiring every shared
+    entry written under an older one.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: int,
+        store: Optional[DaprStateStore] = None,
+        memory_ttl: float = 60.0,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory_ttl = memory_ttl
+        self.store = store
+        # key -> (value, time it was loaded into this process)
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._generation_read_at = float("-inf")
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.tokens_saved = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        generation = self._current_generation()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, loaded_at = entry
+                trusted = not self.store or time.monotonic() - loaded_at <= self.memory_ttl
+                if trusted and self._fresh(value, generation):
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    self.tokens_saved += value.get("tokens", 0)
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+        value = self.store.get(key) if self.store else None
+        with self._lock:
+            if value is not None and self._fresh(value, generation):
+                self.store_hits += 1
+                self.tokens_saved += value.get("tokens", 0)
+                self._insert(key, value)
+                return value
+            self.misses += 1
+            return None
+
+    def contains(self, key: str) -> bool:
+        """Whether either tier holds a fresh entry for `key` (not counted in stats)."""
+        generation = self._current_generation()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry[0], generation):
+                return True
+        value = self.store.get(key) if self.store else None
+        return value is not None and self._fresh(value, generation)
+
+    def put(self, key: str, value: dict):
+        value = {**value, "cached_at": time.time(), "generation": self._current_generation()}
+        with self._lock:
+            self._insert(key, value)
+        if self.store:
+            self.store.save(key, value, self.ttl)
+
+    def invalidate(self, key: str):
+        """Drop `key` from both tiers; other replicas stop serving it within `memory_ttl`."""
+        with self._lock:
+            self._entries.pop(key, None)
+            self.invalidations += 1
+        if self.store:
+            self.store.delete(key)
+
+    def clear(self):
+        """Drop every entry: this process's at once, shared and other replicas' within `memory_ttl`."""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+        if not self.store:
+            return
+        generation = self._read_generation() + 1
+        self.store.save(GENERATION_KEY, {"generation": generation}, self.ttl)
+        with self._lock:
+            self._generation = generation
+            self._generation_read_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.store_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "memory_ttl": self.memory_ttl,
+                "memory_hits": self.memory_hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "tokens_saved": self.tokens_saved,
+                "store_errors": self.store.errors if self.store else 0,
+            }
+
+    def _fresh(self, value: dict, generation: int) -> bool:
+        return (
+            value.get("generation", 0) >= generation
+            and time.time() - value.get("cached_at", 0) <= self.ttl
+        )
+
+    def _current_generation(self) -> int:
+        """The shared generation, re-read from the store at most every `memory_ttl` seconds."""
+        with self._lock:
+            if not self.store or time.monotonic() - self._generation_read_at < self.memory_ttl:
+                return self._generation
+        generation = self._read_generation()
+        with self._lock:
+            self._generation = generation
+            self._generation_read_at = time.monotonic()
+            return self._generation
+
+    def _read_generation(self) -> int:
+        value = self.store.get(GENERATION_KEY) if self.store else None
+        generation = value.get("generation", 0) if isinstance(value, dict) else 0
+        return generation if isinstance(generation, int) else 0
+
+    def _insert(self, key: str, value: dict):
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
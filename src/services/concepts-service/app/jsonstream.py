@@ -0,0 +1,104 @@
+"""Incremental parser for a JSON object that arrives in chunks (streamed model output)."""
+import json
+from typing import Any, List, Optional, Tuple
+
+# (top-level key, array index or None, decoded value)
+Event = Tuple[str, Optional[int], Any]
+
+_WHITESPACE = " \t\r\n"
+
+
+class _Frame:
+    __slots__ = ("kind", "start", "key", "index", "expect_key")
+
+    def __init__(self, kind: str, start: int):
+        self.kind = kind
+        self.start = start
+        self.key: Optional[str] = None
+        self.index = 0
+        self.expect_key = kind == "{"
+
+
+class JSONObjectStream:
+    """Feed chunks of one JSON object; get each top-level field as soon as it is complete.
+
+    `feed` returns events for values that the new text completed:
+    ``(key, None, value)`` for every top-level field and, for top-level
+    arrays, ``(key, i, item)`` for each item before the whole array is done.
+    Malformed input raises json.JSONDecodeError.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._string_start: Optional[int] = None
+        self._escaped = False
+        self._scalar_start: Optional[int] = None
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Event]:
+        self._text += chunk
+        events: List[Event] = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._string_start is not None:
+                if self._escaped:
+                    self._escaped = False
+                elif c == "\\":
+                    self._escaped = True
+                elif c == '"':
+                    start, self._string_start = self._string_start, None
+                    frame = self._stack[-1]
+                    if frame.kind == "{" and frame.expect_key:
+                        frame.key = json.loads(text[start:i + 1])
+                    else:
+                        self._value_end(start, i + 1, events)
+                continue
+
+            if self._scalar_start is not None and (c in _WHITESPACE or c in ",]}"):
+                start, self._scalar_start = self._scalar_start, None
+                self._value_end(start, i, events)
+
+            if c in _WHITESPACE:
+                continue
+            if self.done:
+                raise json.JSONDecodeError("Extra data", text, i)
+            if c == '"':
+                if not self._stack:
+                    raise json.JSONDecodeError("Expecting '{'", text, i)
+                self._string_start = i
+            elif c in "{[":
+                if not self._stack and c != "{":
+                    raise json.JSONDecodeError("Expecting '{'", text, i)
+                self._stack.append(_Frame(c, i))
+            elif c in "}]":
+                if not self._stack or {"{": "}", "[": "]"}[self._stack[-1].kind] != c:
+                    raise json.JSONDecodeError("Unbalanced bracket", text, i)
+                frame = self._stack.pop()
+                if self._stack:
+                    self._value_end(frame.start, i + 1, events)
+                else:
+                    self.done = True
+            elif c == ":":
+                self._stack[-1].expect_key = False
+            elif c == ",":
+                frame = self._stack[-1]
+                if frame.kind == "{":
+                    frame.expect_key = True
+                else:
+                    frame.index += 1
+            elif not self._stack:
+                raise json.JSONDecodeError("Expecting '{'", text, i)
+            elif self._scalar_start is None:
+                self._scalar_start = i
+        self._pos = len(text)
+        return events
+
+    def _value_end(self, start: int, end: int, events: List[Event]):
+        depth = len(self._stack)
+        if depth == 1:
+            events.append((self._stack[0].key, None, json.loads(self._text[start:end])))
+        elif depth == 2 and self._stack[1].kind == "[":
+            events.append((self._stack[0].key, self._stack[1].index, json.loads(self._text[start:end])))
@@ -1,11 +1,20 @@
 """Concepts Service - AI agent for explaining Python concepts."""
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
+import asyncio
+import hashlib
+import json
 import os
 import requests
 
-from openai import OpenAI
+from app.cache import DaprStateStore, ExplanationCache, explanation_key
+from app.jsonstream import JSONObjectStream
+from app.llm import ConcurrencyLimit, create_client
+from app.singleflight import SingleFlight
+from app.warmup import WarmupJob, fetch_topics
 
 app = FastAPI(
     title="concepts-service",
@@ -25,8 +34,13 @@ app.add_middleware(
 DAPR_HTTP_PORT = os.getenv("DAPR_HTTP_PORT", "3500")
 DAPR_BASE_URL = f"http://localhost:{DAPR_HTTP_PORT}"
 
-# OpenAI configuration
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# OpenAI configuration: one async client per process with pooled HTTP/2
+# connections; OPENAI_TIMEOUT bounds each request
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+client = create_client(
+    os.getenv("OPENAI_API_KEY"), OPENAI_MAX_CONCURRENCY, OPENAI_TIMEOUT, os.getenv("OPENAI_BASE_URL") or None
+)
 
 SYSTEM_PROMPT = """You are a Python teaching assistant for LearnFlow.
 Explain Python concepts clearly. You MUST respond with a JSON object containing exactly these fields:
@@ -37,6 +51,37 @@ Explain Python concepts clearly. You MUST respond with a JSON object containing
 Adjust your explanation level based on the student's context.
 Keep explanations concise but thorough. Always respond with valid JSON only."""
 
+USER_PROMPT = "Explain this Python concept for a {level} student: {concept}"
+FIELDS = ("explanation", "code_example", "common_mistakes")
+
+# Explanation cache: in-process LRU over the shared Dapr state store. Keys
+# include the prompt version, so editing the prompts retires old entries.
+PROMPT_VERSION = hashlib.sha256((SYSTEM_PROMPT + USER_PROMPT).encode()).hexdigest()[:12]
+LEVELS = ("beginner", "intermediate", "advanced")
+CACHE_ENABLED = os.getenv("CONCEPT_CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_ENTRIES = int(os.getenv("CONCEPT_CACHE_MAX_ENTRIES", "512"))
+CACHE_TTL = int(os.getenv("CONCEPT_CACHE_TTL", "604800"))
+# How long a replica trusts its in-process copy before re-reading the store
+CACHE_MEMORY_TTL = float(os.getenv("CONCEPT_CACHE_MEMORY_TTL", "60"))
+CACHE_STATE_STORE = os.getenv("CONCEPT_CACHE_STATE_STORE", "statestore")
+explanation_cache = ExplanationCache(
+    CACHE_MAX_ENTRIES,
+    CACHE_TTL,
+    DaprStateStore(DAPR_BASE_URL, CACHE_STATE_STORE) if CACHE_STATE_STORE else None,
+    memory_ttl=CACHE_MEMORY_TTL,
+)
+
+# Concurrent requests for the same explanation share one model call
+llm_limit = ConcurrencyLimit(OPENAI_MAX_CONCURRENCY)
+llm_flight = SingleFlight()
+
+# Cache warm-up over every curriculum topic x level (topics come from progress-service)
+WARMUP_ON_STARTUP = os.getenv("CONCEPT_WARMUP_ON_STARTUP", "false").lower() == "true"
+WARMUP_CONCURRENCY = int(os.getenv("CONCEPT_WARMUP_CONCURRENCY", "4"))
+WARMUP_RPM = int(os.getenv("CONCEPT_WARMUP_RPM", "60"))
+WARMUP_MAX_RETRIES = int(os.getenv("CONCEPT_WARMUP_MAX_RETRIES", "3"))
+PROGRESS_SERVICE_APP_ID = os.getenv("PROGRESS_SERVICE_APP_ID", "progress-service")
+
 
 class ConceptRequest(BaseModel):
     concept: str
@@ -49,6 +94,20 @@ class ConceptResponse(BaseModel):
     explanation: str
     code_example: str
     common_mistakes: str
+    cached: bool = False
+
+
+@app.on_event("startup")
+async def startup():
+    """Optionally start warming the explanation cache in the background."""
+    if WARMUP_ON_STARTUP and CACHE_ENABLED:
+        warmup.start(warmup_pairs)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Close the pooled OpenAI connections."""
+    await client.close()
 
 
 @app.get("/health")
@@ -57,6 +116,18 @@ async def health():
     return {"status": "healthy", "service": "concepts-service"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Explanation cache statistics."""
+    return {
+        "prompt_version": PROMPT_VERSION,
+        "cache": explanation_cache.stats() if CACHE_ENABLED else None,
+        "warmup": warmup.status(),
+        "llm": llm_limit.stats(),
+        "singleflight": llm_flight.stats(),
+    }
+
+
 @app.get("/dapr/subscribe")
 async def subscribe():
     """Dapr pub/sub subscriptions."""
@@ -69,56 +140,37 @@ async def subscribe():
 @app.post("/api/concepts/explain", response_model=ConceptResponse, include_in_schema=False)
 async def explain_concept(request: ConceptRequest):
     """Explain a Python concept using AI."""
-    try:
-        import json as json_lib
-
-        response = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": f"Explain this Python concept for a {request.level} student: {request.concept}"}
-            ],
-            response_format={"type": "json_object"}
-        )
-
-        content = response.choices[0].message.content
-        parsed = json_lib.loads(content)
+    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    key = explanation_key(request.concept, request.level, model, PROMPT_VERSION)
+    if CACHE_ENABLED:
+        cached = await asyncio.to_thread(explanation_cache.get, key)
+        if cached:
+            await asyncio.to_thread(publish_explained, request)
+            return ConceptResponse(
+                concept=request.concept,
+                explanation=cached["explanation"],
+                code_example=cached["code_example"],
+                common_mistakes=cached["common_mistakes"],
+                cached=True,
+            )
 
-        def to_str(val, default=""):
-            if val is None:
-                return default
-            if isinstance(val, list):
-                return "\n".join(f"- {item}" for item in val)
-            return str(val)
+    try:
+        fields = await llm_flight.do(key, generate_explanation, request.concept, request.level, model)
+        if CACHE_ENABLED:
+            await asyncio.to_thread(explanation_cache.put, key, fields)
 
-        explanation = to_str(parsed.get("explanation"), content)
-        code_example = to_str(parsed.get("code_example"))
-        common_mistakes = to_str(parsed.get("common_mistakes"))
-
-        # Publish learning event via Dapr
-        try:
-            requests.post(
-                f"{DAPR_BASE_URL}/v1.0/publish/pubsub/learning.events",
-                json={
-                    "type": "concept_explained",
-                    "user_id": request.user_id,
-                    "concept": request.concept,
-                    "level": request.level,
-                }
-            )
-        except Exception:
-            pass
+        await asyncio.to_thread(publish_explained, request)
 
         return ConceptResponse(
             concept=request.concept,
-            explanation=explanation,
-            code_example=code_example,
-            common_mistakes=common_mistakes,
+            explanation=fields["explanation"],
+            code_example=fields["code_example"],
+            common_mistakes=fields["common_mistakes"],
         )
-    except json_lib.JSONDecodeError:
+    except json.JSONDecodeError as e:
         return ConceptResponse(
             concept=request.concept,
-            explanation=content,
+            explanation=e.doc,
             code_example="",
             common_mistakes="",
         )
@@ -126,6 +178,182 @@ async def explain_concept(request: ConceptRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def generate_explanation(concept: str, level: str, model: str) -> dict:
+    """Ask the model for an explanation; raises json.JSONDecodeError on non-JSON output."""
+    response = await llm_limit.run(
+        client.chat.completions.create,
+        model=model,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": USER_PROMPT.format(level=level, concept=concept)}
+        ],
+        response_format={"type": "json_object"}
+    )
+
+    content = response.choices[0].message.content
+    parsed = json.loads(content)
+
+    return {
+        "explanation": _to_str(parsed.get("explanation"), content),
+        "code_example": _to_str(parsed.get("code_example")),
+        "common_mistakes": _to_str(parsed.get("common_mistakes")),
+        "tokens": _usage_tokens(response),
+    }
+
+
+def _to_str(val, default=""):
+    if val is None:
+        return default
+    if isinstance(val, list):
+        return "\n".join(f"- {item}" for item in val)
+    return str(val)
+
+
+def _usage_tokens(response) -> int:
+    tokens = getattr(getattr(response, "usage", None), "total_tokens", 0)
+    return tokens if isinstance(tokens, int) else 0
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/explain/stream")
+@app.post("/api/concepts/explain/stream", include_in_schema=False)
+async def explain_concept_stream(request: ConceptRequest):
+    """Explain a Python concept as Server-Sent Events.
+
+    Emits `explanation`, `code_example` and `common_mistakes` events
+    (JSON-encoded text) each as soon as the model has finished writing that
+    field, then `done`. Cached explanations are sent at once; streamed ones
+    are cached when complete.
+    """
+    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    key = explanation_key(request.concept, request.level, model, PROMPT_VERSION)
+    if CACHE_ENABLED:
+        cached = await asyncio.to_thread(explanation_cache.get, key)
+        if cached:
+            await asyncio.to_thread(publish_explained, request)
+            events = [_sse(name, cached[name]) for name in FIELDS]
+            events.append(_sse("done", {"cached": True}))
+            return StreamingResponse(iter(events), media_type="text/event-stream")
+
+    async def events():
+        parser = JSONObjectStream()
+        content = []
+        fields = {}
+        tokens = 0
+        try:
+            async with llm_limit:
+                stream = await client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": USER_PROMPT.format(level=request.level, concept=request.concept)}
+                    ],
+                    response_format={"type": "json_object"},
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                async for chunk in stream:
+                    tokens = _usage_tokens(chunk) or tokens
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content or ""
+                    content.append(delta)
+                    if parser is None:
+                        continue
+                    try:
+                        completed = parser.feed(delta)
+                    except json.JSONDecodeError:
+                        # Not JSON after all: fall back to the raw text, as /explain does
+                        parser = None
+                        continue
+                    for name, index, value in completed:
+                        if index is None and name in FIELDS and name not in fields:
+                            fields[name] = _to_str(value)
+                            yield _sse(name, fields[name])
+        except Exception as e:
+            yield _sse("error", str(e))
+            return
+
+        complete = parser is not None and parser.done
+        for name in FIELDS:
+            if name not in fields:
+                fields[name] = "" if complete or name != "explanation" else "".join(content)
+                yield _sse(name, fields[name])
+        if complete and CACHE_ENABLED:
+            await asyncio.to_thread(explanation_cache.put, key, {**fields, "tokens": tokens})
+        await asyncio.to_thread(publish_explained, request)
+        yield _sse("done", {"cached": False})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.delete("/api/concepts/cache")
+async def invalidate_cache(concept: Optional[str] = None, level: Optional[str] = None):
+    """Invalidate cached explanations for a concept (all levels unless given), or everything."""
+    if concept is None:
+        await asyncio.to_thread(explanation_cache.clear)
+        return {"status": "cleared"}
+
+    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    levels = [level] if level else LEVELS
+    for lvl in levels:
+        await asyncio.to_thread(
+            explanation_cache.invalidate, explanation_key(concept, lvl, model, PROMPT_VERSION)
+        )
+    return {"status": "invalidated", "concept": concept, "levels": list(levels)}
+
+
+def warmup_pairs():
+    """Every (topic, level) pair of the curriculum."""
+    topics = fetch_topics(DAPR_BASE_URL, PROGRESS_SERVICE_APP_ID)
+    return [(topic, level) for topic in topics for level in LEVELS]
+
+
+warmup = WarmupJob(
+    lambda topic, level: generate_explanation(topic, level, os.getenv("OPENAI_MODEL", "gpt-4o-mini")),
+    lambda topic, level: explanation_key(topic, level, os.getenv("OPENAI_MODEL", "gpt-4o-mini"), PROMPT_VERSION),
+    explanation_cache,
+    concurrency=WARMUP_CONCURRENCY,
+    requests_per_minute=WARMUP_RPM,
+    max_retries=WARMUP_MAX_RETRIES,
+)
+
+
+@app.post("/api/concepts/warmup")
+async def start_warmup():
+    """Start pre-generating explanations for the whole curriculum (resumes past cached pairs)."""
+    if not CACHE_ENABLED:
+        raise HTTPException(status_code=409, detail="Explanation cache is disabled")
+    started = warmup.start(warmup_pairs)
+    return {"started": started, **warmup.status()}
+
+
+@app.get("/api/concepts/warmup")
+async def warmup_status():
+    """Progress of the current or last warm-up run."""
+    return warmup.status()
+
+
+def publish_explained(request: ConceptRequest):
+    """Publish a concept_explained learning event via Dapr."""
+    try:
+        requests.post(
+            f"{DAPR_BASE_URL}/v1.0/publish/pubsub/learning.events",
+            json={
+                "type": "concept_explained",
+                "user_id": request.user_id,
+                "concept": request.concept,
+                "level": request.level,
+            },
+            timeout=2,
+        )
+    except Exception:
+        pass
+
+
 @app.post("/events/learning")
 async def handle_learning_event(event: dict):
     """Handle learning events from other services."""
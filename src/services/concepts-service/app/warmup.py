@@ -0,0 +1,204 @@
+"""Warm-up job that pre-generates explanations for every curriculum topic and level."""
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+import requests
+from openai import RateLimitError
+
+from app.cache import ExplanationCache
+
+Pair = Tuple[str, str]
+
+
+def fetch_topics(dapr_base_url: str, app_id: str = "progress-service", timeout: float = 5.0) -> List[str]:
+    """Topics of every curriculum module, in course order, via Dapr service invocation."""
+    response = requests.get(
+        f"{dapr_base_url}/v1.0/invoke/{app_id}/method/api/curriculum", timeout=timeout
+    )
+    response.raise_for_status()
+    topics: List[str] = []
+    for module in sorted(response.json(), key=lambda m: m.get("order", 0)):
+        for topic in module.get("topics", []):
+            if topic not in topics:
+                topics.append(topic)
+    return topics
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class WarmupJob:
+    """Generates and caches one explanation per (topic, level), `concurrency` at a time.
+
+    Pairs that are already cached are skipped, so a restarted job resumes
+    where the last one stopped. A rate-limit error pauses every worker for
+    the server's Retry-After (or an exponential backoff) and the pair is
+    retried; `requests_per_minute` additionally spaces out model calls.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str, str], Awaitable[dict]],
+        key: Callable[[str, str], str],
+        cache: ExplanationCache,
+        concurrency: int = 4,
+        requests_per_minute: int = 0,
+        max_retries: int = 3,
+        backoff: float = 2.0,
+    ):
+        self.generate = generate
+        self.key = key
+        self.cache = cache
+        self.concurrency = concurrency
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._task: Optional[asyncio.Task] = None
+        self._reset("idle")
+
+    def start(self, load_pairs: Callable[[], Sequence[Pair]]) -> bool:
+        """Run the job as a task on the running event loop; False if one is already running."""
+        if self.running:
+            return False
+        self._reset("loading")
+        self._task = asyncio.get_running_loop().create_task(self._main(load_pairs))
+        return True
+
+    @property
+    def running(self) -> bool:
+        return bool(self._task and not self._task.done())
+
+    async def run(self, pairs: Sequence[Pair], on_progress: Optional[Callable[[dict], None]] = None):
+        """Warm every pair; returns the final status."""
+        self._reset("running")
+        self.total = len(pairs)
+        self.started_at = time.time()
+        self._resume_at = 0.0
+        self._next_slot = 0.0
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def warm(topic: str, level: str):
+            async with semaphore:
+                await self._warm(topic, level)
+            if on_progress:
+                on_progress(self.status())
+
+        await asyncio.gather(*(warm(topic, level) for topic, level in pairs))
+        self.finished_at = time.time()
+        self.state = "finished"
+        return self.status()
+
+    def status(self) -> dict:
+        done = self.skipped + self.generated + self.failed
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        eta = None
+        if self.state == "running" and done:
+            eta = round(elapsed / done * (self.total - done), 1)
+        return {
+            "state": self.state,
+            "total": self.total,
+            "done": done,
+            "skipped": self.skipped,
+            "generated": self.generated,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "elapsed_s": round(elapsed, 1),
+            "eta_s": eta,
+            "errors": self.errors[-5:],
+        }
+
+    async def _main(self, load_pairs: Callable[[], Sequence[Pair]]):
+        try:
+            pairs = await asyncio.to_thread(load_pairs)
+        except Exception as e:
+            self.state = "failed"
+            self.errors.append(f"loading curriculum: {e}")
+            return
+        await self.run(pairs)
+
+    async def _warm(self, topic: str, level: str):
+        key = self.key(topic, level)
+        if await asyncio.to_thread(self.cache.contains, key):
+            self.skipped += 1
+            return
+
+        self.in_flight += 1
+        try:
+            for attempt in range(self.max_retries + 1):
+                await self._wait_turn()
+                try:
+                    fields = await self.generate(topic, level)
+                except RateLimitError as e:
+                    self.rate_limited += 1
+                    delay = _retry_after(e) or self.backoff * 2 ** attempt
+                    # Every worker waits out the limit, not just this one
+                    self._resume_at = max(self._resume_at, time.monotonic() + delay)
+                    error = e
+                except Exception as e:
+                    if attempt < self.max_retries:
+                        await asyncio.sleep(self.backoff * 2 ** attempt)
+                    error = e
+                else:
+                    await asyncio.to_thread(self.cache.put, key, fields)
+                    self.generated += 1
+                    return
+                if attempt < self.max_retries:
+                    self.retries += 1
+            self.failed += 1
+            self.errors.append(f"{topic} ({level}): {error}")
+        finally:
+            self.in_flight -= 1
+
+    async def _wait_turn(self):
+        """Wait out any shared rate-limit pause, then for the next free request slot."""
+        pause = self._resume_at - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        if self.interval:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+            await asyncio.sleep(slot - now)
+
+    def _reset(self, state: str):
+        self.state = state
+        self.total = 0
+        self.skipped = 0
+        self.generated = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.started_at = 0.0
+        self.finished_at = 0.0
+        self.errors: List[str] = []
+
+
+def main():
+    """Offline run: `python -m app.warmup` next to a Dapr sidecar."""
+    from app.main import warmup, warmup_pairs
+
+    def report(status: dict):
+        print(
+            f"{status['done']}/{status['total']} done "
+            f"(generated={status['generated']} skipped={status['skipped']} failed={status['failed']} "
+            f"rate_limited={status['rate_limited']}) eta={status['eta_s']}s",
+            flush=True,
+        )
+
+    final = asyncio.run(warmup.run(warmup_pairs(), on_progress=report))
+    for error in final["errors"]:
+        print(f"failed: {error}")
+    raise SystemExit(1 if final["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Load test: concurrent /explain throughput against a local stub LLM server.
+
+Starts an OpenAI-compatible stub that answers every chat completion after
+a fixed delay, then fires concurrent /explain requests (distinct concepts,
+cache off, so nothing is collapsed or cached) at the app in-process. The
+baseline replays the same load through the synchronous OpenAI client called
+from async handlers, the way the service used to work.
+
+Run from the service directory:
+
+    python benchmarks/bench_llm_concurrency.py --requests 64 --concurrency 16 --delay 0.25
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+COMPLETION = {
+    "id": "stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{
+        "index": 0,
+        "finish_reason": "stop",
+        "message": {
+            "role": "assistant",
+            "content": json.dumps({
+                "explanation": "A stub explanation.",
+                "code_example": "print('hi')",
+                "common_mistakes": "None.",
+            }),
+        },
+    }],
+    "usage": {"prompt_tokens": 50, "completion_tokens": 50, "total_tokens": 100},
+}
+
+
+def serve_stub(delay: float, ready):
+    """Stub LLM server; runs in its own process so it doesn't share our GIL."""
+    body = json.dumps(COMPLETION).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # Headers and body go out in separate writes; don't let Nagle hold the body
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    ready.send(server.server_port)
+    server.serve_forever()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def drive(label, call, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        # Latency includes time queued behind other requests
+        start = time.perf_counter()
+        async with semaphore:
+            await call(i)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"  {label:<12} {total / elapsed:7.1f} req/s  "
+        f"p50={percentile(latencies, 50) * 1000:7.1f} ms  "
+        f"p99={percentile(latencies, 99) * 1000:7.1f} ms  "
+        f"mean={statistics.mean(latencies) * 1000:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--delay", type=float, default=0.25, help="stub LLM latency in seconds")
+    args = parser.parse_args()
+
+    ready, port = multiprocessing.Pipe()
+    stub = multiprocessing.Process(target=serve_stub, args=(args.delay, port), daemon=True)
+    stub.start()
+    base_url = f"http://127.0.0.1:{ready.recv()}/v1"
+    os.environ.update({
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_MAX_CONCURRENCY": str(args.concurrency),
+        "CONCEPT_CACHE_ENABLED": "false",
+        "CONCEPT_CACHE_STATE_STORE": "",
+    })
+
+    import httpx
+    from openai import OpenAI
+
+    from app import main as service
+
+    # No Dapr sidecar here; learning events are not part of what is measured
+    service.publish_explained = lambda request: None
+
+    sync_client = OpenAI(api_key="stub", base_url=base_url)
+
+    async def blocking_call(i):
+        # What the handler used to do: a synchronous client inside `async def`
+        sync_client.chat.completions.create(
+            model="stub",
+            messages=[{"role": "user", "content": f"concept {i}"}],
+            response_format={"type": "json_object"},
+        )
+
+    async def run():
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://concepts") as http:
+            async def explain(i):
+                response = await http.post("/explain", json={"concept": f"concept {i}"})
+                assert response.status_code == 200, response.text
+
+            print(f"{args.requests} requests, concurrency={args.concurrency}, stub delay={args.delay * 1000:.0f} ms")
+            await drive("sync client", blocking_call, args.requests, args.concurrency)
+            await drive("async client", explain, args.requests, args.concurrency)
+            print(f"  llm limiter: {service.llm_limit.stats()}")
+        await service.client.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,17 @@
 """Tests for the Concepts Service."""
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock, MagicMock
 from fastapi.testclient import TestClient
 
-from app.main import app
+from app.main import app, explanation_cache
 
 client = TestClient(app)
 
 
+def setup_function():
+    explanation_cache.store = None
+    explanation_cache.clear()
+
+
 def test_health():
     response = client.get("/health")
     assert response.status_code == 200
@@ -32,7 +37,7 @@ def test_explain_concept(mock_openai, mock_post):
     mock_response.choices[0].message.content = (
         "A for loop iterates over a sequence. Example: for i in range(10): print(i)"
     )
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
     mock_post.return_value = MagicMock(status_code=200)
 
     response = client.post("/explain", json={
@@ -53,7 +58,7 @@ def test_explain_publishes_dapr_event(mock_openai, mock_post):
     mock_response = MagicMock()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = '{"explanation": "Variables store data", "code_example": "x = 5", "common_mistakes": "Forgetting to assign"}'
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
     mock_post.return_value = MagicMock(status_code=200)
 
     client.post("/explain", json={"concept": "variables"})
@@ -68,7 +73,7 @@ def test_explain_publishes_dapr_event(mock_openai, mock_post):
 
 @patch("app.main.client")
 def test_explain_error_handling(mock_openai):
-    mock_openai.chat.completions.create.side_effect = Exception("API error")
+    mock_openai.chat.completions.create = AsyncMock(side_effect=Exception("API error"))
 
     response = client.post("/explain", json={"concept": "test"})
     assert response.status_code == 500
@@ -88,7 +93,7 @@ def test_explain_with_level(mock_openai, mock_post):
     mock_response = MagicMock()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = "Advanced explanation of decorators"
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
     mock_post.return_value = MagicMock(status_code=200)
 
     response = client.post("/explain", json={
@@ -101,3 +106,451 @@ def test_explain_with_level(mock_openai, mock_post):
     call_args = mock_openai.chat.completions.create.call_args
     user_msg = call_args[1]["messages"][1]["content"]
     assert "advanced" in user_msg
+
+
+def _json_completion(mock_openai, content, total_tokens=120):
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = content
+    mock_response.usage.total_tokens = total_tokens
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
+
+
+def test_explanation_key_normalizes_concept_and_level():
+    from app.cache import explanation_key
+
+    key = explanation_key("For Loops", "Beginner", "gpt-4o-mini", "v1")
+    assert key == explanation_key("  for_loops. ", "beginner ", "gpt-4o-mini", "v1")
+    assert key == explanation_key("for-loops", "BEGINNER", "gpt-4o-mini", "v1")
+    assert key != explanation_key("for loops", "advanced", "gpt-4o-mini", "v1")
+    assert key != explanation_key("for loops", "beginner", "gpt-4o", "v1")
+    assert key != explanation_key("for loops", "beginner", "gpt-4o-mini", "v2")
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_explain_serves_repeats_from_cache(mock_openai, mock_post):
+    _json_completion(mock_openai, '{"explanation": "Lists hold items", "code_example": "x = [1]", "common_mistakes": "Off by one"}')
+    mock_post.return_value = MagicMock(status_code=200)
+    before = client.get("/metrics").json()["cache"]
+
+    first = client.post("/explain", json={"concept": "Lists", "user_id": "u1"}).json()
+    second = client.post("/explain", json={"concept": " lists ", "user_id": "u2"}).json()
+
+    assert mock_openai.chat.completions.create.call_count == 1
+    assert first["cached"] is False and second["cached"] is True
+    assert second["concept"] == " lists "
+    assert second["explanation"] == "Lists hold items"
+    # Cache hits are still learning activity
+    assert mock_post.call_count == 2
+    stats = client.get("/metrics").json()["cache"]
+    assert stats["memory_hits"] == before["memory_hits"] + 1
+    assert stats["misses"] == before["misses"] + 1
+    assert stats["tokens_saved"] == before["tokens_saved"] + 120
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_explain_reads_through_the_shared_store(mock_openai, mock_post):
+    import time
+
+    before = explanation_cache.stats()["store_hits"]
+    explanation_cache.store = MagicMock(errors=0)
+    explanation_cache.store.get.return_value = {
+        "explanation": "Shared", "code_example": "", "common_mistakes": "", "cached_at": time.time(),
+    }
+    mock_post.return_value = MagicMock(status_code=200)
+
+    data = client.post("/explain", json={"concept": "tuples"}).json()
+
+    mock_openai.chat.completions.create.assert_not_called()
+    assert data["explanation"] == "Shared" and data["cached"] is True
+    assert client.get("/metrics").json()["cache"]["store_hits"] == before + 1
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_explain_ignores_expired_entries(mock_openai, mock_post):
+    import time
+
+    explanation_cache.store = MagicMock(errors=0)
+    explanation_cache.store.get.return_value = {
+        "explanation": "Stale", "code_example": "", "common_mistakes": "",
+        "cached_at": time.time() - explanation_cache.ttl - 1,
+    }
+    _json_completion(mock_openai, '{"explanation": "Fresh", "code_example": "", "common_mistakes": ""}')
+    mock_post.return_value = MagicMock(status_code=200)
+
+    data = client.post("/explain", json={"concept": "sets"}).json()
+
+    assert data["explanation"] == "Fresh"
+    key, value, ttl = explanation_cache.store.save.call_args[0]
+    assert value["explanation"] == "Fresh" and ttl == explanation_cache.ttl
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_invalidate_concept_regenerates(mock_openai, mock_post):
+    _json_completion(mock_openai, '{"explanation": "Dicts map keys", "code_example": "", "common_mistakes": ""}')
+    mock_post.return_value = MagicMock(status_code=200)
+    explanation_cache.store = MagicMock(errors=0)
+    explanation_cache.store.get.return_value = None
+
+    client.post("/explain", json={"concept": "dictionaries"})
+    response = client.delete("/api/concepts/cache", params={"concept": "Dictionaries"})
+    client.post("/explain", json={"concept": "dictionaries"})
+
+    assert response.json()["levels"] == ["beginner", "intermediate", "advanced"]
+    assert explanation_cache.store.delete.call_count == 3
+    assert mock_openai.chat.completions.create.call_count == 2
+
+
+class _SharedStore:
+    """In-memory stand-in for the Dapr state store shared by replicas."""
+
+    def __init__(self):
+        self.values = {}
+        self.errors = 0
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def save(self, key, value, ttl):
+        self.values[key] = value
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+def test_replicas_see_each_others_invalidations():
+    import time
+
+    from app.cache import ExplanationCache
+
+    store = _SharedStore()
+    pod_a = ExplanationCache(max_entries=10, ttl=600, store=store, memory_ttl=0.05)
+    pod_b = ExplanationCache(max_entries=10, ttl=600, store=store, memory_ttl=0.05)
+    pod_a.put("lists", {"explanation": "old"})
+    pod_a.put("sets", {"explanation": "old"})
+    assert pod_b.get("lists")["explanation"] == "old"
+    assert pod_b.get("sets")["explanation"] == "old"
+
+    pod_a.invalidate("lists")
+    pod_a.clear()
+    time.sleep(0.1)
+
+    assert pod_b.get("lists") is None
+    assert pod_b.get("sets") is None
+    pod_b.put("sets", {"explanation": "new"})
+    assert pod_a.get("sets")["explanation"] == "new"
+
+
+# Warm-up job tests
+def _warmup_job(generate, **kwargs):
+    from app.cache import ExplanationCache
+    from app.warmup import WarmupJob
+
+    cache = ExplanationCache(max_entries=100, ttl=60)
+    job = WarmupJob(generate, lambda topic, level: f"{topic}|{level}", cache, backoff=0.01, **kwargs)
+    return job, cache
+
+
+def test_warmup_bounds_concurrency_and_resumes():
+    import asyncio
+
+    active, peak = [0], [0]
+
+    async def generate(topic, level):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.02)
+        active[0] -= 1
+        return {"explanation": f"{topic} for {level}", "code_example": "", "common_mistakes": ""}
+
+    job, cache = _warmup_job(generate, concurrency=2)
+    pairs = [(topic, "beginner") for topic in ("Lists", "Tuples", "Sets", "Dictionaries", "Loops")]
+    cache.put("Lists|beginner", {"explanation": "cached"})
+
+    status = asyncio.run(job.run(pairs))
+
+    assert peak[0] == 2
+    assert status["state"] == "finished"
+    assert status["total"] == 5 and status["skipped"] == 1 and status["generated"] == 4
+    assert cache.get("Sets|beginner")["explanation"] == "Sets for beginner"
+
+    # A second run finds everything cached
+    assert asyncio.run(job.run(pairs))["skipped"] == 5
+
+
+def test_warmup_waits_out_rate_limits():
+    import asyncio
+
+    import httpx
+    from openai import RateLimitError
+
+    calls = []
+
+    async def generate(topic, level):
+        calls.append(topic)
+        if len(calls) == 1:
+            response = httpx.Response(
+                429, headers={"retry-after": "0.05"}, request=httpx.Request("POST", "http://llm")
+            )
+            raise RateLimitError("slow down", response=response, body=None)
+        return {"explanation": topic, "code_example": "", "common_mistakes": ""}
+
+    job, _ = _warmup_job(generate, concurrency=1)
+    progress = []
+    status = asyncio.run(job.run([("Lists", "beginner"), ("Sets", "beginner")], on_progress=progress.append))
+
+    assert status["rate_limited"] == 1 and status["retries"] == 1
+    assert status["generated"] == 2 and status["failed"] == 0
+    assert [p["done"] for p in progress] == [1, 2]
+
+
+def test_warmup_reports_pairs_that_keep_failing():
+    import asyncio
+
+    async def generate(topic, level):
+        raise ValueError("model unavailable")
+
+    job, _ = _warmup_job(generate, max_retries=1)
+    status = asyncio.run(job.run([("Sets", "advanced")]))
+
+    assert status["failed"] == 1 and status["retries"] == 1
+    assert status["errors"] == ["Sets (advanced): model unavailable"]
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+@patch("app.warmup.requests.get")
+def test_warmup_endpoint_walks_the_curriculum(mock_get, mock_openai, mock_post):
+    import time
+
+    from app.main import warmup
+
+    mock_get.return_value = MagicMock(status_code=200)
+    mock_get.return_value.json.return_value = [
+        {"id": "mod-2", "order": 2, "topics": ["For Loops"]},
+        {"id": "mod-1", "order": 1, "topics": ["Variables", "For Loops"]},
+    ]
+    _json_completion(mock_openai, '{"explanation": "Warm", "code_example": "", "common_mistakes": ""}')
+    mock_openai.close = AsyncMock()
+    mock_post.return_value = MagicMock(status_code=200)
+
+    # The job runs on the app's event loop, which lives as long as the client context
+    with patch.object(warmup, "interval", 0), TestClient(app) as running:
+        assert running.post("/api/concepts/warmup").json()["started"] is True
+        for _ in range(100):
+            status = running.get("/api/concepts/warmup").json()
+            if status["state"] == "finished":
+                break
+            time.sleep(0.05)
+
+    assert "/v1.0/invoke/progress-service/method/api/curriculum" in mock_get.call_args[0][0]
+    assert status["state"] == "finished"
+    assert status["total"] == 6 and status["generated"] == 6
+    assert client.post("/explain", json={"concept": "for loops", "level": "advanced"}).json()["cached"] is True
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_concurrent_identical_explanations_share_one_llm_call(mock_openai, mock_post):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = '{"explanation": "Decorators wrap functions", "code_example": "", "common_mistakes": ""}'
+
+    async def slow_create(**params):
+        await asyncio.sleep(0.2)
+        return mock_response
+
+    mock_openai.chat.completions.create = AsyncMock(side_effect=slow_create)
+    mock_post.return_value = MagicMock(status_code=200)
+    before = client.get("/metrics").json()["singleflight"]["collapsed"]
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        responses = list(executor.map(
+            lambda _: client.post('/explain', json={'concept': 'decorators'}), range(5)
+        ))
+
+    assert all(r.status_code == 200 for r in responses)
+    assert mock_openai.chat.completions.create.call_count == 1
+    stats = client.get("/metrics").json()["singleflight"]
+    assert stats["collapsed"] == before + 4
+    assert stats["in_flight"] == 0
+
+
+def test_singleflight_fans_out_results_and_errors():
+    import asyncio
+
+    from app.singleflight import SingleFlight, request_key
+
+    flight = SingleFlight()
+    calls = []
+
+    async def slow(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        if value == "boom":
+            raise ValueError("upstream failed")
+        return value.upper()
+
+    async def call(value):
+        try:
+            return await flight.do(request_key({"v": value}), slow, value)
+        except ValueError as e:
+            return str(e)
+
+    async def burst():
+        return await asyncio.gather(*(call(v) for v in ["a", "a", "a", "boom", "boom", "b"]))
+
+    results = asyncio.run(burst())
+
+    assert results == ["A", "A", "A", "upstream failed", "upstream failed", "B"]
+    assert sorted(calls) == ["a", "b", "boom"]
+    assert flight.stats()["collapsed"] == 3
+    # Finished calls are forgotten; the next request goes upstream again
+    assert asyncio.run(call("a")) == "A" and len(calls) == 4
+    assert request_key({"x": 1, "y": 2}) == request_key({"y": 2, "x": 1})
+
+
+def test_llm_client_pools_http2_connections_and_limits_concurrency():
+    import asyncio
+
+    from app.llm import ConcurrencyLimit, create_client
+
+    llm = create_client("test", max_concurrency=8, timeout=12.0)
+    assert llm.timeout == 12.0
+    assert llm._client._transport._pool._http2 is True
+    assert llm._client._transport._pool._max_connections == 8
+
+    limit = ConcurrencyLimit(2)
+
+    async def call(i):
+        await asyncio.sleep(0.01)
+        return i
+
+    async def burst():
+        return await asyncio.gather(*(limit.run(call, i) for i in range(6)))
+
+    assert asyncio.run(burst()) == list(range(6))
+    assert limit.stats() == {"limit": 2, "active": 0, "waiting": 0, "peak": 2, "completed": 6}
+
+
+def test_json_stream_emits_fields_as_they_complete():
+    import json
+
+    from app.jsonstream import JSONObjectStream
+
+    document = {
+        "explanation": 'Loops repeat: "for" and {while}',
+        "code_example": "for i in range(3):\n    print(i)",
+        "common_mistakes": ["Off-by-one", {"nested": [1, 2]}, None],
+        "level": 2.5,
+    }
+    text = json.dumps(document, indent=2)
+    parser = JSONObjectStream()
+    seen = []
+    for position, char in enumerate(text):
+        for event in parser.feed(char):
+            seen.append((position, event))
+
+    assert [event for _, event in seen] == [
+        ("explanation", None, document["explanation"]),
+        ("code_example", None, document["code_example"]),
+        ("common_mistakes", 0, "Off-by-one"),
+        ("common_mistakes", 1, {"nested": [1, 2]}),
+        ("common_mistakes", 2, None),
+        ("common_mistakes", None, document["common_mistakes"]),
+        ("level", None, 2.5),
+    ]
+    # Each field is reported on the character that closes it, long before the object ends
+    assert seen[0][0] == text.index('",\n  "code_example"')
+    assert parser.done
+
+    for broken in ('["not", "an object"]', '{"a": 1}}', '{"a": 1} {'):
+        try:
+            JSONObjectStream().feed(broken)
+        except json.JSONDecodeError:
+            pass
+        else:
+            raise AssertionError(broken)
+
+
+def _streamed_completion(mock_openai, content, size=7):
+    """Have the mocked client stream `content` in chunks of `size` characters."""
+    def chunk(text):
+        part = MagicMock()
+        part.choices = [MagicMock()]
+        part.choices[0].delta.content = text
+        part.usage = None
+        return part
+
+    async def stream():
+        for start in range(0, len(content), size):
+            yield chunk(content[start:start + size])
+        usage = MagicMock()
+        usage.choices = []
+        usage.usage.total_tokens = 90
+        yield usage
+
+    mock_openai.chat.completions.create = AsyncMock(side_effect=lambda **kwargs: stream())
+
+
+def _sse_events(body):
+    import json
+
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_explain_stream_sends_fields_then_caches(mock_openai, mock_post):
+    _streamed_completion(mock_openai, (
+        '{"explanation": "A dict maps keys to values.", '
+        '"code_example": "d = {\\"a\\": 1}", '
+        '"common_mistakes": ["Mutable keys", "KeyError"]}'
+    ))
+
+    response = client.post("/explain/stream", json={"concept": "dict", "level": "beginner"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert _sse_events(response.text) == [
+        ("explanation", "A dict maps keys to values."),
+        ("code_example", 'd = {"a": 1}'),
+        ("common_mistakes", "- Mutable keys\n- KeyError"),
+        ("done", {"cached": False}),
+    ]
+    assert mock_openai.chat.completions.create.call_args.kwargs["stream"] is True
+    assert mock_post.call_count == 1
+
+    # The completed stream was cached: both endpoints now answer without the model
+    again = client.post("/api/concepts/explain/stream", json={"concept": "Dict", "level": "beginner"})
+    assert _sse_events(again.text)[-1] == ("done", {"cached": True})
+    plain = client.post("/explain", json={"concept": "dict", "level": "beginner"}).json()
+    assert plain["cached"] is True and plain["code_example"] == 'd = {"a": 1}'
+    assert mock_openai.chat.completions.create.call_count == 1
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_explain_stream_falls_back_to_raw_text(mock_openai, mock_post):
+    _streamed_completion(mock_openai, "Lists are ordered, mutable sequences.")
+
+    response = client.post("/explain/stream", json={"concept": "list"})
+
+    assert _sse_events(response.text) == [
+        ("explanation", "Lists are ordered, mutable sequences."),
+        ("code_example", ""),
+        ("common_mistakes", ""),
+        ("done", {"cached": False}),
+    ]
+    assert explanation_cache.stats()["entries"] == 0
@@ -1,14 +1,20 @@
 """Debug Service - AI agent for analyzing code errors and providing hints."""
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
+import asyncio
 import os
 import json
 import requests
+import threading
 import time
 
-from openai import OpenAI
+from app.jsonstream import JSONObjectStream
+from app.llm import ConcurrencyLimit, create_client
+from app.singleflight import SingleFlight, request_key
+from app.tracebacks import Diagnosis, diagnose, parse_traceback
 
 app = FastAPI(
     title="debug-service",
@@ -28,11 +34,22 @@ app.add_middleware(
 DAPR_HTTP_PORT = os.getenv("DAPR_HTTP_PORT", "3500")
 DAPR_BASE_URL = f"http://localhost:{DAPR_HTTP_PORT}"
 
-# OpenAI configuration
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# OpenAI configuration: one async client per process with pooled HTTP/2
+# connections; OPENAI_TIMEOUT bounds each request
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+client = create_client(
+    os.getenv("OPENAI_API_KEY"), OPENAI_MAX_CONCURRENCY, OPENAI_TIMEOUT, os.getenv("OPENAI_BASE_URL") or None
+)
+llm_limit = ConcurrencyLimit(OPENAI_MAX_CONCURRENCY)
+llm_flight = SingleFlight()
 
-# Track error counts per user for struggle detection
+# Track error counts per user for struggle detection (updated from worker threads)
 error_tracker: Dict[str, Dict[str, int]] = {}
+error_tracker_lock = threading.Lock()
+
+# How analyses were answered: rules alone, rules plus the LLM's solution, LLM alone
+analysis_counts = {"rules": 0, "rules_with_llm": 0, "llm": 0}
 
 SYSTEM_PROMPT = """You are the Debug Agent for LearnFlow, an AI-powered Python learning platform.
 Analyze the student's code and error message to:
@@ -48,12 +65,23 @@ Respond with a JSON object containing:
 - "solution": the corrected code
 - "explanation": why the fix works
 """
+# For errors the rule library has already diagnosed: only the fix is asked for
+SOLUTION_PROMPT = """You are the Debug Agent for LearnFlow, an AI-powered Python learning platform.
+The student's error has already been diagnosed; its type and root cause are
+given with the code. Fix the code.
+
+Respond with a JSON object containing:
+- "solution": the corrected code
+- "explanation": why the fix works
+"""
+STREAMED_FIELDS = ("error_type", "root_cause", "solution", "explanation")
 
 
 class DebugRequest(BaseModel):
     code: str
     error_message: str = ""
     user_id: str = ""
+    include_solution: bool = True
 
 
 class DebugResponse(BaseModel):
@@ -62,6 +90,14 @@ class DebugResponse(BaseModel):
     hints: List[str]
     solution: str
     explanation: str
+    line: Optional[int] = None
+    source: str = "llm"
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Close the pooled OpenAI connections."""
+    await client.close()
 
 
 @app.get("/health")
@@ -69,29 +105,44 @@ async def health():
     return {"status": "healthy", "service": "debug-service"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """LLM concurrency, request coalescing and rule-based analysis statistics."""
+    total = sum(analysis_counts.values())
+    return {
+        "llm": llm_limit.stats(),
+        "singleflight": llm_flight.stats(),
+        "analyses": {
+            **analysis_counts,
+            "rules_rate": round((total - analysis_counts["llm"]) / total, 4) if total else 0.0,
+        },
+    }
+
+
 @app.get("/dapr/subscribe")
 async def subscribe():
     return [
-        {"pubsubname": "pubsub", "topic": "code.submitted", "route": "/events/code"}
+        {"pubsubname": "pubsub", "topic": "code.executed", "route": "/events/code"}
     ]
 
 
 @app.post("/api/debug/analyze", response_model=DebugResponse)
 async def analyze_error(request: DebugRequest):
-    """Analyze a code error and provide progressive hints."""
-    try:
-        user_msg = f"Code:\n```python\n{request.code}\n```\n"
-        if request.error_message:
-            user_msg += f"\nError:\n{request.error_message}"
+    """Analyze a code error and provide progressive hints.
+
+    Standard tracebacks covered by the rule library are answered locally;
+    the LLM is only asked for the solution, or for errors the rules don't know.
+    """
+    diagnosis = local_diagnosis(request)
+    if diagnosis:
+        # Known error: record it now instead of after the model answers
+        await asyncio.to_thread(_record_analysis, request.user_id, diagnosis.error_type)
+        if not request.include_solution:
+            analysis_counts["rules"] += 1
+            return _rules_response(diagnosis)
 
-        response = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_msg},
-            ],
-            response_format={"type": "json_object"},
-        )
+    try:
+        response = await chat_completion(**_analysis_params(request, diagnosis))
 
         content = response.choices[0].message.content
         result = json.loads(content) if content else {}
@@ -102,22 +153,12 @@ async def analyze_error(request: DebugRequest):
         solution = result.get("solution", "")
         explanation = result.get("explanation", "")
 
-        # Track errors for struggle detection
-        if request.user_id:
-            _track_error(request.user_id, error_type)
+        if diagnosis:
+            analysis_counts["rules_with_llm"] += 1
+            return _rules_response(diagnosis, solution=solution, explanation=explanation)
 
-        # Publish debug event
-        try:
-            requests.post(
-                f"{DAPR_BASE_URL}/v1.0/publish/pubsub/learning.events",
-                json={
-                    "type": "debug_analysis",
-                    "user_id": request.user_id,
-                    "error_type": error_type,
-                },
-            )
-        except Exception:
-            pass
+        analysis_counts["llm"] += 1
+        await asyncio.to_thread(_record_analysis, request.user_id, error_type)
 
         return DebugResponse(
             error_type=error_type,
@@ -128,6 +169,8 @@ async def analyze_error(request: DebugRequest):
         )
 
     except json.JSONDecodeError:
+        if diagnosis:
+            return _rules_response(diagnosis)
         return DebugResponse(
             error_type="Unknown",
             root_cause="Unable to parse AI response",
@@ -136,19 +179,145 @@ async def analyze_error(request: DebugRequest):
             explanation="The AI analysis could not be parsed. Please try again.",
         )
     except Exception as e:
+        if diagnosis:
+            return _rules_response(diagnosis)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def _track_error(user_id: str, error_type: str):
-    """Track error counts and trigger struggle detection."""
-    if user_id not in error_tracker:
-        error_tracker[user_id] = {}
+def local_diagnosis(request: DebugRequest) -> Optional[Diagnosis]:
+    """Rule-based diagnosis of the request's traceback, or None if the rules don't cover it."""
+    if not request.error_message:
+        return None
+    parsed = parse_traceback(request.error_message, request.code)
+    return diagnose(parsed) if parsed else None
+
+
+def _rules_response(diagnosis: Diagnosis, solution: str = "", explanation: str = "") -> DebugResponse:
+    return DebugResponse(
+        error_type=diagnosis.error_type,
+        root_cause=diagnosis.root_cause,
+        hints=diagnosis.hints,
+        solution=solution,
+        explanation=explanation or diagnosis.explanation,
+        line=diagnosis.line,
+        source="rules+llm" if solution else "rules",
+    )
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/debug/analyze/stream")
+async def analyze_error_stream(request: DebugRequest):
+    """Analyze a code error as Server-Sent Events.
+
+    Emits `error_type`, `root_cause`, one `hint` per hint ({"index", "text"}),
+    `solution` and `explanation`, each as soon as the model has finished
+    writing it, then `done`. For errors the rule library covers, the error
+    type, `line`, root cause and hints are sent before the model is called.
+    """
+    diagnosis = local_diagnosis(request)
+
+    async def events():
+        parser = JSONObjectStream()
+        fields = {}
+        if diagnosis:
+            await asyncio.to_thread(_record_analysis, request.user_id, diagnosis.error_type)
+            yield _sse("error_type", diagnosis.error_type)
+            if diagnosis.line:
+                yield _sse("line", diagnosis.line)
+            yield _sse("root_cause", diagnosis.root_cause)
+            for index, hint in enumerate(diagnosis.hints):
+                yield _sse("hint", {"index": index, "text": hint})
+            if not request.include_solution:
+                analysis_counts["rules"] += 1
+                yield _sse("explanation", diagnosis.explanation)
+                yield _sse("done", {"complete": True, "source": "rules"})
+                return
+        try:
+            async with llm_limit:
+                stream = await client.chat.completions.create(**_analysis_params(request, diagnosis), stream=True)
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    for name, index, value in parser.feed(chunk.choices[0].delta.content or ""):
+                        if diagnosis and name not in ("solution", "explanation"):
+                            continue
+                        if name == "hints" and index is not None:
+                            yield _sse("hint", {"index": index, "text": str(value)})
+                        elif index is None and name in STREAMED_FIELDS:
+                            fields[name] = value if isinstance(value, str) else json.dumps(value)
+                            yield _sse(name, fields[name])
+        except json.JSONDecodeError:
+            yield _sse("error", "Unable to parse AI response")
+            return
+        except Exception as e:
+            yield _sse("error", str(e))
+            return
+
+        if diagnosis:
+            analysis_counts["rules_with_llm"] += 1
+            yield _sse("done", {"complete": parser.done, "source": "rules+llm"})
+        else:
+            analysis_counts["llm"] += 1
+            await asyncio.to_thread(_record_analysis, request.user_id, fields.get("error_type", "Unknown"))
+            yield _sse("done", {"complete": parser.done, "source": "llm"})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _analysis_params(request: DebugRequest, diagnosis: Optional[Diagnosis] = None) -> dict:
+    """Chat parameters: the full analysis, or just the fix for a diagnosed error."""
+    user_msg = f"Code:\n```python\n{request.code}\n```\n"
+    if diagnosis:
+        system_prompt = SOLUTION_PROMPT
+        user_msg += f"\nError type: {diagnosis.error_type}\nRoot cause: {diagnosis.root_cause}"
+        if diagnosis.line:
+            user_msg += f"\nLine: {diagnosis.line}"
+    else:
+        system_prompt = SYSTEM_PROMPT
+        if request.error_message:
+            user_msg += f"\nError:\n{request.error_message}"
+    return {
+        "model": os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_msg},
+        ],
+        "response_format": {"type": "json_object"},
+    }
 
-    tracker = error_tracker[user_id]
-    tracker[error_type] = tracker.get(error_type, 0) + 1
 
-    # Struggle trigger: same error 3+ times
-    if tracker[error_type] >= 3:
+def _record_analysis(user_id: str, error_type: str):
+    """Track the error for struggle detection and publish the debug event."""
+    if user_id:
+        _track_error(user_id, error_type)
+
+    try:
+        requests.post(
+            f"{DAPR_BASE_URL}/v1.0/publish/pubsub/learning.events",
+            json={
+                "type": "debug_analysis",
+                "user_id": user_id,
+                "error_type": error_type,
+            },
+            timeout=2,
+        )
+    except Exception:
+        pass
+
+
+def _track_error(user_id: str, error_type: str):
+    """Track error counts and trigger struggle detection."""
+    with error_tracker_lock:
+        tracker = error_tracker.setdefault(user_id, {})
+        count = tracker[error_type] = tracker.get(error_type, 0) + 1
+        # Struggle trigger: same error 3+ times; reset the counter after alerting
+        if count >= 3:
+            tracker[error_type] = 0
+
+    if count >= 3:
         try:
             requests.post(
                 f"{DAPR_BASE_URL}/v1.0/publish/pubsub/struggle.detected",
@@ -157,35 +326,41 @@ def _track_error(user_id: str, error_type: str):
                     "struggle_type": "repeated_error",
                     "details": {
                         "error_type": error_type,
-                        "count": tracker[error_type],
+                        "count": count,
                     },
                     "timestamp": time.time(),
                 },
+                timeout=2,
             )
         except Exception:
             pass
-        # Reset counter after alerting
-        tracker[error_type] = 0
 
 
 @app.post("/events/code")
 async def handle_code_event(event: dict):
-    """Handle code submission events for automatic error analysis."""
+    """Analyze failed runs from code.executed events."""
     data = event.get("data", event)
     code = data.get("code", "")
-    error = data.get("error", "")
+    error = data.get("stderr", "")
     user_id = data.get("user_id", "")
 
-    if error and code:
+    if code and error and data.get("exit_code", 0) != 0:
+        # Only the error type is needed here, so known errors never reach the LLM
         await analyze_error(DebugRequest(
             code=code,
             error_message=error,
             user_id=user_id,
+            include_solution=False,
         ))
 
     return {"status": "processed"}
 
 
+async def chat_completion(**params):
+    """Chat completion; identical concurrent requests share one upstream call."""
+    return await llm_flight.do(request_key(params), llm_limit.run, client.chat.completions.create, **params)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
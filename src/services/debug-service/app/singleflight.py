@@ -0,0 +1,64 @@
+"""Single-flight: concurrent identical LLM calls share one upstream request."""
+from concurrent.futures import Future
+import asyncio
+import hashlib
+import json
+import threading
+from typing import Awaitable, Callable, Dict
+
+
+def request_key(params: dict) -> str:
+    """Hash of a request's parameters; equal requests get equal keys."""
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class SingleFlight:
+    """Collapses concurrent coroutine calls that share a key into one.
+
+    The first caller for a key starts the call as a task; callers arriving
+    while it is in flight await the same concurrent.futures.Future, so the
+    result (or exception) fans out to every waiter, whichever event loop it
+    runs on. A waiter that is cancelled does not cancel the call for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.collapsed = 0
+
+    async def do(self, key: str, fn: Callable[..., Awaitable], *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.calls += 1
+            else:
+                self.collapsed += 1
+        if leader:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            task.add_done_callback(lambda t: self._settle(key, future, t))
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.calls + self.collapsed
+            return {
+                "upstream_calls": self.calls,
+                "collapsed": self.collapsed,
+                "in_flight": len(self._calls),
+                "collapse_ratio": round(self.collapsed / requests, 4) if requests else 0.0,
+            }
+
+    def _settle(self, key: str, future: Future, task: asyncio.Task):
+        with self._lock:
+            del self._calls[key]
+        if task.cancelled():
+            future.set_exception(asyncio.CancelledError())
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
@@ -0,0 +1,419 @@
+"""Deterministic traceback parsing and a rule library for common beginner errors."""
+import re
+from typing import List, NamedTuple, Optional, Pattern, Tuple
+
+_FRAME = re.compile(r'^\s*File "(?P<file>[^"]+)", line (?P<line>\d+)(?:, in (?P<func>.+))?$')
+_EXCEPTION = re.compile(
+    r"^(?P<type>[A-Za-z_][\w.]*(?:Error|Exception|Warning|Interrupt|Exit))(?::\s?(?P<message>.*))?$"
+)
+# Frames in these files are the interpreter's or a library's, not the student's
+_LIBRARY_FILE = re.compile(r"^<frozen |[/\\]lib[/\\]python|site-packages|dist-packages")
+
+
+class ParsedError(NamedTuple):
+    error_type: str
+    message: str
+    line: Optional[int]
+    source_line: str
+    frames: List[Tuple[str, int, str]]
+
+
+class Diagnosis(NamedTuple):
+    error_type: str
+    line: Optional[int]
+    root_cause: str
+    hints: List[str]
+    explanation: str
+
+
+class Rule(NamedTuple):
+    error_type: str
+    pattern: Pattern
+    root_cause: str
+    hints: Tuple[str, ...]
+    explanation: str
+
+
+def parse_traceback(text: str, code: str = "") -> Optional[ParsedError]:
+    """The last exception in CPython error output, with the student's line number.
+
+    Handles full tracebacks (chained ones included), SyntaxError reports and
+    a bare "Type: message" line; returns None when no exception line is found.
+    """
+    lines = text.strip("\n").splitlines()
+    exception = None
+    for index in range(len(lines) - 1, -1, -1):
+        match = _EXCEPTION.match(lines[index].strip())
+        if match:
+            exception = index, match
+            break
+    if exception is None:
+        return None
+    end, match = exception
+
+    # Frames belong to this exception if they follow the last header before it
+    start = 0
+    for index in range(end - 1, -1, -1):
+        if lines[index].startswith("Traceback (most recent call last)") or not lines[index].strip():
+            start = index
+            break
+    frames: List[Tuple[str, int, str]] = []
+    sources: List[str] = []
+    for index in range(start, end):
+        frame = _FRAME.match(lines[index])
+        if frame:
+            frames.append((frame["file"], int(frame["line"]), frame["func"] or ""))
+            following = lines[index + 1] if index + 1 < end else ""
+            sources.append("" if _FRAME.match(following) else following.strip())
+
+    line, source_line = None, ""
+    for (file, number, _), source in reversed(list(zip(frames, sources))):
+        if not _LIBRARY_FILE.search(file):
+            line, source_line = number, source
+            break
+    code_lines = code.splitlines()
+    if line is not None and 0 < line <= len(code_lines) and not source_line.strip("^~ "):
+        source_line = code_lines[line - 1].strip()
+
+    error_type = match["type"].rsplit(".", 1)[-1]
+    return ParsedError(error_type, (match["message"] or "").strip(), line, source_line, frames)
+
+
+def _rule(error_type: str, pattern: str, root_cause: str, hints: Tuple[str, ...], explanation: str) -> Rule:
+    return Rule(error_type, re.compile(pattern), root_cause, hints, explanation)
+
+
+# Checked in order; the first rule whose type and message pattern match wins.
+# Templates may use the pattern's named groups plus {where} (" on line N" or "").
+RULES: List[Rule] = [
+    _rule(
+        "NameError", r"name '(?P<name>\w+)' is not defined(?:\. Did you mean: '(?P<suggestion>\w+)'\?)?",
+        "`{name}` is used{where} before Python knows about it: it was never assigned, imported or defined, "
+        "or its spelling doesn't match where it was.",
+        (
+            "Look at where `{name}` is first used.",
+            "Python only knows names that were assigned, imported or defined above the line that uses them, "
+            "and names are case-sensitive.",
+            "Define `{name}` before it is used{where}, or correct its spelling.",
+        ),
+        "A name must be bound (by assignment, import, def or class) before the line that reads it runs.",
+    ),
+    _rule(
+        "UnboundLocalError",
+        r"(?:cannot access local variable '(?P<name>\w+)'|local variable '(?P<name_old>\w+)' referenced)",
+        "`{name}` is assigned somewhere in this function, so Python treats it as local everywhere in it, "
+        "but it is read{where} before that assignment runs.",
+        (
+            "Find every place inside the function that assigns to `{name}`.",
+            "Assigning to a name anywhere in a function makes it local for the whole function.",
+            "Assign `{name}` before reading it, pass it in as a parameter, or return the new value instead.",
+        ),
+        "A variable that a function assigns to is local to that function unless declared otherwise.",
+    ),
+    _rule(
+        "IndentationError", r"expected an indented block",
+        "A statement ending with `:` must be followed by an indented block, but the code{where} isn't indented.",
+        (
+            "Look at the line ending with a colon just before the error.",
+            "Statements like if, for, while, def and class need at least one indented line after them.",
+            "Indent the body by 4 spaces, or use `pass` as a placeholder.",
+        ),
+        "Python uses indentation to mark which lines belong to a block.",
+    ),
+    _rule(
+        "IndentationError", r"unexpected indent",
+        "Line{where_bare} is indented more than the code around it, but nothing before it opens a new block.",
+        (
+            "Compare this line's indentation with the line above it.",
+            "Only lines after a statement ending in `:` may be indented further.",
+            "Remove the extra leading spaces so the line lines up with its neighbours.",
+        ),
+        "Indentation is part of Python's syntax, so an extra indent is an error rather than just style.",
+    ),
+    _rule(
+        "IndentationError", r"unindent does not match any outer indentation level",
+        "The indentation{where} doesn't line up with any enclosing block.",
+        (
+            "Check how many spaces each line of this block starts with.",
+            "When you dedent, the line must line up exactly with an earlier block level.",
+            "Re-indent the block consistently, with 4 spaces per level.",
+        ),
+        "Every dedent has to return to an indentation level that was used before.",
+    ),
+    _rule(
+        "TabError", r"inconsistent use of tabs and spaces",
+        "The indentation{where} mixes tab characters and spaces.",
+        (
+            "Some lines are indented with tabs and others with spaces.",
+            "Python can't compare a tab with a number of spaces.",
+            "Re-indent the block using spaces only (4 per level).",
+        ),
+        "Python requires indentation to be consistent, and a tab is not equal to any number of spaces.",
+    ),
+    _rule(
+        "SyntaxError", r"expected ':'",
+        "A statement{where} that starts a block (if, for, while, def, class, ...) is missing its colon.",
+        (
+            "Look at the end of the line the error points to.",
+            "Every statement that introduces an indented block ends with `:`.",
+            "Add `:` at the end of that line.",
+        ),
+        "The colon tells Python that an indented block follows.",
+    ),
+    _rule(
+        "SyntaxError", r"Missing parentheses in call to '(?P<name>\w+)'",
+        "`{name}`{where} is used with Python 2 syntax; in Python 3 it is a function and needs parentheses.",
+        (
+            "Look at how `{name}` is written{where}.",
+            "In Python 3, `{name}` is called like any other function.",
+            "Write `{name}(...)` with the arguments inside the parentheses.",
+        ),
+        "Python 3 turned print into a function, so it is called with parentheses.",
+    ),
+    _rule(
+        "SyntaxError", r"unterminated string literal|EOL while scanning string literal",
+        "A string{where} is opened with a quote but never closed.",
+        (
+            "Count the quotes in the line the error points to.",
+            "A string must start and end with the same kind of quote on the same line.",
+            "Add the missing closing quote (or use triple quotes for text that spans lines).",
+        ),
+        "Python reads everything after an opening quote as text until it finds the matching quote.",
+    ),
+    _rule(
+        "SyntaxError", r"'(?P<bracket>[(\[{])' was never closed",
+        "A `{bracket}` opened{where} is never closed.",
+        (
+            "Check that every bracket{where} has a partner.",
+            "Brackets must be closed in the reverse order they were opened.",
+            "Add the missing closing bracket for the `{bracket}`.",
+        ),
+        "Python keeps reading until every open bracket is closed, so it fails at the end of the statement.",
+    ),
+    _rule(
+        "SyntaxError", r"Maybe you meant '==' or ':=' instead of '='",
+        "A single `=`{where} is used where a comparison is expected.",
+        (
+            "Look at the condition the error points to.",
+            "`=` assigns a value; `==` compares two values.",
+            "Use `==` to test for equality in the condition.",
+        ),
+        "Conditions need an expression that evaluates to True or False, and assignment is not one.",
+    ),
+    _rule(
+        "TypeError", r'can only concatenate str \(not "(?P<type>\w+)"\) to str',
+        "A string is joined with `+` to a value of type `{type}`{where}; `+` only joins strings to strings.",
+        (
+            "Check the types of the values on both sides of `+`.",
+            "Python won't convert a `{type}` to text automatically.",
+            "Convert the value with `str(...)`, or use an f-string such as f\"Total: {{value}}\".",
+        ),
+        "`+` means addition for numbers and joining for strings, and Python won't guess which you meant.",
+    ),
+    _rule(
+        "TypeError", r"unsupported operand type\(s\) for (?P<op>\S+): '(?P<left>\w+)' and '(?P<right>\w+)'",
+        "The `{op}` operator{where} is applied to `{left}` and `{right}` values, which it can't combine.",
+        (
+            "Print the types of both operands with `type(...)`.",
+            "One of them probably isn't the type you expect (input() always returns a str).",
+            "Convert one operand, e.g. with `int(...)` or `str(...)`, so both have compatible types.",
+        ),
+        "Operators are defined for specific type combinations; mixing incompatible types raises TypeError.",
+    ),
+    _rule(
+        "TypeError", r"'NoneType' object is not (?P<what>subscriptable|iterable|callable)",
+        "A value{where} is `None` where something {what} was expected.",
+        (
+            "Find where the value used{where} comes from.",
+            "Functions that don't `return` a value return None, and so do in-place methods like list.sort().",
+            "Make sure the function returns the value, or use the original object instead of the method's result.",
+        ),
+        "None is the result of functions without a return value, and it supports almost no operations.",
+    ),
+    _rule(
+        "TypeError", r"(?P<func>[\w.]+)\(\) missing (?P<count>\d+) required positional arguments?: (?P<names>.+)",
+        "`{func}()` is called{where} without its required argument(s) {names}.",
+        (
+            "Compare the call with the function's definition.",
+            "Every parameter without a default value must be given when calling.",
+            "Pass {names} in the call, or give the parameter a default value.",
+        ),
+        "Python matches call arguments to parameters; every required parameter needs a value.",
+    ),
+    _rule(
+        "TypeError",
+        r"(?P<func>[\w.]+)\(\) takes (?P<expected>\d+) positional arguments? but (?P<given>\d+) (?:were|was) given",
+        "`{func}()` accepts {expected} positional argument(s) but was called with {given}{where}.",
+        (
+            "Count the arguments in the call and the parameters in the definition.",
+            "For methods, `self` counts as the first parameter and is passed automatically.",
+            "Remove the extra argument(s), or add the missing parameter (e.g. `self`) to the definition.",
+        ),
+        "The number of positional arguments in a call must match the function's parameters.",
+    ),
+    _rule(
+        "TypeError", r"'(?P<type>\w+)' object is not callable",
+        "A value of type `{type}` is called like a function{where}.",
+        (
+            "Look for parentheses right after a variable that isn't a function.",
+            "A variable may be shadowing a built-in, e.g. a variable named `list`, `str` or `sum`.",
+            "Rename the variable or remove the parentheses.",
+        ),
+        "Only functions, classes and other callables can be followed by `(...)`.",
+    ),
+    _rule(
+        "TypeError", r"'(?P<type>\w+)' object is not iterable",
+        "A value of type `{type}` is looped over or unpacked{where}, but it isn't a collection.",
+        (
+            "Check what the for loop (or unpacking) is iterating over.",
+            "To loop a number of times, iterate over `range(n)` rather than `n`.",
+            "Use `range(...)` or a list/string instead of the `{type}` value.",
+        ),
+        "for loops and unpacking need an iterable such as a list, string, dict or range.",
+    ),
+    _rule(
+        "TypeError", r"(?P<container>\w+) indices must be integers(?: or slices)?, not (?P<type>\w+)",
+        "A {container} is indexed with a `{type}`{where}, but {container} indices must be integers.",
+        (
+            "Check the value inside the square brackets.",
+            "Values from input() are strings, and loops over a list give items, not positions.",
+            "Convert the index with `int(...)`, or use `enumerate(...)` to get positions.",
+        ),
+        "Sequences are indexed by position, which is always an integer.",
+    ),
+    _rule(
+        "IndexError", r"(?P<container>\w+) index out of range",
+        "The code{where} asks for a {container} position that doesn't exist.",
+        (
+            "Print the length of the {container} and the index being used.",
+            "Valid indexes run from 0 to len(...) - 1.",
+            "Fix the loop bounds (e.g. `range(len(items))`) or check the length before indexing.",
+        ),
+        "Indexing past the last element raises IndexError; sequences start counting at 0.",
+    ),
+    _rule(
+        "KeyError", r"^(?P<key>.+)$",
+        "The dictionary lookup{where} uses the key {key}, which isn't in the dictionary.",
+        (
+            "Print the dictionary's keys and compare them with {key}.",
+            "Keys must match exactly, including case and type (\"1\" is not 1).",
+            "Check with `in` first, or use `.get({key})` to get None (or a default) when the key is missing.",
+        ),
+        "Looking up a missing key with `d[key]` raises KeyError; `.get()` returns a default instead.",
+    ),
+    _rule(
+        "AttributeError",
+        r"'(?P<type>\w+)' object has no attribute '(?P<attr>\w+)'(?:\. Did you mean: '(?P<suggestion>\w+)'\?)?",
+        "`.{attr}` is used{where} on a `{type}` value, but `{type}` has no attribute called `{attr}`.",
+        (
+            "Check the type of the value before the dot.",
+            "Use `dir(...)` or the documentation to see what a `{type}` supports.",
+            "Use the right method name for a `{type}`{suggestion_hint}, or fix the value if it has the wrong type.",
+        ),
+        "Each type has its own set of attributes and methods.",
+    ),
+    _rule(
+        "ValueError", r"invalid literal for int\(\) with base \d+: (?P<value>.+)",
+        "`int()` is given the text {value}{where}, which isn't a whole number.",
+        (
+            "Print the exact value passed to `int()`.",
+            "int() only accepts text made of digits (an optional sign and surrounding spaces are fine).",
+            "Strip or validate the input first, or use `float()` for decimal numbers.",
+        ),
+        "int() parses text as a whole number and rejects anything else.",
+    ),
+    _rule(
+        "ValueError", r"could not convert string to float: (?P<value>.+)",
+        "`float()` is given the text {value}{where}, which isn't a number.",
+        (
+            "Print the exact value passed to `float()`.",
+            "float() needs digits with an optional `.`; commas and units are not allowed.",
+            "Clean the text (e.g. remove commas) or validate it before converting.",
+        ),
+        "float() parses text as a number and rejects anything else.",
+    ),
+    _rule(
+        "ValueError", r"(?P<how>too many|not enough) values to unpack \(expected (?P<expected>\d+)",
+        "The unpacking{where} expects {expected} values but the right-hand side has {how} values.",
+        (
+            "Count the names on the left and the items on the right.",
+            "Unpacking needs exactly one name per item.",
+            "Make the number of names match the number of items, or use `*rest` to collect extras.",
+        ),
+        "`a, b = value` requires `value` to contain exactly two items.",
+    ),
+    _rule(
+        "ZeroDivisionError", r"division|modulo",
+        "The code{where} divides by zero.",
+        (
+            "Find the divisor in the line the error points to.",
+            "The divisor is 0 at that moment, e.g. the length of an empty list.",
+            "Check that the divisor isn't zero before dividing.",
+        ),
+        "Division by zero is undefined, so Python raises an error instead of returning a value.",
+    ),
+    _rule(
+        "ModuleNotFoundError", r"No module named '(?P<module>[\w.]+)'",
+        "The import{where} refers to a module called `{module}` that isn't installed or doesn't exist.",
+        (
+            "Check the spelling of the module name.",
+            "Only the standard library is available when running exercises.",
+            "Fix the module name or use a standard-library alternative.",
+        ),
+        "import looks the module up by name and fails if no module with that name can be found.",
+    ),
+    _rule(
+        "RecursionError", r"maximum recursion depth exceeded",
+        "A function keeps calling itself without reaching a base case.",
+        (
+            "Find the function that calls itself.",
+            "Every recursive function needs a base case that returns without recursing.",
+            "Add a base case and make sure each call moves closer to it.",
+        ),
+        "Each recursive call uses stack space, and Python stops at a fixed depth limit.",
+    ),
+    _rule(
+        "FileNotFoundError", r"No such file or directory: (?P<path>.+)",
+        "The code{where} opens {path}, which doesn't exist.",
+        (
+            "Check the file name and where the program is run from.",
+            "Relative paths are resolved from the current working directory.",
+            "Fix the path, or create the file before opening it for reading.",
+        ),
+        "Opening a file for reading requires the file to exist.",
+    ),
+]
+
+
+def diagnose(parsed: ParsedError, rules: List[Rule] = RULES) -> Optional[Diagnosis]:
+    """Root cause and progressive hints from the first matching rule, or None."""
+    for rule in rules:
+        if rule.error_type != parsed.error_type:
+            continue
+        match = rule.pattern.search(parsed.message)
+        if not match:
+            continue
+        values = {name: value for name, value in match.groupdict().items() if value is not None}
+        if "name_old" in values:
+            values.setdefault("name", values["name_old"])
+        values["where"] = f" on line {parsed.line}" if parsed.line else ""
+        values["where_bare"] = f" {parsed.line}" if parsed.line else ""
+        suggestion = values.get("suggestion")
+        values["suggestion_hint"] = f" (did you mean `{suggestion}`?)" if suggestion else ""
+        fill = _Template(values)
+        hints = [hint.format_map(fill) for hint in rule.hints]
+        if suggestion and parsed.error_type == "NameError":
+            hints[-1] += f" Did you mean `{suggestion}`?"
+        return Diagnosis(
+            error_type=parsed.error_type,
+            line=parsed.line,
+            root_cause=rule.root_cause.format_map(fill),
+            hints=hints,
+            explanation=rule.explanation,
+        )
+    return None
+
+
+class _Template(dict):
+    def __missing__(self, key):
+        return ""
@@ -1,8 +1,8 @@
 """Tests for the Debug Service."""
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock, MagicMock
 from fastapi.testclient import TestClient
 
-from app.main import app, error_tracker
+from app.main import SOLUTION_PROMPT, app, error_tracker
 
 client = TestClient(app)
 
@@ -24,7 +24,7 @@ def test_dapr_subscribe():
     assert response.status_code == 200
     subs = response.json()
     assert len(subs) == 1
-    assert subs[0]["topic"] == "code.submitted"
+    assert subs[0]["topic"] == "code.executed"
 
 
 @patch("app.main.requests.post")
@@ -33,7 +33,7 @@ def test_analyze_error(mock_openai, mock_post):
     mock_response = MagicMock()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = '{"error_type": "SyntaxError", "root_cause": "Missing colon after if statement", "hints": ["Check your if statement syntax", "Python requires a colon after conditions", "Add : after if x > 5"], "solution": "if x > 5:\\n    print(x)", "explanation": "Python if statements require a colon"}'
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
     mock_post.return_value = MagicMock(status_code=200)
 
     response = client.post("/api/debug/analyze", json={
@@ -55,7 +55,7 @@ def test_analyze_publishes_event(mock_openai, mock_post):
     mock_response = MagicMock()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = '{"error_type": "NameError", "root_cause": "Variable not defined", "hints": ["Check variable names"], "solution": "x = 5", "explanation": "Define before use"}'
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
     mock_post.return_value = MagicMock(status_code=200)
 
     client.post("/api/debug/analyze", json={
@@ -76,7 +76,7 @@ def test_repeated_errors_trigger_struggle(mock_openai, mock_post):
     mock_response = MagicMock()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = '{"error_type": "TypeError", "root_cause": "Type mismatch", "hints": ["Check types"], "solution": "str(x)", "explanation": "Convert types"}'
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
     mock_post.return_value = MagicMock(status_code=200)
 
     for _ in range(3):
@@ -96,7 +96,7 @@ def test_repeated_errors_trigger_struggle(mock_openai, mock_post):
 
 @patch("app.main.client")
 def test_analyze_error_handling(mock_openai):
-    mock_openai.chat.completions.create.side_effect = Exception("API error")
+    mock_openai.chat.completions.create = AsyncMock(side_effect=Exception("API error"))
 
     response = client.post("/api/debug/analyze", json={
         "code": "test",
@@ -111,3 +111,243 @@ def test_handle_code_event():
     })
     assert response.status_code == 200
     assert response.json()["status"] == "processed"
+
+
+@patch("app.main.analyze_error")
+def test_handle_code_event_analyzes_failed_runs_only(mock_analyze):
+    client.post("/events/code", json={
+        "data": {"code": "print('ok')", "stdout": "ok\n", "stderr": "", "exit_code": 0, "user_id": "user-1"}
+    })
+    mock_analyze.assert_not_called()
+
+    client.post("/events/code", json={
+        "data": {
+            "code": "print(x)",
+            "stderr": "NameError: name 'x' is not defined\n",
+            "exit_code": 1,
+            "user_id": "user-1",
+        }
+    })
+    request = mock_analyze.call_args[0][0]
+    assert request.error_message == "NameError: name 'x' is not defined\n"
+    assert request.user_id == "user-1"
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_concurrent_identical_analyses_share_one_llm_call(mock_openai, mock_post):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = '{"error_type": "NameError", "root_cause": "x undefined", "hints": ["a", "b", "c"], "solution": "", "explanation": ""}'
+
+    async def slow_create(**params):
+        await asyncio.sleep(0.2)
+        return mock_response
+
+    mock_openai.chat.completions.create = AsyncMock(side_effect=slow_create)
+    mock_post.return_value = MagicMock(status_code=200)
+    before = client.get("/metrics").json()["singleflight"]["collapsed"]
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        responses = list(executor.map(
+            lambda _: client.post('/api/debug/analyze', json={'code': 'print(x)', 'error_message': "NameError: name 'x' is not defined"}), range(5)
+        ))
+
+    assert all(r.status_code == 200 for r in responses)
+    assert mock_openai.chat.completions.create.call_count == 1
+    stats = client.get("/metrics").json()["singleflight"]
+    assert stats["collapsed"] == before + 4
+    assert stats["in_flight"] == 0
+
+
+def _streamed_completion(mock_openai, content, size=5):
+    """Have the mocked client stream `content` in chunks of `size` characters."""
+    async def stream():
+        for start in range(0, len(content), size):
+            chunk = MagicMock()
+            chunk.choices = [MagicMock()]
+            chunk.choices[0].delta.content = content[start:start + size]
+            yield chunk
+
+    mock_openai.chat.completions.create = AsyncMock(side_effect=lambda **kwargs: stream())
+
+
+def _sse_events(body):
+    import json
+
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_analyze_stream_sends_each_hint_as_it_completes(mock_openai, mock_post):
+    _streamed_completion(mock_openai, (
+        '{"error_type": "NameError", "root_cause": "x is used before assignment", '
+        '"hints": ["Look at line 1", "Where is x defined?", "Assign x first"], '
+        '"solution": "x = 1\\nprint(x)", "explanation": "Names must exist before use"}'
+    ))
+    mock_post.return_value = MagicMock(status_code=200)
+
+    response = client.post("/api/debug/analyze/stream", json={
+        "code": "print(x)",
+        "user_id": "user-1",
+    })
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert _sse_events(response.text) == [
+        ("error_type", "NameError"),
+        ("root_cause", "x is used before assignment"),
+        ("hint", {"index": 0, "text": "Look at line 1"}),
+        ("hint", {"index": 1, "text": "Where is x defined?"}),
+        ("hint", {"index": 2, "text": "Assign x first"}),
+        ("solution", "x = 1\nprint(x)"),
+        ("explanation", "Names must exist before use"),
+        ("done", {"complete": True, "source": "llm"}),
+    ]
+    assert mock_openai.chat.completions.create.call_args.kwargs["stream"] is True
+    assert error_tracker["user-1"] == {"NameError": 1}
+    assert mock_post.call_args.kwargs["json"]["type"] == "debug_analysis"
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_analyze_stream_reports_unparseable_output(mock_openai, mock_post):
+    _streamed_completion(mock_openai, "Sorry, I can't help with that.")
+
+    response = client.post("/api/debug/analyze/stream", json={"code": "x", "user_id": "user-2"})
+
+    assert _sse_events(response.text) == [("error", "Unable to parse AI response")]
+    assert "user-2" not in error_tracker
+    mock_post.assert_not_called()
+
+
+def test_traceback_parser_finds_the_students_line():
+    from app.tracebacks import diagnose, parse_traceback
+
+    stderr = (
+        "Traceback (most recent call last):\n"
+        '  File "main.py", line 4, in <module>\n'
+        "    print(total('3'))\n"
+        '  File "main.py", line 2, in total\n'
+        "    return 'Total: ' + n * 2 + 1\n"
+        "           ~~~~~~~~~~~~~~~~~~^~~\n"
+        'TypeError: can only concatenate str (not "int") to str\n'
+    )
+    parsed = parse_traceback(stderr)
+    assert (parsed.error_type, parsed.line) == ("TypeError", 2)
+    assert parsed.source_line == "return 'Total: ' + n * 2 + 1"
+    diagnosis = diagnose(parsed)
+    assert "`int`" in diagnosis.root_cause and "line 2" in diagnosis.root_cause
+    assert len(diagnosis.hints) == 3
+
+    # Library frames are skipped; the last student frame gives the line
+    library = (
+        "Traceback (most recent call last):\n"
+        '  File "main.py", line 2, in <module>\n'
+        "    json.loads('{')\n"
+        '  File "/usr/lib/python3.11/json/__init__.py", line 346, in loads\n'
+        "    return _default_decoder.decode(s)\n"
+        "json.decoder.JSONDecodeError: Expecting property name: line 1 column 2 (char 1)\n"
+    )
+    parsed = parse_traceback(library, code="import json\njson.loads('{')\n")
+    assert (parsed.error_type, parsed.line, parsed.source_line) == ("JSONDecodeError", 2, "json.loads('{')")
+    assert diagnose(parsed) is None
+
+    syntax = '  File "main.py", line 1\n    if x > 5\n            ^\nSyntaxError: expected \':\'\n'
+    assert diagnose(parse_traceback(syntax)).line == 1
+    assert parse_traceback("Segmentation fault") is None
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_known_errors_are_answered_without_the_llm(mock_openai, mock_post):
+    mock_openai.chat.completions.create = AsyncMock(side_effect=AssertionError("LLM called"))
+    mock_post.return_value = MagicMock(status_code=200)
+
+    response = client.post("/api/debug/analyze", json={
+        "code": "count = 1\nprint(cout)",
+        "error_message": "Traceback (most recent call last):\n  File \"main.py\", line 2, in <module>\n"
+                         "    print(cout)\nNameError: name 'cout' is not defined. Did you mean: 'count'?",
+        "user_id": "user-3",
+        "include_solution": False,
+    })
+
+    data = response.json()
+    assert (data["error_type"], data["line"], data["source"]) == ("NameError", 2, "rules")
+    assert "`cout`" in data["root_cause"] and "`count`" in data["hints"][-1]
+    assert error_tracker["user-3"] == {"NameError": 1}
+
+    # Failed runs from code.executed only need the error type
+    client.post("/events/code", json={"data": {
+        "code": "print(1/0)", "stderr": "ZeroDivisionError: division by zero", "exit_code": 1, "user_id": "user-3",
+    }})
+    assert error_tracker["user-3"] == {"NameError": 1, "ZeroDivisionError": 1}
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_known_errors_track_before_the_llm_writes_the_solution(mock_openai, mock_post):
+
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = '{"error_type": "IndexError", "root_cause": "-", "hints": ["-"], "solution": "print(items[-1])", "explanation": "Use -1"}'
+    tracked_before_llm = []
+
+    async def create(**params):
+        tracked_before_llm.append(dict(error_tracker.get("user-4", {})))
+        return mock_response
+
+    mock_openai.chat.completions.create = AsyncMock(side_effect=create)
+    mock_post.return_value = MagicMock(status_code=200)
+
+    data = client.post("/api/debug/analyze", json={
+        "code": "items = [1, 2]\nprint(items[2])",
+        "error_message": "IndexError: list index out of range",
+        "user_id": "user-4",
+    }).json()
+
+    assert tracked_before_llm == [{"IndexError": 1}]
+    # The model is told the diagnosis and asked only for the fix
+    system, user = mock_openai.chat.completions.create.call_args.kwargs["messages"]
+    assert system["content"] == SOLUTION_PROMPT and '"hints"' not in system["content"]
+    assert "Error type: IndexError" in user["content"] and "Root cause: The code asks for a list position" in user["content"]
+    assert "list index out of range" not in user["content"]
+    assert (data["source"], data["solution"], data["explanation"]) == ("rules+llm", "print(items[-1])", "Use -1")
+    assert data["root_cause"].startswith("The code asks for a list position")
+
+    # If the model fails, the rule-based answer is still returned
+    mock_openai.chat.completions.create = AsyncMock(side_effect=Exception("API error"))
+    failed = client.post("/api/debug/analyze", json={"code": "[][0]", "error_message": "IndexError: list index out of range"})
+    assert failed.status_code == 200 and failed.json()["source"] == "rules"
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_analyze_stream_sends_rule_hints_before_the_model(mock_openai, mock_post):
+
+    _streamed_completion(mock_openai, '{"error_type": "X", "hints": ["model hint"], "solution": "x = 1\\nprint(x)", "explanation": "Define x"}')
+    mock_post.return_value = MagicMock(status_code=200)
+
+    response = client.post("/api/debug/analyze/stream", json={
+        "code": "print(x)",
+        "error_message": "Traceback (most recent call last):\n  File \"main.py\", line 1, in <module>\n"
+                         "    print(x)\nNameError: name 'x' is not defined",
+    })
+
+    events = _sse_events(response.text)
+    assert mock_openai.chat.completions.create.call_args.kwargs["messages"][0]["content"] == SOLUTION_PROMPT
+    assert [name for name, _ in events] == [
+        "error_type", "line", "root_cause", "hint", "hint", "hint", "solution", "explanation", "done",
+    ]
+    assert events[0] == ("error_type", "NameError") and events[1] == ("line", 1)
+    assert events[-3:] == [
+        ("solution", "x = 1\nprint(x)"), ("explanation", "Define x"), ("done", {"complete": True, "source": "rules+llm"}),
+    ]
@@ -0,0 +1,70 @@
+"""Shared async OpenAI client: pooled HTTP/2 connections and bounded concurrency."""
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+
+def create_client(
+    api_key: Optional[str],
+    max_concurrency: int,
+    timeout: float,
+    base_url: Optional[str] = None,
+) -> AsyncOpenAI:
+    """One client per process; its connection pool is reused by every request.
+
+    `timeout` bounds each request (read/write/pool); connecting gets at most
+    5 seconds of it.
+    """
+    http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=max_concurrency,
+            max_keepalive_connections=max_concurrency,
+            keepalive_expiry=60,
+        ),
+        timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+    )
+    return AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=timeout, http_client=http_client)
+
+
+class ConcurrencyLimit:
+    """Caps upstream LLM requests in flight; extra callers wait their turn."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.peak = 0
+        self.completed = 0
+
+    async def run(self, fn: Callable[..., Awaitable], *args, **kwargs):
+        async with self:
+            return await fn(*args, **kwargs)
+
+    async def __aenter__(self):
+        """Hold a slot for a whole block, e.g. while consuming a streamed response."""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.active -= 1
+        self.completed += 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "peak": self.peak,
+            "completed": self.completed,
+        }
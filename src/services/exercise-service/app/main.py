@@ -8,7 +8,8 @@ import json
 import requests
 import uuid
 
-from openai import OpenAI
+from app.llm import ConcurrencyLimit, create_client
+from app.singleflight import SingleFlight, request_key
 
 app = FastAPI(
     title="exercise-service",
@@ -29,8 +30,19 @@ DAPR_HTTP_PORT = os.getenv("DAPR_HTTP_PORT", "3500")
 DAPR_BASE_URL = f"http://localhost:{DAPR_HTTP_PORT}"
 STATE_STORE = "statestore"
 
-# OpenAI configuration
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# OpenAI configuration: one async client per process with pooled HTTP/2
+# connections; OPENAI_TIMEOUT bounds each request
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+client = create_client(
+    os.getenv("OPENAI_API_KEY"), OPENAI_MAX_CONCURRENCY, OPENAI_TIMEOUT, os.getenv("OPENAI_BASE_URL") or None
+)
+llm_limit = ConcurrencyLimit(OPENAI_MAX_CONCURRENCY)
+llm_flight = SingleFlight()
+
+# Test cases are sent to code-execution-service's /execute/batch in chunks
+# of at most EXEC_BATCH_MAX_CASES; keep it in step with that service's limit
+EXEC_BATCH_MAX_CASES = int(os.getenv("EXEC_BATCH_MAX_CASES", "32"))
 
 # In-memory quiz store
 quizzes: Dict[str, dict] = {}
@@ -104,12 +116,24 @@ class QuizResult(BaseModel):
     results: List[dict]
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    """Close the pooled OpenAI connections."""
+    await client.close()
+
+
 @app.get("/health")
 async def health():
     """Health check endpoint."""
     return {"status": "healthy", "service": "exercise-service"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """LLM concurrency and request coalescing statistics."""
+    return {"llm": llm_limit.stats(), "singleflight": llm_flight.stats()}
+
+
 @app.get("/dapr/subscribe")
 async def subscribe():
     """Dapr pub/sub subscriptions."""
@@ -199,39 +223,12 @@ async def grade_exercise(exercise_id: str, request: GradeRequest):
     except Exception:
         exercise = None
 
-    # Execute the code
     exec_url = os.getenv("CODE_EXECUTION_SERVICE_URL", "http://code-execution-service:8000")
-    try:
-        exec_response = requests.post(
-            f"{exec_url}/execute",
-            json={"code": request.code},
-            timeout=15,
-        )
-        exec_result = exec_response.json()
-        output = exec_result.get("output", "")
-        error = exec_result.get("error", "")
-    except Exception:
-        output = ""
-        error = "Code execution service unavailable"
 
-    if error:
-        score = 0.0
-        passed = False
-        feedback = f"Code execution error: {error}"
-    elif exercise and exercise.expected_output:
-        if output.strip() == exercise.expected_output.strip():
-            score = 100.0
-            passed = True
-            feedback = "All tests passed! Great job!"
-        else:
-            score = 30.0
-            passed = False
-            feedback = f"Output mismatch. Expected: {exercise.expected_output.strip()}, Got: {output.strip()}"
+    if exercise and exercise.test_cases:
+        score, passed, feedback = _grade_test_cases(exec_url, request.code, exercise.test_cases)
     else:
-        # No expected output; if code runs without error, give partial credit
-        score = 70.0
-        passed = True
-        feedback = "Code executed successfully."
+        score, passed, feedback = _grade_expected_output(exec_url, request.code, exercise)
 
     # Publish grade event
     try:
@@ -251,6 +248,90 @@ async def grade_exercise(exercise_id: str, request: GradeRequest):
     return GradeResponse(passed=passed, score=score, feedback=feedback)
 
 
+def _grade_expected_output(exec_url: str, code: str, exercise: Optional[Exercise]):
+    """Run the code once and compare its output with the exercise's expected output."""
+    try:
+        exec_response = requests.post(
+            f"{exec_url}/execute",
+            json={"code": code},
+            timeout=15,
+        )
+        exec_result = exec_response.json()
+        output = exec_result.get("output", "")
+        error = exec_result.get("error", "")
+    except Exception:
+        output = ""
+        error = "Code execution service unavailable"
+
+    if error:
+        return 0.0, False, f"Code execution error: {error}"
+    if exercise and exercise.expected_output:
+        if output.strip() == exercise.expected_output.strip():
+            return 100.0, True, "All tests passed! Great job!"
+        return 30.0, False, f"Output mismatch. Expected: {exercise.expected_output.strip()}, Got: {output.strip()}"
+    # No expected output; if code runs without error, give partial credit
+    return 70.0, True, "Code executed successfully."
+
+
+def _grade_test_cases(exec_url: str, code: str, test_cases: List[dict]):
+    """Run the test cases in as few batch calls as possible and score the fraction that pass.
+
+    Each test case may define "input" (stdin), "args" (argv) and "expected_output".
+    """
+    results = []
+    for start in range(0, len(test_cases), EXEC_BATCH_MAX_CASES):
+        try:
+            exec_response = requests.post(
+                f"{exec_url}/execute/batch",
+                json={
+                    "code": code,
+                    "cases": [
+                        {"stdin": tc.get("input", ""), "args": tc.get("args", [])}
+                        for tc in test_cases[start:start + EXEC_BATCH_MAX_CASES]
+                    ],
+                },
+                timeout=30,
+            )
+        except Exception:
+            return 0.0, False, "Code execution error: Code execution service unavailable"
+        if 400 <= exec_response.status_code < 500:
+            # The service rejected the request itself: say why instead of blaming availability
+            return 0.0, False, f"Code execution error: {_error_detail(exec_response)}"
+        try:
+            exec_response.raise_for_status()
+            results.extend(exec_response.json()["results"])
+        except Exception:
+            return 0.0, False, "Code execution error: Code execution service unavailable"
+
+    failures = []
+    for i, (tc, result) in enumerate(zip(test_cases, results), start=1):
+        output = result.get("output", "")
+        expected = str(tc.get("expected_output", ""))
+        exit_code = result.get("exit_code", 0)
+        if exit_code != 0:
+            lines = (result.get("error") or "").strip().splitlines()
+            failures.append(f"Test {i}: {lines[-1] if lines else f'exited with code {exit_code}'}")
+        elif output.strip() != expected.strip():
+            failures.append(f"Test {i}: expected {expected.strip()!r}, got {output.strip()!r}")
+
+    passed_count = len(test_cases) - len(failures)
+    score = round(passed_count / len(test_cases) * 100, 1)
+    if not failures:
+        return score, True, f"All {len(test_cases)} tests passed! Great job!"
+    return score, False, f"Passed {passed_count}/{len(test_cases)} tests. {failures[0]}"
+
+
+def _error_detail(response) -> str:
+    """The `detail` of a FastAPI error response, as one line."""
+    try:
+        detail = response.json().get("detail")
+    except Exception:
+        detail = None
+    if isinstance(detail, list):
+        detail = "; ".join(str(item.get("msg", item)) if isinstance(item, dict) else str(item) for item in detail)
+    return str(detail or f"HTTP {response.status_code}")
+
+
 @app.post("/api/exercises/generate", response_model=List[Exercise])
 async def generate_exercises(request: GenerateRequest):
     """AI-generated exercises for a given topic."""
@@ -266,7 +347,7 @@ For each exercise return a JSON object with:
 
 Return a JSON object with key "exercises" containing the array."""
 
-        response = client.chat.completions.create(
+        response = await chat_completion(
             model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
             messages=[
                 {"role": "system", "content": "You are a Python exercise generator. Return valid JSON only."},
@@ -312,7 +393,7 @@ For each question return:
 
 Return a JSON object with key "questions" containing the array."""
 
-        response = client.chat.completions.create(
+        response = await chat_completion(
             model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
             messages=[
                 {"role": "system", "content": "You are a Python quiz generator. Return valid JSON only."},
@@ -390,6 +471,11 @@ async def handle_learning_event(event: dict):
     return {"status": "processed"}
 
 
+async def chat_completion(**params):
+    """Chat completion; identical concurrent requests share one upstream call."""
+    return await llm_flight.do(request_key(params), llm_limit.run, client.chat.completions.create, **params)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
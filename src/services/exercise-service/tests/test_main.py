@@ -1,5 +1,5 @@
 """Tests for the Exercise Service."""
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock, MagicMock
 from fastapi.testclient import TestClient
 
 from app.main import app, quizzes
@@ -184,12 +184,99 @@ def test_grade_exercise_fail(mock_get, mock_post):
     assert data["score"] == 30.0
 
 
+@patch("app.main.requests.post")
+@patch("app.main.requests.get")
+def test_grade_exercise_with_test_cases_uses_batch(mock_get, mock_post):
+    mock_get.return_value = MagicMock(
+        status_code=200,
+        text='{}',
+        json=lambda: {
+            "id": "ex-2", "title": "Double", "description": "Double the input",
+            "module_id": "mod-1",
+            "test_cases": [
+                {"input": "2\n", "expected_output": "4"},
+                {"input": "5\n", "expected_output": "10"},
+            ],
+        },
+    )
+    mock_post.return_value = MagicMock(
+        status_code=200,
+        json=lambda: {"results": [
+            {"output": "4\n", "error": "", "exit_code": 0},
+            {"output": "25\n", "error": "", "exit_code": 0},
+        ]},
+    )
+
+    response = client.post("/api/exercises/ex-2/grade", json={
+        "user_id": "user-1",
+        "code": "n = int(input())\nprint(n * n)",
+    })
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["passed"] is False
+    assert data["score"] == 50.0
+    assert "Passed 1/2" in data["feedback"]
+    exec_call = mock_post.call_args_list[0]
+    assert exec_call[0][0].endswith("/execute/batch")
+    assert exec_call[1]["json"]["cases"][1]["stdin"] == "5\n"
+
+
+@patch("app.main.EXEC_BATCH_MAX_CASES", 2)
+@patch("app.main.requests.post")
+@patch("app.main.requests.get")
+def test_grade_splits_cases_and_reports_silent_crashes(mock_get, mock_post):
+    mock_get.return_value = MagicMock(
+        status_code=200,
+        text='{}',
+        json=lambda: {
+            "id": "ex-3", "title": "Echo", "description": "Echo the input", "module_id": "mod-1",
+            "test_cases": [{"input": f"{n}\n", "expected_output": str(n)} for n in range(3)],
+        },
+    )
+    mock_post.side_effect = [
+        MagicMock(status_code=200, json=lambda: {"results": [
+            {"output": "0\n", "error": "", "exit_code": 0},
+            {"output": "", "error": "  \n", "exit_code": 2},
+        ]}),
+        MagicMock(status_code=200, json=lambda: {"results": [{"output": "2\n", "error": "", "exit_code": 0}]}),
+        MagicMock(status_code=200),
+    ]
+
+    data = client.post("/api/exercises/ex-3/grade", json={"user_id": "user-1", "code": "print(input())"}).json()
+
+    batches = [c[1]["json"]["cases"] for c in mock_post.call_args_list if c[0][0].endswith("/execute/batch")]
+    assert [len(cases) for cases in batches] == [2, 1]
+    assert data["score"] == 66.7
+    assert "Test 2: exited with code 2" in data["feedback"]
+
+
+@patch("app.main.requests.post")
+@patch("app.main.requests.get")
+def test_grade_reports_rejected_batch(mock_get, mock_post):
+    mock_get.return_value = MagicMock(
+        status_code=200,
+        text='{}',
+        json=lambda: {
+            "id": "ex-4", "title": "Echo", "description": "Echo", "module_id": "mod-1",
+            "test_cases": [{"input": "1\n", "expected_output": "1"}],
+        },
+    )
+    mock_post.return_value = MagicMock(
+        status_code=422, json=lambda: {"detail": [{"msg": "List should have at most 32 items"}]},
+    )
+
+    data = client.post("/api/exercises/ex-4/grade", json={"user_id": "user-1", "code": "print(1)"}).json()
+
+    assert data["feedback"] == "Code execution error: List should have at most 32 items"
+
+
 @patch("app.main.client")
 def test_generate_exercises(mock_openai):
     mock_response = MagicMock()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = '{"exercises": [{"title": "Sum", "description": "Add two numbers", "starter_code": "# code here", "expected_output": "5", "hints": ["Use +"]}]}'
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
 
     response = client.post("/api/exercises/generate", json={
         "topic": "arithmetic",
@@ -207,7 +294,7 @@ def test_generate_quiz(mock_openai):
     mock_response = MagicMock()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = '{"questions": [{"question": "What is 1+1?", "options": ["1", "2", "3", "4"], "correct_answer": 1, "explanation": "Basic math"}]}'
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
 
     response = client.post("/api/quizzes/generate", json={
         "module_id": "mod-1",
@@ -227,7 +314,7 @@ def test_submit_quiz(mock_openai):
     mock_response = MagicMock()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = '{"questions": [{"question": "Q1", "options": ["A", "B", "C", "D"], "correct_answer": 1, "explanation": "B is correct"}]}'
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
 
     gen_response = client.post("/api/quizzes/generate", json={
         "module_id": "mod-1",
@@ -261,3 +348,33 @@ def test_handle_learning_event():
     })
     assert response.status_code == 200
     assert response.json()["status"] == "processed"
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_concurrent_identical_quiz_requests_share_one_llm_call(mock_openai, mock_post):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = '{"questions": [{"question": "Q1", "options": ["A", "B"], "correct_answer": 0, "explanation": ""}]}'
+
+    async def slow_create(**params):
+        await asyncio.sleep(0.2)
+        return mock_response
+
+    mock_openai.chat.completions.create = AsyncMock(side_effect=slow_create)
+    mock_post.return_value = MagicMock(status_code=200)
+    before = client.get("/metrics").json()["singleflight"]["collapsed"]
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        responses = list(executor.map(
+            lambda _: client.post('/api/quizzes/generate', json={'module_id': 'mod-4', 'topic': 'decorators', 'num_questions': 1}), range(5)
+        ))
+
+    assert all(r.status_code == 200 for r in responses)
+    assert mock_openai.chat.completions.create.call_count == 1
+    stats = client.get("/metrics").json()["singleflight"]
+    assert stats["collapsed"] == before + 4
+    assert stats["in_flight"] == 0
@@ -7,8 +7,8 @@ import os
 import requests
 import time
 
-from openai import OpenAI
 from app.curriculum import get_all_modules, get_module
+from app.llm import create_client
 
 app = FastAPI(
     title="progress-service",
@@ -28,8 +28,13 @@ app.add_middleware(
 DAPR_HTTP_PORT = os.getenv("DAPR_HTTP_PORT", "3500")
 DAPR_BASE_URL = f"http://localhost:{DAPR_HTTP_PORT}"
 
-# OpenAI configuration
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# OpenAI configuration: one async client per process with pooled HTTP/2
+# connections; OPENAI_TIMEOUT bounds each request
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+client = create_client(
+    os.getenv("OPENAI_API_KEY"), OPENAI_MAX_CONCURRENCY, OPENAI_TIMEOUT, os.getenv("OPENAI_BASE_URL") or None
+)
 
 # In-memory storage for local dev (Dapr state store for K8s)
 user_progress: Dict[str, dict] = {}
@@ -100,6 +105,12 @@ def calculate_mastery(module_data: dict) -> float:
     )
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    """Close the pooled OpenAI connections."""
+    await client.close()
+
+
 @app.get("/health")
 async def health():
     return {"status": "healthy", "service": "progress-service"}
@@ -109,7 +120,7 @@ async def health():
 async def subscribe():
     return [
         {"pubsubname": "pubsub", "topic": "learning.events", "route": "/events/learning"},
-        {"pubsubname": "pubsub", "topic": "code.submitted", "route": "/events/code"},
+        {"pubsubname": "pubsub", "topic": "code.executed", "route": "/events/code"},
     ]
 
 
@@ -27,7 +27,7 @@ def test_dapr_subscribe():
     assert len(subs) == 2
     topics = [s["topic"] for s in subs]
     assert "learning.events" in topics
-    assert "code.submitted" in topics
+    assert "code.executed" in topics
 
 
 def test_list_curriculum():
@@ -0,0 +1,184 @@
+"""Fast-path router: a local classifier that answers obvious triage questions without the LLM."""
+from collections import Counter
+import json
+import math
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Example = Tuple[str, str]
+
+# Regex features; each one that matches adds a pseudo-token ("#name") whose
+# weight per route is learned from the seed examples like any other word
+FEATURES = {
+    "traceback": re.compile(r"Traceback \(most recent call last\)|File \"[^\"]*\", line \d+"),
+    "exception": re.compile(r"\b[A-Z]\w*(?:Error|Exception)\b"),
+    "code": re.compile(r"```|^\s*(?:def|class|for|while|if|import|print)\b|\bprint\(", re.MULTILINE),
+    "run": re.compile(r"\b(?:run|running|execute|output|outputs|print)\b", re.IGNORECASE),
+    "definition": re.compile(
+        r"^\s*(?:what|why|how)\s+(?:is|are|does|do)\b|\bexplain\b|\bdifference between\b", re.IGNORECASE
+    ),
+    "practice": re.compile(r"\b(?:exercises?|practi[cs]e|challenge|quiz|problem)\b", re.IGNORECASE),
+    "review": re.compile(
+        r"\b(?:review|feedback|improve|cleaner|refactor|critique|pythonic|best practices?|readable)\b",
+        re.IGNORECASE,
+    ),
+    "progress": re.compile(
+        r"\b(?:my (?:progress|mastery|score|stats|streak)|how am i doing|have i (?:learned|completed|finished))\b",
+        re.IGNORECASE,
+    ),
+}
+_WORD = re.compile(r"[a-z_][a-z0-9_']*")
+
+# Routes the fast path never picks for questions matching the pattern: code
+# that fails needs explaining, and running it again won't do that
+EXCLUDED_ROUTES = {
+    "code-execution-service": re.compile(
+        r"\b(?:errors?|exceptions?|traceback|crash\w*|bugs?|fail\w*|wrong|broken)\b|\w(?:Error|Exception)\b",
+        re.IGNORECASE,
+    ),
+}
+
+
+def features(text: str) -> List[str]:
+    """Lower-cased words plus one pseudo-token per matching regex feature."""
+    tokens = _WORD.findall(text.lower())
+    tokens.extend(f"#{name}" for name, pattern in FEATURES.items() if pattern.search(text))
+    return tokens
+
+
+def load_examples(path: str) -> List[Example]:
+    """(question, route) pairs from a JSON-lines seed file."""
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row["question"], row["route_to"]) for row in rows]
+
+
+class FastPathClassifier:
+    """Multinomial naive Bayes over `features`, trained once from seed examples.
+
+    `classify` returns a route only when its posterior reaches `threshold`
+    and the question shares at least one feature with the training data;
+    everything else is left to the LLM. `EXCLUDED_ROUTES` are dropped
+    without renormalising, so their share counts against the others.
+    """
+
+    def __init__(self, examples: Iterable[Example], threshold: float = 0.9, alpha: float = 0.5):
+        self.threshold = threshold
+        counts: Dict[str, Counter] = {}
+        documents: Counter = Counter()
+        for question, route in examples:
+            counts.setdefault(route, Counter()).update(features(question))
+            documents[route] += 1
+        self.routes = sorted(counts)
+        self.vocabulary = set().union(*counts.values()) if counts else set()
+        total = sum(documents.values())
+        size = len(self.vocabulary)
+        self._prior = {route: math.log(documents[route] / total) for route in self.routes}
+        self._unseen = {}
+        self._likelihood = {}
+        for route in self.routes:
+            denominator = sum(counts[route].values()) + alpha * size
+            self._unseen[route] = math.log(alpha / denominator)
+            self._likelihood[route] = {
+                token: math.log((n + alpha) / denominator) for token, n in counts[route].items()
+            }
+
+    def probabilities(self, question: str) -> Dict[str, float]:
+        """Posterior per route; empty when no feature of the question was seen in training."""
+        tokens = [token for token in features(question) if token in self.vocabulary]
+        if not tokens:
+            return {}
+        scores = {}
+        for route in self.routes:
+            likelihood, unseen = self._likelihood[route], self._unseen[route]
+            scores[route] = self._prior[route] + sum(likelihood.get(token, unseen) for token in tokens)
+        top = max(scores.values())
+        weights = {route: math.exp(score - top) for route, score in scores.items()}
+        norm = sum(weights.values())
+        return {route: weight / norm for route, weight in weights.items()}
+
+    def predict(self, question: str) -> Optional[Tuple[str, float]]:
+        """Most likely route and its posterior, whatever the confidence."""
+        posterior = {
+            route: p for route, p in self.probabilities(question).items()
+            if route not in EXCLUDED_ROUTES or not EXCLUDED_ROUTES[route].search(question)
+        }
+        if not posterior:
+            return None
+        route = max(posterior, key=posterior.get)
+        return route, posterior[route]
+
+    def classify(self, question: str) -> Optional[Tuple[str, float]]:
+        """Route and confidence when confident enough to skip the LLM, else None."""
+        prediction = self.predict(question)
+        if prediction and prediction[1] >= self.threshold:
+            return prediction
+        return None
+
+
+class FastPathStats:
+    """Fast-path rate, agreement with the LLM and latency of both paths."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fast_path = 0
+        self.llm = 0
+        self.classified = 0
+        self.classify_seconds = 0.0
+        self.classify_max = 0.0
+        self.llm_seconds = 0.0
+        # Fast-path answers re-checked by the LLM in the background
+        self.shadow_checked = 0
+        self.shadow_agreed = 0
+        # Below-threshold predictions compared with the LLM answer that replaced them
+        self.deferred_checked = 0
+        self.deferred_agreed = 0
+
+    def record_classify(self, seconds: float, answered: bool):
+        with self._lock:
+            self.classified += 1
+            self.classify_seconds += seconds
+            self.classify_max = max(self.classify_max, seconds)
+            if answered:
+                self.fast_path += 1
+
+    def record_llm(self, seconds: float, predicted: Optional[str], route: str):
+        with self._lock:
+            self.llm += 1
+            self.llm_seconds += seconds
+            if predicted is not None:
+                self.deferred_checked += 1
+                self.deferred_agreed += predicted == route
+
+    def record_shadow(self, fast_route: str, llm_route: str):
+        with self._lock:
+            self.shadow_checked += 1
+            self.shadow_agreed += fast_route == llm_route
+
+    def stats(self) -> dict:
+        with self._lock:
+            questions = self.fast_path + self.llm
+            return {
+                "questions": questions,
+                "fast_path": self.fast_path,
+                "llm": self.llm,
+                "fast_path_rate": round(self.fast_path / questions, 4) if questions else 0.0,
+                "agreement": {
+                    "shadow_checked": self.shadow_checked,
+                    "shadow_agreed": self.shadow_agreed,
+                    "shadow_rate": _ratio(self.shadow_agreed, self.shadow_checked),
+                    "deferred_checked": self.deferred_checked,
+                    "deferred_agreed": self.deferred_agreed,
+                    "deferred_rate": _ratio(self.deferred_agreed, self.deferred_checked),
+                },
+                "latency": {
+                    "classify_avg_us": round(self.classify_seconds / self.classified * 1e6, 1) if self.classified else 0.0,
+                    "classify_max_us": round(self.classify_max * 1e6, 1),
+                    "llm_avg_ms": round(self.llm_seconds / self.llm * 1e3, 1) if self.llm else 0.0,
+                },
+            }
+
+
+def _ratio(part: int, whole: int) -> Optional[float]:
+    return round(part / whole, 4) if whole else None
@@ -1,11 +1,18 @@
 """Triage Service - AI agent for analyzing learner struggles."""
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+import asyncio
+import json
 import os
+import random
 import requests
+import time
 
-from openai import OpenAI
+from app.fastpath import FastPathClassifier, FastPathStats, load_examples
+from app.llm import ConcurrencyLimit, create_client
+from app.phrases import ReloadingPhraseMatcher
+from app.singleflight import SingleFlight, request_key
 
 app = FastAPI(
     title="triage-service",
@@ -25,8 +32,27 @@ app.add_middleware(
 DAPR_HTTP_PORT = os.getenv("DAPR_HTTP_PORT", "3500")
 DAPR_BASE_URL = f"http://localhost:{DAPR_HTTP_PORT}"
 
-# OpenAI configuration
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# OpenAI configuration: one async client per process with pooled HTTP/2
+# connections; OPENAI_TIMEOUT bounds each request
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+client = create_client(
+    os.getenv("OPENAI_API_KEY"), OPENAI_MAX_CONCURRENCY, OPENAI_TIMEOUT, os.getenv("OPENAI_BASE_URL") or None
+)
+llm_limit = ConcurrencyLimit(OPENAI_MAX_CONCURRENCY)
+llm_flight = SingleFlight()
+
+# Fast path: questions the local classifier routes with at least
+# TRIAGE_FASTPATH_THRESHOLD confidence skip the LLM; a TRIAGE_FASTPATH_SHADOW_RATE
+# sample of them is re-checked by the LLM in the background to measure agreement
+FASTPATH_ENABLED = os.getenv("TRIAGE_FASTPATH_ENABLED", "true").lower() == "true"
+FASTPATH_THRESHOLD = float(os.getenv("TRIAGE_FASTPATH_THRESHOLD", "0.95"))
+FASTPATH_SHADOW_RATE = float(os.getenv("TRIAGE_FASTPATH_SHADOW_RATE", "0.05"))
+FASTPATH_SEED = os.getenv(
+    "TRIAGE_FASTPATH_SEED", os.path.join(os.path.dirname(__file__), "triage_seed.jsonl")
+)
+fast_path = FastPathClassifier(load_examples(FASTPATH_SEED), FASTPATH_THRESHOLD)
+fast_path_stats = FastPathStats()
 
 STRUGGLE_KEYWORDS = [
     "i don't understand", "i'm stuck", "help me", "confused",
@@ -34,6 +60,14 @@ STRUGGLE_KEYWORDS = [
     "i'm lost", "too hard", "give up",
 ]
 
+# Struggle phrases: compiled into one automaton from TRIAGE_STRUGGLE_PHRASES
+# (STRUGGLE_KEYWORDS if unreadable), rebuilt when the file changes
+STRUGGLE_PHRASES_PATH = os.getenv(
+    "TRIAGE_STRUGGLE_PHRASES", os.path.join(os.path.dirname(__file__), "struggle_phrases.txt")
+)
+STRUGGLE_RELOAD_SECONDS = float(os.getenv("TRIAGE_STRUGGLE_RELOAD_SECONDS", "30"))
+struggle_phrases = ReloadingPhraseMatcher(STRUGGLE_PHRASES_PATH, STRUGGLE_KEYWORDS, STRUGGLE_RELOAD_SECONDS)
+
 SYSTEM_PROMPT = """You are the Triage Agent for LearnFlow, an AI-powered Python learning platform.
 Your role is to analyze student questions and struggles, then route them to the appropriate service:
 - If the student needs a concept explained -> route to "concepts-service"
@@ -50,6 +84,34 @@ Respond with a JSON object containing:
 - "suggestion": a helpful suggestion for the student
 """
 
+# Analysis and suggestion sent with fast-path answers
+ROUTE_REPLIES = {
+    "concepts-service": (
+        "You're asking how a Python concept works.",
+        "Read the explanation, then try the code example yourself.",
+    ),
+    "exercise-service": (
+        "You want to practice with a coding exercise.",
+        "Attempt the exercise on your own before asking for hints.",
+    ),
+    "code-execution-service": (
+        "You want to run some code and see its output.",
+        "Predict the output before running it, then compare.",
+    ),
+    "debug-service": (
+        "Your code has an error or isn't behaving as expected.",
+        "Read the last line of the error message first; it names the problem.",
+    ),
+    "code-review-service": (
+        "You'd like feedback on your code.",
+        "Focus on one suggestion at a time and re-run your code after each change.",
+    ),
+    "progress-service": (
+        "You're asking about your learning progress.",
+        "Review your weakest topics first to raise your overall mastery.",
+    ),
+}
+
 
 class TriageRequest(BaseModel):
     question: str
@@ -64,12 +126,29 @@ class TriageResponse(BaseModel):
     suggestion: str
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    """Close the pooled OpenAI connections."""
+    await client.close()
+
+
 @app.get("/health")
 async def health():
     """Health check endpoint."""
     return {"status": "healthy", "service": "triage-service"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """LLM concurrency, request coalescing and fast-path statistics."""
+    return {
+        "llm": llm_limit.stats(),
+        "singleflight": llm_flight.stats(),
+        "fast_path": {**fast_path_stats.stats(), "enabled": FASTPATH_ENABLED, "threshold": fast_path.threshold},
+        "struggle_phrases": struggle_phrases.stats(),
+    }
+
+
 @app.get("/dapr/subscribe")
 async def subscribe():
     """Dapr pub/sub subscriptions."""
@@ -80,39 +159,36 @@ async def subscribe():
 
 @app.post("/triage", response_model=TriageResponse)
 @app.post("/api/triage", response_model=TriageResponse, include_in_schema=False)
-async def triage_question(request: TriageRequest):
+async def triage_question(request: TriageRequest, background_tasks: BackgroundTasks = None):
     """Analyze a student question and route to appropriate service."""
-    # Detect struggle keywords
-    question_lower = request.question.lower()
-    is_struggling = any(kw in question_lower for kw in STRUGGLE_KEYWORDS)
+    # Detect struggle phrases
+    matches = struggle_phrases.find_all(request.question)
 
-    if is_struggling and request.user_id:
-        try:
-            requests.post(
-                f"{DAPR_BASE_URL}/v1.0/publish/pubsub/struggle.detected",
-                json={
-                    "user_id": request.user_id,
-                    "struggle_type": "verbal_expression",
-                    "details": {"message": request.question},
-                },
+    if matches and request.user_id:
+        await asyncio.to_thread(_publish_struggle, request, matches)
+
+    prediction = None
+    if FASTPATH_ENABLED:
+        started = time.perf_counter()
+        prediction = fast_path.predict(request.question)
+        confident = prediction is not None and prediction[1] >= fast_path.threshold
+        fast_path_stats.record_classify(time.perf_counter() - started, confident)
+        if confident:
+            route_to, confidence = prediction
+            if background_tasks is not None and random.random() < FASTPATH_SHADOW_RATE:
+                background_tasks.add_task(shadow_check, request.question, route_to)
+            await asyncio.to_thread(_publish_triage, request, route_to, "fast_path")
+            analysis, suggestion = ROUTE_REPLIES.get(route_to, ROUTE_REPLIES["concepts-service"])
+            return TriageResponse(
+                analysis=analysis,
+                route_to=route_to,
+                confidence=round(confidence, 4),
+                suggestion=suggestion,
             )
-        except Exception:
-            pass
 
     try:
-        import json
-
-        response = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": request.question}
-            ],
-            response_format={"type": "json_object"}
-        )
-
-        content = response.choices[0].message.content
-        result = json.loads(content) if content else {}
+        started = time.perf_counter()
+        result = await llm_triage(request.question)
 
         analysis = result.get("analysis") or "Your question has been received."
         route_to = result.get("route_to") or "concepts-service"
@@ -123,20 +199,11 @@ async def triage_question(request: TriageRequest):
             confidence = 0.5
         confidence = max(0.0, min(1.0, confidence))
         suggestion = result.get("suggestion") or "Try asking a specific Python question to get started!"
+        fast_path_stats.record_llm(
+            time.perf_counter() - started, prediction[0] if prediction else None, route_to
+        )
 
-        # Publish triage event via Dapr
-        try:
-            requests.post(
-                f"{DAPR_BASE_URL}/v1.0/publish/pubsub/learning.events",
-                json={
-                    "type": "triage",
-                    "user_id": request.user_id,
-                    "question": request.question,
-                    "route_to": route_to,
-                }
-            )
-        except Exception:
-            pass
+        await asyncio.to_thread(_publish_triage, request, route_to, "llm")
 
         return TriageResponse(
             analysis=analysis,
@@ -155,6 +222,75 @@ async def triage_question(request: TriageRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/triage/struggle-phrases/reload")
+async def reload_struggle_phrases():
+    """Rebuild the struggle-phrase automaton from its file now."""
+    reloaded = struggle_phrases.reload(force=True)
+    return {"reloaded": reloaded, **struggle_phrases.stats()}
+
+
+async def llm_triage(question: str) -> dict:
+    """The LLM's routing decision as parsed JSON."""
+    response = await chat_completion(
+        model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": question}
+        ],
+        response_format={"type": "json_object"}
+    )
+    content = response.choices[0].message.content
+    return json.loads(content) if content else {}
+
+
+async def shadow_check(question: str, route_to: str):
+    """Ask the LLM about a fast-path question and record whether it agrees."""
+    try:
+        result = await llm_triage(question)
+    except Exception:
+        return
+    fast_path_stats.record_shadow(route_to, result.get("route_to") or "concepts-service")
+
+
+def _publish_triage(request: TriageRequest, route_to: str, source: str):
+    """Publish the triage event via Dapr."""
+    try:
+        requests.post(
+            f"{DAPR_BASE_URL}/v1.0/publish/pubsub/learning.events",
+            json={
+                "type": "triage",
+                "user_id": request.user_id,
+                "question": request.question,
+                "route_to": route_to,
+                "source": source,
+            },
+            timeout=2,
+        )
+    except Exception:
+        pass
+
+
+def _publish_struggle(request: TriageRequest, matches):
+    """Publish the struggle phrases found in a question to struggle.detected via Dapr."""
+    try:
+        requests.post(
+            f"{DAPR_BASE_URL}/v1.0/publish/pubsub/struggle.detected",
+            json={
+                "user_id": request.user_id,
+                "struggle_type": "verbal_expression",
+                "details": {
+                    "message": request.question,
+                    "phrases": [
+                        {"phrase": m.phrase, "start": m.start, "end": m.end} for m in matches
+                    ],
+                },
+            },
+            timeout=2,
+        )
+    except Exception:
+        pass
+
+
 @app.post("/events/struggle")
 async def handle_struggle_event(event: dict):
     """Handle struggle detection events from other services."""
@@ -173,6 +309,11 @@ async def handle_struggle_event(event: dict):
         return {"status": "processed"}
 
 
+async def chat_completion(**params):
+    """Chat completion; identical concurrent requests share one upstream call."""
+    return await llm_flight.do(request_key(params), llm_limit.run, client.chat.completions.create, **params)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,190 @@
+"""Struggle-phrase matching: an Aho-Corasick automaton that finds every phrase in one pass."""
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# One-to-one character normalization applied after casefold, so offsets
+# into the normalized text are offsets into the original
+_NORMALIZE = str.maketrans({
+    "\u2018": "'", "\u2019": "'", "\u02bc": "'", "`": "'",
+    "\t": " ", "\n": " ", "\r": " ", "\u00a0": " ",
+})
+# Cap on transitions cached by `PhraseMatcher._step`
+_MEMO_LIMIT = 100_000
+
+
+class Match(NamedTuple):
+    phrase: str
+    start: int
+    end: int
+
+
+def normalize(text: str) -> str:
+    return text.casefold().translate(_NORMALIZE)
+
+
+def load_phrases(path: str) -> List[str]:
+    """One phrase per line; blank lines and `#` comments are skipped."""
+    with open(path, encoding="utf-8") as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+class PhraseMatcher:
+    """Case-insensitive multi-phrase matcher, compiled once from a phrase list.
+
+    `find_all` reports every occurrence of every phrase, overlapping ones
+    included, with offsets into the original text, in time linear in the
+    text length whatever the number of phrases. Like `phrase in text`,
+    phrases match anywhere, not only on word boundaries.
+    """
+
+    def __init__(self, phrases: Iterable[str]):
+        self.phrases: List[str] = []
+        self._lengths: List[int] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._out: List[Tuple[int, ...]] = [()]
+        self._memoized = 0
+        seen = set()
+        for phrase in phrases:
+            key = normalize(phrase.strip())
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            self._add(key, len(self.phrases))
+            self.phrases.append(phrase.strip())
+            self._lengths.append(len(key))
+        self._link()
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def find_all(self, text: str) -> List[Match]:
+        folded = normalize(text)
+        origin = None
+        if len(folded) != len(text):
+            # Some character casefolds to several (e.g. "ß" -> "ss"): map back per character
+            folded, origin = self._fold_with_origin(text)
+
+        goto, out, lengths, phrases = self._goto, self._out, self._lengths, self.phrases
+        matches = []
+        node = 0
+        for i, char in enumerate(folded):
+            following = goto[node].get(char)
+            node = self._step(node, char) if following is None else following
+            if out[node]:
+                for index in out[node]:
+                    start = i + 1 - lengths[index]
+                    if origin is None:
+                        matches.append(Match(phrases[index], start, i + 1))
+                    else:
+                        matches.append(Match(phrases[index], origin[start], origin[i] + 1))
+        return matches
+
+    def search(self, text: str) -> bool:
+        """Whether any phrase occurs in `text`."""
+        return bool(self.find_all(text))
+
+    def _add(self, key: str, index: int):
+        node = 0
+        for char in key:
+            following = self._goto[node].get(char)
+            if following is None:
+                following = len(self._goto)
+                self._goto[node][char] = following
+                self._goto.append({})
+                self._out.append(())
+            node = following
+        self._out[node] += (index,)
+
+    def _link(self):
+        """Breadth-first failure links; each node's output also gets its suffixes' outputs."""
+        self._fail = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._out[child] += self._out[self._fail[child]]
+                queue.append(child)
+
+    def _step(self, node: int, char: str) -> int:
+        """Follow failure links for a transition the trie lacks, and remember the result."""
+        current = node
+        while current and char not in self._goto[current]:
+            current = self._fail[current]
+        target = self._goto[current].get(char, 0)
+        if self._memoized < _MEMO_LIMIT:
+            self._goto[node][char] = target
+            self._memoized += 1
+        return target
+
+    @staticmethod
+    def _fold_with_origin(text: str) -> Tuple[str, List[int]]:
+        chars: List[str] = []
+        origin: List[int] = []
+        for i, char in enumerate(text):
+            for folded in normalize(char):
+                chars.append(folded)
+                origin.append(i)
+        return "".join(chars), origin
+
+
+class ReloadingPhraseMatcher:
+    """A PhraseMatcher over a phrase file, rebuilt when the file changes.
+
+    The file's mtime is checked at most every `interval` seconds. A missing
+    or unreadable file keeps the previous phrases (initially `defaults`).
+    """
+
+    def __init__(self, path: Optional[str], defaults: Iterable[str], interval: float = 30.0):
+        self.path = path
+        self.interval = interval
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._matcher = PhraseMatcher(defaults)
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self.reload()
+
+    @property
+    def matcher(self) -> PhraseMatcher:
+        if self.path and time.monotonic() - self._checked_at >= self.interval:
+            self.reload()
+        return self._matcher
+
+    def find_all(self, text: str) -> List[Match]:
+        return self.matcher.find_all(text)
+
+    def reload(self, force: bool = False) -> bool:
+        """Rebuild from the file if it changed (or always, with `force`); True if rebuilt."""
+        if not self.path:
+            return False
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime
+                if mtime == self._mtime and not force:
+                    return False
+                matcher = PhraseMatcher(load_phrases(self.path))
+            except OSError as e:
+                self.last_error = str(e)
+                return False
+            # Swapped in whole, so concurrent readers see the old or the new automaton
+            self._matcher = matcher
+            self._mtime = mtime
+            self.reloads += 1
+            self.last_error = None
+            return True
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "phrases": len(self._matcher),
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
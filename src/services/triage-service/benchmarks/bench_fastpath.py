@@ -0,0 +1,56 @@
+"""Fast-path classifier: coverage, precision and latency per confidence threshold.
+
+Leave-one-out over the seed file: each question is classified by a model
+trained on all the others, so the numbers estimate how the fast path
+behaves on questions it has not seen. Use it to pick
+TRIAGE_FASTPATH_THRESHOLD after editing the seed.
+
+Run from the service directory:
+
+    python benchmarks/bench_fastpath.py --thresholds 0.8 0.9 0.95 0.98
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.fastpath import FastPathClassifier, load_examples  # noqa: E402
+
+SEED = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "triage_seed.jsonl")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", default=SEED)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.8, 0.9, 0.95, 0.98])
+    args = parser.parse_args()
+
+    examples = load_examples(args.seed)
+    predictions = []
+    for i, (question, route) in enumerate(examples):
+        model = FastPathClassifier(examples[:i] + examples[i + 1:])
+        predictions.append((model.predict(question), route))
+
+    print(f"{len(examples)} seed questions, leave-one-out")
+    print(f"{'threshold':>9} {'fast-path':>9} {'precision':>9} {'wrong':>5}")
+    for threshold in args.thresholds:
+        answered = [(p, route) for p, route in predictions if p and p[1] >= threshold]
+        correct = sum(p[0] == route for p, route in answered)
+        precision = correct / len(answered) if answered else 0.0
+        print(f"{threshold:>9.2f} {len(answered) / len(examples):>9.1%} {precision:>9.1%} {len(answered) - correct:>5}")
+
+    model = FastPathClassifier(examples)
+    questions = [question for question, _ in examples]
+    rounds = 50
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for question in questions:
+            model.classify(question)
+    elapsed = time.perf_counter() - started
+    print(f"classify: {elapsed / (rounds * len(questions)) * 1e6:.1f} us/question")
+
+
+if __name__ == "__main__":
+    main()
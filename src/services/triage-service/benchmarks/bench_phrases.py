@@ -0,0 +1,119 @@
+"""Struggle-phrase matching: one Aho-Corasick pass vs per-phrase substring scans.
+
+Builds a dictionary of N synthetic phrases (mixed scripts) and long
+"pasted" questions (code, a traceback and prose), then times:
+
+  any-in     any(phrase in text) -- the old check; a yes/no answer only
+  find-all   str.find per phrase, looping to collect every offset
+  regex      one alternation of all phrases (leftmost, non-overlapping)
+  automaton  PhraseMatcher.find_all (every match, overlapping, with offsets)
+
+Run from the service directory:
+
+    python benchmarks/bench_phrases.py --phrases 1000 --sizes 1000 10000 50000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.phrases import PhraseMatcher, normalize  # noqa: E402
+
+WORDS = (
+    "loop list tuple dict error stuck help please why what how function class return value index "
+    "string print variable code range key import module understand lost confused hard "
+    "entiendo perdido comprends bloqué verstehe weiter difícil samajh nahi 明白 懂 难 卡住"
+).split()
+
+PASTE = '''def average(values):
+    total = 0
+    for v in values:
+        total += v
+    return total / len(values)
+
+print(average([]))
+Traceback (most recent call last):
+  File "main.py", line 7, in <module>
+    print(average([]))
+ZeroDivisionError: division by zero
+I tried changing the loop but I still get the same error, not sure what is wrong here.
+'''
+
+
+def make_phrases(count: int, rng: random.Random):
+    phrases = set()
+    while len(phrases) < count:
+        phrases.add(" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))))
+    return sorted(phrases)
+
+
+def make_text(size: int, phrases, rng: random.Random) -> str:
+    parts = []
+    length = 0
+    while length < size:
+        part = rng.choice(phrases) if rng.random() < 0.02 else PASTE
+        parts.append(part)
+        length += len(part)
+    return " ".join(parts)[:size]
+
+
+def any_in(phrases, text):
+    lower = normalize(text)
+    return any(p in lower for p in phrases)
+
+
+def find_all(phrases, text):
+    lower = normalize(text)
+    matches = []
+    for p in phrases:
+        i = lower.find(p)
+        while i != -1:
+            matches.append((p, i, i + len(p)))
+            i = lower.find(p, i + 1)
+    return matches
+
+
+def timed(fn, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--phrases", type=int, default=1000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    phrases = make_phrases(args.phrases, rng)
+    keys = [normalize(p) for p in phrases]
+
+    started = time.perf_counter()
+    matcher = PhraseMatcher(phrases)
+    build_ms = (time.perf_counter() - started) * 1e3
+    pattern = re.compile("|".join(re.escape(k) for k in sorted(keys, key=len, reverse=True)))
+    print(f"{len(phrases)} phrases; automaton built in {build_ms:.1f} ms")
+    print(f"{'chars':>7} {'matches':>7} {'any-in':>10} {'find-all':>10} {'regex':>10} {'automaton':>10}")
+
+    for size in args.sizes:
+        text = make_text(size, phrases, rng)
+        found = matcher.find_all(text)
+        assert sorted((m.start, m.end) for m in found) == sorted((s, e) for _, s, e in find_all(keys, text))
+        results = [
+            timed(lambda: any_in(keys, text), args.rounds),
+            timed(lambda: find_all(keys, text), args.rounds),
+            timed(lambda: list(pattern.finditer(normalize(text))), args.rounds),
+            timed(lambda: matcher.find_all(text), args.rounds),
+        ]
+        print(f"{size:>7} {len(found):>7} " + " ".join(f"{r * 1e3:>8.2f}ms" for r in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,19 @@
 """Tests for the Triage Service."""
 import json
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock, MagicMock
 from fastapi.testclient import TestClient
 
+from app import main
 from app.main import app
 
 client = TestClient(app)
 
 
+def setup_function():
+    # Most tests exercise the LLM path; fast-path tests re-enable the classifier
+    main.FASTPATH_ENABLED = False
+
+
 def test_health():
     response = client.get("/health")
     assert response.status_code == 200
@@ -36,7 +42,7 @@ def test_triage_question(mock_openai, mock_post):
         "confidence": 0.9,
         "suggestion": "Try reviewing for loop syntax",
     })
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
     mock_post.return_value = MagicMock(status_code=200)
 
     response = client.post("/triage", json={
@@ -62,7 +68,7 @@ def test_triage_routes_to_exercise(mock_openai, mock_post):
         "confidence": 0.85,
         "suggestion": "Try a coding exercise",
     })
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
     mock_post.return_value = MagicMock(status_code=200)
 
     response = client.post("/triage", json={
@@ -84,7 +90,7 @@ def test_triage_publishes_dapr_event(mock_openai, mock_post):
         "confidence": 0.5,
         "suggestion": "test",
     })
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
     mock_post.return_value = MagicMock(status_code=200)
 
     client.post("/triage", json={"question": "test"})
@@ -96,7 +102,7 @@ def test_triage_publishes_dapr_event(mock_openai, mock_post):
 
 @patch("app.main.client")
 def test_triage_error_handling(mock_openai):
-    mock_openai.chat.completions.create.side_effect = Exception("API error")
+    mock_openai.chat.completions.create = AsyncMock(side_effect=Exception("API error"))
 
     response = client.post("/triage", json={"question": "test"})
     assert response.status_code == 500
@@ -113,7 +119,7 @@ def test_handle_struggle_event():
             "confidence": 0.7,
             "suggestion": "help",
         })
-        mock_openai.chat.completions.create.return_value = mock_response
+        mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
         mock_post.return_value = MagicMock(status_code=200)
 
         response = client.post("/events/struggle", json={
@@ -125,3 +131,178 @@ def test_handle_struggle_event():
 
         assert response.status_code == 200
         assert response.json()["status"] == "processed"
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_concurrent_identical_questions_share_one_llm_call(mock_openai, mock_post):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = '{"analysis": "Loops", "route_to": "concepts-service", "confidence": 0.9, "suggestion": "Read up"}'
+
+    async def slow_create(**params):
+        await asyncio.sleep(0.2)
+        return mock_response
+
+    mock_openai.chat.completions.create = AsyncMock(side_effect=slow_create)
+    mock_post.return_value = MagicMock(status_code=200)
+    before = client.get("/metrics").json()["singleflight"]["collapsed"]
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        responses = list(executor.map(
+            lambda _: client.post('/triage', json={'question': 'What is a decorator?'}), range(5)
+        ))
+
+    assert all(r.status_code == 200 for r in responses)
+    assert mock_openai.chat.completions.create.call_count == 1
+    stats = client.get("/metrics").json()["singleflight"]
+    assert stats["collapsed"] == before + 4
+    assert stats["in_flight"] == 0
+
+
+def test_fast_path_classifier_routes_obvious_questions():
+    from app.fastpath import FastPathClassifier, features, load_examples
+
+    classifier = FastPathClassifier(load_examples(main.FASTPATH_SEED), threshold=0.95)
+
+    assert "#traceback" in features('Traceback (most recent call last):\n  File "x.py", line 1')
+    assert classifier.classify("What is a tuple in Python?")[0] == "concepts-service"
+    assert classifier.classify("Run this: print(sum([1, 2]))")[0] == "code-execution-service"
+    assert classifier.classify(
+        'Traceback (most recent call last):\n  File "main.py", line 2, in <module>\nTypeError: bad operand'
+    )[0] == "debug-service"
+    assert classifier.classify("Give me a quiz on dictionaries")[0] == "exercise-service"
+    assert classifier.classify("Show my mastery for loops")[0] == "progress-service"
+    # Nothing learned about the words, or torn between routes: leave it to the LLM
+    assert classifier.classify("hello there") is None
+    assert classifier.classify("Why does this print 5 instead of 6?") is None
+    # Questions about an error go to debugging, never to be run again
+    assert classifier.classify("print(1/0) gives an error, what does it mean?")[0] == "debug-service"
+    assert classifier.predict("My code crashes, run it")[0] != "code-execution-service"
+
+
+@patch("app.main.FASTPATH_ENABLED", True)
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_fast_path_answers_without_the_llm(mock_openai, mock_post):
+    mock_openai.chat.completions.create = AsyncMock(side_effect=AssertionError("LLM called"))
+    mock_post.return_value = MagicMock(status_code=200)
+    before = client.get("/metrics").json()["fast_path"]
+
+    response = client.post("/triage", json={"question": "What is a tuple?", "user_id": "user-1"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["route_to"] == "concepts-service"
+    assert data["confidence"] >= main.FASTPATH_THRESHOLD
+    event = mock_post.call_args.kwargs["json"]
+    assert event["route_to"] == "concepts-service" and event["source"] == "fast_path"
+    stats = client.get("/metrics").json()["fast_path"]
+    assert stats["fast_path"] == before["fast_path"] + 1
+    assert stats["latency"]["classify_max_us"] > 0
+
+
+@patch("app.main.FASTPATH_ENABLED", True)
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_ambiguous_questions_go_to_the_llm_and_are_scored(mock_openai, mock_post):
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = json.dumps({
+        "analysis": "Off-by-one in range", "route_to": "debug-service", "confidence": 0.8, "suggestion": "Check range",
+    })
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
+    mock_post.return_value = MagicMock(status_code=200)
+    before = client.get("/metrics").json()["fast_path"]
+
+    response = client.post("/triage", json={"question": "Why does this print 5 instead of 6?"})
+
+    assert response.json()["route_to"] == "debug-service"
+    assert mock_openai.chat.completions.create.call_count == 1
+    stats = client.get("/metrics").json()["fast_path"]
+    assert stats["llm"] == before["llm"] + 1
+    assert stats["agreement"]["deferred_checked"] == before["agreement"]["deferred_checked"] + 1
+
+
+@patch("app.main.FASTPATH_ENABLED", True)
+@patch("app.main.FASTPATH_SHADOW_RATE", 1.0)
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_shadow_check_measures_agreement_with_the_llm(mock_openai, mock_post):
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = json.dumps({"route_to": "exercise-service"})
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
+    mock_post.return_value = MagicMock(status_code=200)
+    before = client.get("/metrics").json()["fast_path"]["agreement"]
+
+    response = client.post("/triage", json={"question": "Give me a coding exercise for loops"})
+
+    assert response.json()["route_to"] == "exercise-service"
+    assert mock_openai.chat.completions.create.call_count == 1
+    agreement = client.get("/metrics").json()["fast_path"]["agreement"]
+    assert agreement["shadow_checked"] == before["shadow_checked"] + 1
+    assert agreement["shadow_agreed"] == before["shadow_agreed"] + 1
+
+
+def test_phrase_matcher_finds_every_phrase_with_offsets():
+    from app.phrases import PhraseMatcher
+
+    matcher = PhraseMatcher(["I don't understand", "stuck", "i'm stuck", "no entiendo", "我不明白", "ß"])
+    text = "Help, I’M STUCK.\nI don't  understand... no entiendo 我不明白 Straße"
+
+    found = [(m.phrase, text[m.start:m.end]) for m in matcher.find_all(text)]
+
+    assert found == [
+        ("i'm stuck", "I’M STUCK"),
+        ("stuck", "STUCK"),
+        ("no entiendo", "no entiendo"),
+        ("我不明白", "我不明白"),
+        ("ß", "ß"),
+    ]
+    assert not matcher.search("everything works")
+    assert len(PhraseMatcher(["Stuck", "stuck ", ""])) == 1
+
+
+def test_struggle_phrases_reload_when_the_file_changes(tmp_path):
+    import os
+
+    from app.phrases import ReloadingPhraseMatcher
+
+    path = tmp_path / "phrases.txt"
+    path.write_text("# comment\nstuck\n", encoding="utf-8")
+    phrases = ReloadingPhraseMatcher(str(path), ["fallback"], interval=0)
+    assert [m.phrase for m in phrases.find_all("I'm stuck")] == ["stuck"]
+
+    path.write_text("stuck\nje suis perdu\n", encoding="utf-8")
+    os.utime(path, (1, 1))
+    assert [m.phrase for m in phrases.find_all("je suis perdu")] == ["je suis perdu"]
+    assert phrases.stats()["phrases"] == 2
+
+    # A broken file keeps the last good automaton
+    path.unlink()
+    assert phrases.find_all("stuck") and phrases.stats()["last_error"]
+    assert ReloadingPhraseMatcher(str(path), ["fallback"]).find_all("fallback")
+
+
+@patch("app.main.requests.post")
+@patch("app.main.client")
+def test_struggle_phrases_are_published_with_offsets(mock_openai, mock_post):
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = json.dumps({"route_to": "concepts-service"})
+    mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
+    mock_post.return_value = MagicMock(status_code=200)
+
+    client.post("/triage", json={"question": "Recursion? I'm lost, je ne comprends pas", "user_id": "user-1"})
+
+    struggle = mock_post.call_args_list[0]
+    assert "struggle.detected" in struggle[0][0]
+    assert struggle.kwargs["json"]["details"]["phrases"] == [
+        {"phrase": "i'm lost", "start": 11, "end": 19},
+        {"phrase": "je ne comprends pas", "start": 21, "end": 40},
+    ]
+    assert client.post("/api/triage/struggle-phrases/reload").json()["phrases"] > 50